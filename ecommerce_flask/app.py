@@ -1,8 +1,10 @@
-from flask import Flask, render_template, redirect, url_for, session, flash, request
+from flask import Flask, render_template, redirect, url_for, session, flash, request, jsonify
 from flask_session import Session
-from supabase import create_client, Client
+import hmac
+import logging
 import os
 import sys
+import threading
 
 
 from flask import Blueprint, session, request, redirect, url_for, flash
@@ -33,7 +35,7 @@ try:
     from dotenv import load_dotenv
     load_dotenv()
 except ImportError:
-    print("Warning: python-dotenv not installed. Environment variables may not be loaded.")
+    logging.getLogger(__name__).warning("python-dotenv not installed. Environment variables may not be loaded.")
 
 # Initialize Flask app with explicit template and static folders
 app = Flask(__name__, 
@@ -44,59 +46,155 @@ app = Flask(__name__,
 config_class = config.get(os.getenv('FLASK_ENV', 'default'), config['default'])
 app.config.from_object(config_class)
 
-# Print debug information
-print(f"App running from: {current_dir}")
-print(f"Template folder: {app.template_folder}")
-print(f"Static folder: {app.static_folder}")
-print(f"Template exists: {os.path.exists(os.path.join(app.template_folder, 'base_simple.html'))}")
+# Logging terstruktur: ditulis thread background, pesan yang sering muncul di-sample
+from services import logs
+logs.configure(level=app.config.get('LOG_LEVEL', 'INFO'),
+               fmt=app.config.get('LOG_FORMAT', 'json'),
+               queue_size=app.config.get('LOG_QUEUE_SIZE', 10000),
+               sample_rates=logs.parse_sample_rates(app.config.get('LOG_SAMPLE_RATES')))
+log = logging.getLogger(__name__)
 
-# Initialize Session
-Session(app)
-
-# Supabase configuration
-supabase_url = app.config.get('SUPABASE_URL')
-supabase_key = app.config.get('SUPABASE_KEY')
-supabase: Client = None
-
-# Initialize Supabase only if credentials are provided and valid
-def is_valid_supabase_credentials(url, key):
-    """Check if Supabase credentials are valid (not placeholders)"""
-    if not url or not key:
-        return False
-    
-    # Check for various placeholder patterns
-    placeholders = [
-        'your-supabase-url-here',
-        'your-supabase-key-here',
-        'your-project-id',
-        'placeholder',
-        'your-'
-    ]
-    
-    url_lower = url.lower()
-    key_lower = key.lower()
-    
-    for placeholder in placeholders:
-        if placeholder in url_lower or placeholder in key_lower:
-            return False
-    
-    return True
+log.info("app starting", extra={'app_dir': current_dir, 'template_folder': app.template_folder,
+                                'static_folder': app.static_folder})
 
-if is_valid_supabase_credentials(supabase_url, supabase_key):
-    try:
-        supabase = create_client(supabase_url, supabase_key)
-        # Test the connection by making a simple query
-        test_response = supabase.table('users').select('count', count='exact').execute()
-        print("[OK] Supabase client initialized successfully")
-        print("[OK] Supabase connection tested successfully")
-    except Exception as e:
-        print(f"[ERROR] Error initializing Supabase client: {e}")
-        print("[WARNING] Database features will be disabled.")
-        supabase = None
+# Initialize Session
+if app.config.get('SESSION_TYPE') == 'sqlite':
+    # Sesi di satu file SQLite (WAL) yang dipakai bersama semua worker gunicorn
+    from services.sqlite_session import SqliteSessionInterface
+    app.session_interface = SqliteSessionInterface(
+        os.path.join(current_dir, app.config.get('SESSION_SQLITE_PATH', 'instance/sessions.db')),
+        key_prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'),
+        use_signer=app.config.get('SESSION_USE_SIGNER', False),
+        permanent=app.config.get('SESSION_PERMANENT', True))
 else:
-    print("[WARNING] Supabase credentials not configured or using placeholders. Database features will be disabled.")
-    print("[WARNING] Please update your .env file with valid Supabase credentials.")
-    supabase = None
+    Session(app)
+
+# Metrics: latency per endpoint dan jumlah panggilan Supabase/Xendit/SMTP/Google, dibaca di /metrics
+from services.metrics import metrics
+metrics.configure(directory=os.path.join(current_dir, app.config.get('METRICS_DIR', 'instance/metrics')),
+                  flush_interval=app.config.get('METRICS_FLUSH_INTERVAL'))
+metrics.init_app(app)
+
+# Catalog cache (read-through untuk query tabel products)
+from services.catalog_cache import catalog_cache
+catalog_cache.configure(maxsize=app.config.get('CATALOG_CACHE_MAXSIZE', 512),
+                        ttl=app.config.get('CATALOG_CACHE_TTL', 60),
+                        version_path=os.path.join(current_dir, app.config.get('CATALOG_VERSION_PATH', 'instance/catalog.version')))
+metrics.register_cache('catalog', catalog_cache.stats)
+
+# Page cache: halaman katalog yang sudah dirender untuk pengunjung anonim (ETag + 304)
+from services.page_cache import page_cache, cached_page
+page_cache.configure(maxsize=app.config.get('PAGE_CACHE_MAXSIZE', 256),
+                     ttl=app.config.get('PAGE_CACHE_TTL', 60))
+metrics.register_cache('page', page_cache.stats)
+
+# Supabase: satu client bersama per proses, dibuat saat pertama dipakai (tanpa I/O saat import)
+from services import db
+from services.db import supabase, service_supabase
+from services.pagination import keyset_page, count_rows
+from services.product_repository import PRODUCT_CARD, PRODUCT_ADMIN_ROW, get_products_by_ids
+db.configure(url=app.config.get('SUPABASE_URL'),
+             key=app.config.get('SUPABASE_KEY'),
+             service_key=app.config.get('SUPABASE_SERVICE_KEY'),
+             pool_size=app.config.get('SUPABASE_POOL_SIZE'),
+             keepalive_expiry=app.config.get('SUPABASE_KEEPALIVE_EXPIRY'),
+             timeout=app.config.get('SUPABASE_TIMEOUT'),
+             connect_timeout=app.config.get('SUPABASE_CONNECT_TIMEOUT'))
+
+# Sweeper yang melepas hold stok dari pembayaran yang kedaluwarsa (dijalankan oleh start_background_workers)
+from services import reservations
+
+# Voucher: daftar voucher aktif di-cache di memori
+from services.vouchers import voucher_registry
+voucher_registry.configure(client=supabase, ttl=app.config.get('VOUCHER_CACHE_TTL', 60))
+
+# Brand: index brand -> id produk di memori (diperbarui saat produk disimpan)
+from services.brands import BRAND_LIST, brand_index
+brand_index.configure(client=supabase, ttl=app.config.get('BRAND_INDEX_TTL', 300))
+
+# Pencarian produk: inverted index di memori, dibangun di background saat request pertama
+from services.search import search_index
+search_index.configure(client=supabase, ttl=app.config.get('SEARCH_INDEX_TTL', 900))
+
+# Ukuran: bitmap produk yang tersedia per ukuran (dimuat ulang tiap SIZE_INDEX_TTL detik)
+from services.sizes import CHART_CATEGORIES, SIZE_CHART, size_index
+size_index.configure(client=supabase, ttl=app.config.get('SIZE_INDEX_TTL', 60))
+
+# Produk terkait di halaman detail: daftar per kategori di memori
+from services.related import related_index
+related_index.configure(client=supabase, ttl=app.config.get('RELATED_PRODUCTS_TTL', 300))
+
+# Job queue lokal (SQLite) untuk pekerjaan lambat seperti membuat invoice Xendit
+from services import xendit
+from services.job_queue import job_queue
+xendit.configure(api_key=app.config.get('XENDIT_API_KEY'),
+                 api_url=app.config.get('XENDIT_API_URL'),
+                 timeout=app.config.get('XENDIT_TIMEOUT'),
+                 callback_token=app.config.get('XENDIT_CALLBACK_TOKEN'))
+job_queue.configure(path=os.path.join(current_dir, app.config.get('JOB_QUEUE_PATH', 'instance/jobs.db')),
+                    poll_interval=app.config.get('JOB_QUEUE_POLL_INTERVAL'),
+                    max_attempts=app.config.get('JOB_MAX_ATTEMPTS'),
+                    retry_backoff=app.config.get('JOB_RETRY_BACKOFF'))
+
+# Webhook Xendit: dicatat di inbox lokal, diterapkan per batch oleh worker
+from services.webhook_inbox import webhook_inbox
+webhook_inbox.configure(client=service_supabase,
+                        path=os.path.join(current_dir, app.config.get('WEBHOOK_INBOX_PATH', 'instance/webhooks.db')),
+                        batch_size=app.config.get('WEBHOOK_BATCH_SIZE'),
+                        poll_interval=app.config.get('JOB_QUEUE_POLL_INTERVAL'),
+                        retention_days=app.config.get('WEBHOOK_RETENTION_DAYS'))
+
+# Thread background dijalankan dari request pertama di tiap proses, bukan saat import:
+# thread tidak ikut ter-fork dari master gunicorn (preload_app), dan client Supabase
+# baru dibuat di worker yang memakainya
+_background_pid = None
+_background_lock = threading.Lock()
+
+@app.before_request
+def start_background_workers():
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        if hasattr(app.session_interface, 'start_sweeper'):
+            app.session_interface.start_sweeper(interval=app.config.get('SESSION_SWEEP_INTERVAL', 300),
+                                                batch_size=app.config.get('SESSION_SWEEP_BATCH', 500))
+        reservations.start_sweeper(service_supabase, interval=app.config.get('RESERVATION_SWEEP_INTERVAL', 60))
+        search_index.start()
+        job_queue.start_worker(threads=app.config.get('JOB_QUEUE_WORKERS', 1))
+        webhook_inbox.start_worker()
+        _background_pid = os.getpid()
+
+# Google OIDC: discovery document dan JWKS di-cache, id_token diverifikasi lokal
+from services import google_oidc
+google_oidc.configure(discovery_url=app.config.get('GOOGLE_DISCOVERY_URL'),
+                      client_id=app.config.get('GOOGLE_CLIENT_ID'),
+                      timeout=app.config.get('GOOGLE_HTTP_TIMEOUT'),
+                      default_ttl=app.config.get('GOOGLE_METADATA_TTL'))
+
+# Outbox email: worker SMTP dijalankan saat email pertama dikirim
+from services.mailer import mailer
+mailer.configure(host=app.config.get('EMAIL_HOST'),
+                 port=app.config.get('EMAIL_PORT'),
+                 user=app.config.get('EMAIL_USER'),
+                 password=app.config.get('EMAIL_PASSWORD'),
+                 use_tls=app.config.get('EMAIL_USE_TLS'),
+                 workers=app.config.get('EMAIL_WORKERS'),
+                 queue_size=app.config.get('EMAIL_QUEUE_SIZE'),
+                 batch_size=app.config.get('EMAIL_BATCH_SIZE'),
+                 max_attempts=app.config.get('EMAIL_MAX_ATTEMPTS'),
+                 idle_timeout=app.config.get('EMAIL_IDLE_TIMEOUT'))
+
+# Aset statis ber-fingerprint (tools/build_assets.py); template memakai asset_url('static', filename=...)
+from services import assets
+assets.configure(app.static_folder, max_age=app.config.get('ASSET_MAX_AGE'))
+app.jinja_env.globals['asset_url'] = assets.asset_url
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    return assets.send_asset(filename)
 
 # Import blueprints
 from blueprints.auth import auth_bp
@@ -111,20 +209,9 @@ app.register_blueprint(cart_bp, url_prefix='/cart')
 app.register_blueprint(orders_bp, url_prefix='/orders')
 
 
-products_bp = Blueprint('products', __name__)
-
-@products_bp.route('/set_size', methods=['POST'])
-def set_size():
-    size = request.form.get('size')
-    if size:
-        session['preferred_size'] = size
-        flash(f"Size {size} berhasil disimpan!", "success")
-    else:
-        flash("Pilih size terlebih dahulu!", "warning")
-    return redirect(request.referrer or url_for('main.home'))
-
 
 @app.route('/')
+@cached_page
 def home():
     """Home page with product catalog"""
     category = request.args.get('category')
@@ -133,17 +220,21 @@ def home():
     if category:
         return redirect(url_for('products.list_products', category=category))
     
+    after = request.args.get('after', type=int)  # cursor: id produk terakhir di halaman sebelumnya
+    page_size = app.config.get('CATALOG_PAGE_SIZE', 24)
+    next_cursor = None
+    
     try:
         if supabase:
             try:
-                response = supabase.table('products').select('*').execute()
-                products = response.data if response.data else []
+                products, next_cursor = catalog_cache.get_or_load(
+                    ('list', 'all', after, page_size),
+                    lambda: keyset_page(supabase.table('products').select(PRODUCT_CARD), after, page_size)
+                )
                 
-                # Debug: tampilkan jumlah dan kategori produk yang dikembalikan
-                print(f"Home page - Total products: {len(products)}")
-                print(f"Product categories: {[p.get('category', 'NO_CATEGORY') for p in products]}")
-            except Exception as e:
-                print("❌ Error loading products:", e)
+                log.debug("home page", extra={'products': len(products), 'after': after, 'sample': 0.01})
+            except Exception:
+                log.exception("Error loading products", extra={'sample': 0.1})
                 products = []
         else:
             # Sample products for demo when database is not configured
@@ -165,7 +256,9 @@ def home():
                     'image_url': 'https://via.placeholder.com/300x200'
                 }
             ]
-        return render_template('home.html', products=products)
+        return render_template('home.html', products=products,
+                               next_url=url_for('home', after=next_cursor) if next_cursor else None,
+                               first_url=url_for('home') if after else None)
     except Exception as e:
         flash('Error loading products', 'error')
         return render_template('home.html', products=[])
@@ -186,10 +279,20 @@ def admin():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('home'))
     
+    after = request.args.get('after', type=int)
+    page_size = app.config.get('ADMIN_PAGE_SIZE', 50)
+    next_cursor = None
+    
     try:
         if supabase:
-            response = supabase.table('products').select('*').execute()
-            products = response.data if response.data else []
+            products, next_cursor = catalog_cache.get_or_load(
+                ('list', 'admin', after, page_size),
+                lambda: keyset_page(supabase.table('products').select(PRODUCT_ADMIN_ROW), after, page_size)
+            )
+            total_products = catalog_cache.get_or_load(
+                ('list', 'count'),
+                lambda: count_rows(supabase.table('products').select('id', count='exact'))
+            )
         else:
             # Sample products for demo when database is not configured
             products = [
@@ -210,10 +313,101 @@ def admin():
                     'image_url': 'https://via.placeholder.com/300x200'
                 }
             ]
-        return render_template('admin.html', products=products)
+            total_products = len(products)
+        return render_template('admin.html', products=products, total_products=total_products,
+                               next_url=url_for('admin', after=next_cursor) if next_cursor else None,
+                               first_url=url_for('admin') if after else None)
     except Exception as e:
         flash('Error loading products', 'error')
-        return render_template('admin.html', products=[])
+        return render_template('admin.html', products=[], total_products=0)
+
+@app.route('/admin/cache-stats')
+def cache_stats():
+    """Hit/miss counters of the catalog and page caches (admin only)"""
+    if 'user' not in session:
+        return redirect(url_for('auth.login'))
+    
+    admin_emails = ['admin@4shoe.com', 'admin@example.com']
+    if session['user']['email'] not in admin_emails:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    return jsonify(dict(catalog_cache.stats(), pages=page_cache.stats()))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics of all workers (Bearer METRICS_TOKEN, or localhost when no token is set)"""
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return 'Unauthorized', 401
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return 'Forbidden', 403
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/index-stats')
+def index_stats():
+    """Search, brand, size and related-product index counters (admin only)"""
+    if 'user' not in session:
+        return redirect(url_for('auth.login'))
+    
+    admin_emails = ['admin@4shoe.com', 'admin@example.com']
+    if session['user']['email'] not in admin_emails:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    return jsonify({'search': search_index.stats(), 'brands': brand_index.stats(), 'sizes': size_index.stats(),
+                    'related': related_index.stats()})
+
+@app.route('/admin/reservation-stats')
+def reservation_stats():
+    """Active stock holds and sweeper counters (admin only)"""
+    if 'user' not in session:
+        return redirect(url_for('auth.login'))
+    
+    admin_emails = ['admin@4shoe.com', 'admin@example.com']
+    if session['user']['email'] not in admin_emails:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    try:
+        return jsonify(reservations.stats(service_supabase))
+    except Exception:
+        log.exception("Error loading reservation stats")
+        return jsonify(reservations.stats()), 503
+
+@app.route('/admin/job-stats')
+def job_stats():
+    """Background job queue counters (admin only)"""
+    if 'user' not in session:
+        return redirect(url_for('auth.login'))
+    
+    admin_emails = ['admin@4shoe.com', 'admin@example.com']
+    if session['user']['email'] not in admin_emails:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    return jsonify(job_queue.stats())
+
+@app.route('/admin/webhook-stats')
+def webhook_stats():
+    """Webhook inbox counters (admin only)"""
+    if 'user' not in session:
+        return redirect(url_for('auth.login'))
+    
+    admin_emails = ['admin@4shoe.com', 'admin@example.com']
+    if session['user']['email'] not in admin_emails:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    return jsonify(webhook_inbox.stats())
+
+@app.route('/admin/mail-stats')
+def mail_stats():
+    """Email outbox counters (admin only)"""
+    if 'user' not in session:
+        return redirect(url_for('auth.login'))
+    
+    admin_emails = ['admin@4shoe.com', 'admin@example.com']
+    if session['user']['email'] not in admin_emails:
+        return jsonify({'error': 'Admin privileges required'}), 403
+    
+    return jsonify(mailer.stats())
 
 @app.route('/login')
 def login():
@@ -237,74 +431,29 @@ def inject_category():
 
 @app.route("/shop-by-size")
 def shop_by_size():
-    sizes = {
-        "MEN FOOTWEAR": [
-            {"id": "39", "us": "6"},
-            {"id": "40", "us": "7"},
-            {"id": "40.5", "us": "7.5"},
-            {"id": "41.5", "us": "8.5"},
-            {"id": "42", "us": "9"},
-            {"id": "42.5", "us": "9.5"},
-            {"id": "43", "us": "10"},
-            {"id": "44", "us": "10.5"},
-            {"id": "44.5", "us": "11"},
-            {"id": "45", "us": "11.5"},
-            {"id": "45.5", "us": "12"},
-            {"id": "46", "us": "12.5"},
-        ],
-        "WOMEN FOOTWEAR": [
-            {"id": "35", "us": "5"},
-            {"id": "36", "us": "6"},
-            {"id": "36.5", "us": "6.5"},
-            {"id": "37", "us": "6.5"},
-            {"id": "37.5", "us": "7"},
-            {"id": "38", "us": "7.5"},
-            {"id": "39", "us": "8"},
-            {"id": "40", "us": "9"},
-            {"id": "40.5", "us": "9.5"},
-            {"id": "41", "us": "10"},
-            {"id": "41.5", "us": "10.5"},
-            {"id": "43", "us": "11.5"},
-        ],
-        "KIDS FOOTWEAR": [
-            {"id": "16", "us": "1C"},
-            {"id": "16.5", "us": "2C"},
-            {"id": "17", "us": "2C"},
-            {"id": "18", "us": "3C"},
-            {"id": "18.5", "us": "3.5C"},
-            {"id": "20", "us": "4.5C"},
-            {"id": "21", "us": "5C"},
-            {"id": "22.5", "us": "6C"},
-            {"id": "23.5", "us": "7C"},
-            {"id": "25", "us": "8C"},
-            {"id": "26", "us": "9C"},
-            {"id": "27.5", "us": "10C"},
-        ]
-    }
-    return render_template("shop_by_size.html", sizes=sizes)
+    # Jumlah produk yang tersedia per ukuran & kategori, dihitung dari bitmap index ukuran
+    try:
+        counts = {group: size_index.counts(category) for group, category in CHART_CATEGORIES.items()}
+    except Exception:
+        log.exception("Error loading size availability")
+        counts = {}
+    return render_template("shop_by_size.html", sizes=SIZE_CHART, counts=counts, categories=CHART_CATEGORIES)
 
 
 app.secret_key = 'your_secret_key'
 
-# Dummy data brand
-brand_list = [
-    {'name': 'Nike', 'logo_url': 'https://upload.wikimedia.org/wikipedia/commons/a/a6/Logo_NIKE.svg', 'slug': 'nike'},
-    {'name': 'Adidas', 'logo_url': 'https://upload.wikimedia.org/wikipedia/commons/2/20/Adidas_Logo.svg', 'slug': 'adidas'},
-    {'name': 'Puma', 'logo_url': 'https://www.svgrepo.com/show/303470/puma-logo-logo.svg', 'slug': 'puma'},
-    {'name': 'Reebok', 'logo_url': 'https://upload.wikimedia.org/wikipedia/commons/5/53/Reebok_2019_logo.svg', 'slug': 'reebok'},
-    {'name': 'Converse', 'logo_url': 'https://wallpapers.com/images/hd/white-2007-converse-logo-f9eskkopzvb311gm.jpg', 'slug': 'converse'},
-    {'name': 'Specs', 'logo_url': 'https://2.bp.blogspot.com/-EcYgWHarEUs/VuYo9G8nuNI/AAAAAAAACEQ/JiIZWu9pH7IE0GAAU1B6H2K3HGQhe4gng/s1600/specs.png', 'slug': 'specs'},
-    {'name': 'Ellesse', 'logo_url': 'https://logos-world.net/wp-content/uploads/2022/06/Ellesse-Logo.jpg', 'slug': 'ellesse'},
-    {'name': 'Diadora', 'logo_url': 'https://cdn.freebiesupply.com/logos/thumbs/2x/diadora-logo.png', 'slug': 'diadora'},
-]
+# Daftar brand & index brand -> produk ada di services/brands.py
+brand_list = BRAND_LIST
 
 # Route: All brands
 @app.route('/brands')
+@cached_page
 def brands_all():
     return render_template('brands.html', brand_list=brand_list)
 
 
 @app.route('/brands/<slug>')
+@cached_page
 def brand_detail(slug):
     # Cari brand berdasarkan slug di daftar brand_list
     brand = next((b for b in brand_list if b['slug'] == slug), None)
@@ -314,10 +463,13 @@ def brand_detail(slug):
     products = []
     try:
         if supabase:
-            # Ambil produk yang namanya ada keyword brand (case-insensitive)
-            response = supabase.table('products').select('*') \
-                .ilike('name', f'%{brand["name"]}%').execute()
-            products = response.data if response.data else []
+            # Brand dihitung saat produk disimpan; id produk diambil dari index di memori
+            product_ids = brand_index.product_ids(brand['slug'])
+            products = catalog_cache.get_or_load(
+                ('list', 'brand', brand['slug']),
+                lambda: sorted(get_products_by_ids(supabase, product_ids, PRODUCT_CARD).values(),
+                               key=lambda p: p['id'])
+            )
         else:
             # Dummy data jika Supabase tidak aktif
             products = [
@@ -338,8 +490,8 @@ def brand_detail(slug):
                     'image_url': 'https://via.placeholder.com/300x200'
                 }
             ]
-    except Exception as e:
-        print(f"❌ Error ambil produk brand {brand['name']}: {e}")
+    except Exception:
+        log.exception("Error ambil produk brand", extra={'brand': brand['slug']})
         products = []
 
     return render_template(
@@ -371,10 +523,12 @@ sports_list = [
 
 # Route: All sports
 @app.route("/sports")
+@cached_page
 def sports_all():
     return render_template("sports_all.html", sports_list=sports_list)
 
 @app.route("/sports/<slug>")
+@cached_page
 def sport_detail(slug):
     # Cari sport berdasarkan slug
     sport = next((s for s in sports_list if s['slug'] == slug), None)
@@ -386,9 +540,11 @@ def sport_detail(slug):
     try:
         if supabase:
             # Filter produk di DB berdasarkan slug
-            response = supabase.table('products').select('*') \
-                .eq('sport', sport['slug']).execute()
-            products = response.data if response.data else []
+            products = catalog_cache.get_or_load(
+                ('list', 'sport', sport['slug']),
+                lambda: supabase.table('products').select(PRODUCT_CARD)
+                    .eq('sport', sport['slug']).execute().data or []
+            )
         else:
             # Dummy produk jika DB tidak aktif
             products = [
@@ -398,7 +554,7 @@ def sport_detail(slug):
                     'description': f'Sepatu {sport["name"]} premium untuk performa maksimal',
                     'price': 1500000,
                     'stock': 10,
-                    'img_url': 'https://via.placeholder.com/300x200',
+                    'image_url': 'https://via.placeholder.com/300x200',
                     'sport': sport['slug']
                 },
                 {
@@ -407,12 +563,12 @@ def sport_detail(slug):
                     'description': f'Sepatu {sport["name"]} dengan desain ringan dan nyaman',
                     'price': 1100000,
                     'stock': 7,
-                    'img_url': 'https://via.placeholder.com/300x200',
+                    'image_url': 'https://via.placeholder.com/300x200',
                     'sport': sport['slug']
                 }
             ]
-    except Exception as e:
-        print(f"❌ Error ambil produk sport {sport['name']}: {e}")
+    except Exception:
+        log.exception("Error ambil produk sport", extra={'sport': sport['slug']})
         products = []
 
     return render_template(
@@ -0,0 +1,338 @@
+"""
+Route benchmarks: the whole app against benchmarks/fake_supabase.py (no database needed).
+
+    python benchmarks/bench_routes.py                          # all mixes, 1000 products
+    python benchmarks/bench_routes.py --mix checkout --iterations 200
+    python benchmarks/bench_routes.py --products 20000 --latency-ms 2 --threads 8
+    python benchmarks/bench_routes.py --compare                # against benchmarks/baselines.json
+    python benchmarks/bench_routes.py --save-baseline
+
+Each mix is a scripted visit (anonymous browsing, an anonymous cart, a
+logged-in checkout up to placing the order, order and payment-return pages,
+admin pages, Xendit webhook deliveries) repeated
+``--iterations`` times by ``--threads`` virtual users, each with its own
+cookie jar. Per route it prints the request count, p50/p95/p99 latency,
+the Supabase round trips per request and the time spent in them (with
+``--latency-ms 0`` that is the fake's own processing time); per mix the
+throughput. Round trips do not depend on the machine and are compared
+exactly; latency is compared with ``--tolerance``, so only compare
+baselines taken on the same host with the same options. Login itself
+(Supabase Auth) is not faked: logged-in users get the session directly.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_supabase  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baselines.json')
+CALLBACK_TOKEN = 'bench-callback-token'
+SEARCH_TERMS = ['nike', 'adidas air', 'runner', 'classic hitam', 'pum', 'zoom max', 'sepatu lari', 'boost']
+
+
+def boot(args):
+    """Start the app against a seeded fake; returns (app module, fake, catalog)"""
+    fake = fake_supabase.FakeSupabase(latency=args.latency_ms / 1000)
+    fake_supabase.install(fake)
+    state_dir = tempfile.mkdtemp(prefix='bench-routes-')
+    os.environ.update({
+        'SUPABASE_URL': fake_supabase.FAKE_SUPABASE_URL,
+        'SUPABASE_KEY': fake_supabase.FAKE_SUPABASE_KEY,
+        'SUPABASE_SERVICE_KEY': fake_supabase.FAKE_SUPABASE_KEY,
+        'XENDIT_API_KEY': '',  # checkout berakhir di mode demo (tanpa panggilan Xendit)
+        'XENDIT_CALLBACK_TOKEN': CALLBACK_TOKEN,
+        'SESSION_SQLITE_PATH': os.path.join(state_dir, 'sessions.db'),
+        'JOB_QUEUE_PATH': os.path.join(state_dir, 'jobs.db'),
+        'CATALOG_VERSION_PATH': os.path.join(state_dir, 'catalog.version'),
+        'WEBHOOK_INBOX_PATH': os.path.join(state_dir, 'webhooks.db'),
+        'METRICS_DIR': os.path.join(state_dir, 'metrics'),
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+    })
+    catalog = fake_supabase.seed(fake, products=args.products, orders=args.orders, users=args.users)
+    import app as app_module
+    return app_module, fake, catalog
+
+
+class VirtualUser:
+    """One browser: a test client (own session cookie) that records every request it makes"""
+
+    def __init__(self, app_module, fake, rng, user_id=None, email=None):
+        self.client = app_module.app.test_client()
+        self.fake = fake
+        self.rng = rng
+        self.user_id = user_id
+        self.samples = []  # (route, seconds, round trips, seconds in Supabase)
+        if user_id is not None:
+            with self.client.session_transaction() as session:
+                session['user'] = {'id': user_id, 'email': email or f'user{user_id}@example.com',
+                                   'name': f'User {user_id}'}
+
+    def request(self, route, method, url, **kwargs):
+        requests_before, db_before = self.fake.thread_requests(), self.fake.thread_seconds()
+        started = time.perf_counter()
+        response = self.client.open(url, method=method, **kwargs)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 500:
+            raise RuntimeError(f'{method} {url} -> {response.status_code}')
+        self.samples.append((route, elapsed, self.fake.thread_requests() - requests_before,
+                             self.fake.thread_seconds() - db_before))
+        return response
+
+
+# ---- mixes: satu iterasi = satu kunjungan ----------------------------------
+def mix_browse(user, ctx):
+    rng = user.rng
+    user.request('home', 'GET', '/')
+    user.request('home (page 2)', 'GET', f'/?after={ctx["page_size"]}')
+    category = rng.choice(['man', 'woman', 'kids'])
+    user.request('list_products', 'GET', f'/products/list?category={category}')
+    for _ in range(2):
+        user.request('view_product', 'GET', f'/products/product/{rng.choice(ctx["product_ids"])}')
+    user.request('search', 'GET', '/products/search', query_string={'q': rng.choice(SEARCH_TERMS)})
+    user.request('search_suggest', 'GET', '/products/search/suggest', query_string={'q': rng.choice(SEARCH_TERMS)[:3]})
+    user.request('brand_detail', 'GET', f'/brands/{rng.choice(ctx["brands"])}')
+    user.request('sport_detail', 'GET', f'/sports/{rng.choice(ctx["sports"])}')
+    user.request('list_by_size', 'GET', f'/products/size/{rng.choice(ctx["sizes"])}')
+    user.request('shop_by_size', 'GET', '/shop-by-size')
+    user.request('brands_all', 'GET', '/brands')
+    user.request('sports_all', 'GET', '/sports')
+
+
+def mix_cart(user, ctx):
+    rng = user.rng
+    product_ids = rng.sample(ctx['in_stock_ids'], 3)
+    for product_id in product_ids:
+        user.request('view_product', 'GET', f'/products/product/{product_id}')
+        user.request('add_to_cart', 'POST', f'/cart/add/{product_id}', data={'quantity': 1})
+        user.request('view_cart', 'GET', '/cart/')
+    user.request('update_cart', 'POST', f'/cart/update/{product_ids[0]}', data={'quantity': 2})
+    user.request('apply_voucher', 'POST', '/cart/apply_voucher', data={'voucher_code': 'ONGKIRGRATIS'})
+    user.request('view_cart', 'GET', '/cart/')
+    for product_id in product_ids:
+        user.request('remove_from_cart', 'POST', f'/cart/remove/{product_id}')
+
+
+def mix_checkout(user, ctx):
+    rng = user.rng
+    for product_id in rng.sample(ctx['in_stock_ids'], rng.randint(1, 3)):
+        user.request('add_to_cart', 'POST', f'/cart/add/{product_id}', data={'quantity': 1})
+    user.request('view_cart', 'GET', '/cart/')
+    user.request('checkout_form', 'GET', '/cart/checkout/form')
+    user.request('checkout_form (submit)', 'POST', '/cart/checkout/form', data={
+        'first_name': 'Budi', 'last_name': 'Santoso', 'mobile_phone': '081234567890', 'address': 'Jl. Merdeka 1',
+        'province': 'DKI Jakarta', 'city': 'Jakarta Pusat', 'district': 'Gambir', 'zip_code': '10110'})
+    user.request('checkout_finalize', 'GET', '/cart/checkout/finalize')
+    user.request('checkout_finalize (place order)', 'POST', '/cart/checkout/finalize')
+
+
+def mix_account(user, ctx):
+    user.request('order_history', 'GET', '/orders/history')
+    orders = ctx['orders_by_user'].get(user.user_id)
+    if orders:
+        user.request('order_confirmation', 'GET', f'/orders/confirmation/{user.rng.choice(orders)}')
+        # Kembali dari halaman invoice Xendit (hanya baca, status diubah oleh webhook)
+        user.request('payment_success', 'GET', f'/cart/payment/success/{user.rng.choice(orders)}')
+        user.request('payment_failed', 'GET', f'/cart/payment/failed/{user.rng.choice(orders)}')
+
+
+def mix_admin(user, ctx):
+    user.request('admin_products', 'GET', '/admin')
+    user.request('admin_products (page 2)', 'GET', f'/admin?after={ctx["admin_page_size"]}')
+    user.request('admin_orders', 'GET', '/orders/admin/orders')
+    user.request('admin_edit_product', 'GET', f'/products/edit/{user.rng.choice(ctx["product_ids"])}')
+    for name in ('cache', 'reservation', 'job', 'webhook'):
+        user.request(f'admin_{name}_stats', 'GET', f'/admin/{name}-stats')
+
+
+def mix_webhook(user, ctx):
+    # Pesanan yang sudah lunas: worker inbox tidak mengubah apa pun, jadi mix lain tidak terpengaruh
+    order_id = user.rng.choice(ctx['paid_orders'])
+    payload = {'id': f'inv-bench-{user.rng.getrandbits(48):x}', 'external_id': f'order-{order_id}', 'status': 'PAID'}
+    headers = {'x-callback-token': CALLBACK_TOKEN}
+    user.request('payment_webhook', 'POST', '/cart/payment/webhook', json=payload, headers=headers)
+    user.request('payment_webhook (duplicate)', 'POST', '/cart/payment/webhook', json=payload, headers=headers)
+
+
+MIXES = {
+    # name -> (fungsi, login: None, 'user' atau 'admin')
+    'browse': (mix_browse, None),
+    'cart': (mix_cart, None),
+    'account': (mix_account, 'user'),
+    'admin': (mix_admin, 'admin'),
+    'webhook': (mix_webhook, None),
+    'checkout': (mix_checkout, 'user'),  # terakhir: pesanan baru tidak mengubah data mix lain
+}
+
+
+def context(app_module, fake, catalog):
+    in_stock = [p['id'] for p in catalog if p['stock'] >= 10]
+    orders_by_user = {}
+    paid_orders = []
+    for order in fake.tables.get('orders', []):
+        orders_by_user.setdefault(order['user_id'], []).append(order['id'])
+        if order['status'] == 'paid':
+            paid_orders.append(order['id'])
+    return {
+        'product_ids': [p['id'] for p in catalog],
+        'in_stock_ids': in_stock,
+        'brands': [b['slug'] for b in app_module.brand_list],
+        'sports': [s['slug'] for s in app_module.sports_list],
+        'sizes': ['40', '42', '37', '38', '20', '25'],
+        'page_size': app_module.app.config.get('CATALOG_PAGE_SIZE', 24),
+        'admin_page_size': app_module.app.config.get('ADMIN_PAGE_SIZE', 50),
+        'orders_by_user': orders_by_user,
+        'paid_orders': paid_orders,
+    }
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_mix(name, app_module, fake, ctx, args):
+    fn, login = MIXES[name]
+    users = [VirtualUser(app_module, fake, random.Random(f'{name}-{index}'),
+                         user_id=(index % args.users) + 1 if login else None,
+                         email='admin@example.com' if login == 'admin' else None)
+             for index in range(args.threads)]
+    for user in users:  # pemanasan: cache, index, template
+        for _ in range(args.warmup):
+            fn(user, ctx)
+        user.samples.clear()
+
+    per_user = [args.iterations // args.threads + (1 if i < args.iterations % args.threads else 0)
+                for i in range(args.threads)]
+    errors = []
+
+    def drive(user, count):
+        try:
+            for _ in range(count):
+                fn(user, ctx)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=drive, args=(user, count)) for user, count in zip(users, per_user)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+
+    routes = {}
+    for user in users:
+        for route, seconds, round_trips, db_seconds in user.samples:
+            routes.setdefault(route, []).append((seconds, round_trips, db_seconds))
+    total = sum(len(samples) for samples in routes.values())
+    result = {'requests': total, 'seconds': round(wall, 3), 'throughput': round(total / wall, 1), 'routes': {}}
+    for route, samples in routes.items():
+        latencies = [s[0] * 1000 for s in samples]
+        result['routes'][route] = {
+            'count': len(samples),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'round_trips': round(statistics.mean(s[1] for s in samples), 2),
+            'db_ms': round(statistics.mean(s[2] for s in samples) * 1000, 3),
+        }
+    return result
+
+
+def print_result(name, result, baseline=None):
+    print(f'\n== {name}: {result["requests"]} requests in {result["seconds"]:.2f}s, '
+          f'{result["throughput"]:.1f} req/s')
+    print(f'{"route":<34}{"n":>6}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"rt/req":>8}{"db ms":>8}')
+    for route, stats in result['routes'].items():
+        line = (f'{route:<34}{stats["count"]:>6}{stats["p50_ms"]:>9.2f}{stats["p95_ms"]:>9.2f}'
+                f'{stats["p99_ms"]:>9.2f}{stats["round_trips"]:>8.2f}{stats["db_ms"]:>8.2f}')
+        old = (baseline or {}).get('routes', {}).get(route)
+        if old:
+            line += f'   p95 {_delta(old["p95_ms"], stats["p95_ms"])}, rt {old["round_trips"]:.2f}'
+        print(line)
+
+
+def _delta(old, new):
+    return f'{(new - old) / old * 100:+.0f}%' if old else 'n/a'
+
+
+def regressions(results, baselines, tolerance, min_delta_ms):
+    """Routes whose round trips went up or whose p95 got more than ``tolerance`` (and ``min_delta_ms``) slower"""
+    found = []
+    for mix, result in results.items():
+        for route, stats in result['routes'].items():
+            old = baselines.get(mix, {}).get('routes', {}).get(route)
+            if not old:
+                continue
+            if stats['round_trips'] > old['round_trips'] + 0.01:
+                found.append(f'{mix}/{route}: round trips {old["round_trips"]} -> {stats["round_trips"]}')
+            # Rute di bawah 1 ms terlalu berisik untuk dibandingkan dalam persen saja
+            if stats['p95_ms'] > old['p95_ms'] * (1 + tolerance) and stats['p95_ms'] - old['p95_ms'] > min_delta_ms:
+                found.append(f'{mix}/{route}: p95 {old["p95_ms"]}ms -> {stats["p95_ms"]}ms')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mix', choices=['all'] + list(MIXES), default='all')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=100, help='visits per mix')
+    parser.add_argument('--warmup', type=int, default=3, help='visits per virtual user before measuring')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent virtual users')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated round-trip time to Supabase')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='exit 1 when a route regressed against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p95 slowdown for --compare')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='p95 slowdowns smaller than this are noise')
+    args = parser.parse_args()
+
+    app_module, fake, catalog = boot(args)
+    ctx = context(app_module, fake, catalog)
+    options = {name: getattr(args, name) for name in ('products', 'orders', 'users', 'iterations', 'threads', 'latency_ms')}
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored.get('options') == options:
+            baselines = stored.get('mixes', {})
+        elif args.compare:
+            print(f'Baseline dibuat dengan opsi lain: {stored.get("options")}')
+
+    results = {}
+    for name in (MIXES if args.mix == 'all' else [args.mix]):
+        results[name] = run_mix(name, app_module, fake, ctx, args)
+        print_result(name, results[name], baselines.get(name))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'options': options, 'python': sys.version.split()[0], 'mixes': results}, f, indent=2)
+            f.write('\n')
+        print(f'\nBaseline disimpan di {args.baseline}')
+
+    if args.compare:
+        found = regressions(results, baselines, args.tolerance, args.min_delta_ms)
+        print('\n' + ('\n'.join(f'REGRESSION {line}' for line in found) if found else 'Tidak ada regresi'))
+        sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark for services/search.py on a synthetic catalog (no database needed).
+
+    python benchmarks/bench_search.py                    # 100k products
+    python benchmarks/bench_search.py --products 20000 --queries 5000
+
+Prints the index build time and per-query latency percentiles for
+full-word queries, multi-word queries and autocomplete prefixes.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.brands import BRAND_LIST  # noqa: E402
+from services.search import SearchIndex  # noqa: E402
+
+MODELS = ['Air', 'Max', 'Runner', 'Classic', 'Zoom', 'Court', 'Trail', 'Boost', 'Ultra', 'Pro', 'Street',
+          'Flex', 'Glide', 'Sprint', 'Retro', 'Lite', 'Pulse', 'Vapor', 'Nova', 'Terra']
+COLORS = ['Hitam', 'Putih', 'Merah', 'Biru', 'Hijau', 'Abu', 'Navy', 'Cream', 'Kuning', 'Coklat']
+CATEGORIES = ['man', 'woman', 'kids']
+WORDS = ('sepatu lari ringan nyaman empuk sol karet anti slip bahan mesh breathable cocok untuk olahraga '
+         'harian jalan santai basket futsal tenis gym kulit sintetis jahitan kuat desain modern klasik '
+         'bantalan busa responsif grip outsole tahan lama').split()
+
+
+def make_catalog(count, seed=1):
+    rng = random.Random(seed)
+    products = []
+    for product_id in range(1, count + 1):
+        brand = rng.choice(BRAND_LIST)
+        name = f"{brand['name']} {rng.choice(MODELS)} {rng.choice(MODELS)} {rng.randint(1, 999)} {rng.choice(COLORS)}"
+        products.append({
+            'id': product_id,
+            'name': name,
+            'description': ' '.join(rng.choice(WORDS) for _ in range(25)),
+            'category': rng.choice(CATEGORIES),
+            'brand': brand['slug'],
+        })
+    return products
+
+
+def make_queries(count, seed=2):
+    rng = random.Random(seed)
+    queries = {'word': [], 'multi': [], 'prefix': []}
+    for _ in range(count):
+        brand = rng.choice(BRAND_LIST)['name'].lower()
+        model = rng.choice(MODELS).lower()
+        queries['word'].append(rng.choice([brand, model, rng.choice(WORDS)]))
+        queries['multi'].append(f'{brand} {model} {rng.choice(COLORS).lower()}')
+        word = rng.choice([brand, model, rng.choice(WORDS)])
+        queries['prefix'].append(f'{brand} {word[:rng.randint(1, len(word))]}')
+    return queries
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(products, queries, limit):
+    catalog = make_catalog(products)
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.build(catalog)
+    print(f'build: {products} products in {time.perf_counter() - started:.2f}s, '
+          f'{index.stats()["terms"]} terms')
+
+    for kind, texts in queries.items():
+        for text in texts[:200]:  # pemanasan (cache prefix, dsb.)
+            index.search(text, limit=limit)
+        timings = []
+        for text in texts:
+            started = time.perf_counter()
+            index.search(text, limit=limit)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f'{kind:>7}: p50={percentile(timings, 50):.3f}ms p95={percentile(timings, 95):.3f}ms '
+              f'p99={percentile(timings, 99):.3f}ms mean={statistics.mean(timings):.3f}ms')
+
+    timings = []
+    for text in queries['prefix']:
+        started = time.perf_counter()
+        index.suggest(text)
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f'suggest: p50={percentile(timings, 50):.3f}ms p95={percentile(timings, 95):.3f}ms '
+          f'p99={percentile(timings, 99):.3f}ms')
+
+    started = time.perf_counter()
+    for product_id in range(1, 1001):
+        index.upsert({'id': product_id, 'name': f'Nike Edited {product_id}', 'description': 'baru',
+                      'category': 'man', 'brand': 'nike'})
+    print(f' upsert: {(time.perf_counter() - started) * 1000 / 1000:.3f}ms per product')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=24)
+    args = parser.parse_args()
+    run(args.products, make_queries(args.queries), args.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,496 @@
+"""
+In-memory PostgREST stand-in for Supabase, used by the route benchmarks (no database or network needed).
+
+Covers what the app sends through supabase-py: select with column lists,
+aliases and embedded resources, the eq/neq/in/is/gt/gte/lt/lte/like/ilike/cs
+filters, order/limit/offset, ``count=exact``, single-object responses,
+insert/update/delete, and Python ports of the RPC functions in migrations/.
+Every HTTP round trip is counted, per thread and in total, and can be
+delayed by ``latency`` seconds to mimic the network hop to Supabase.
+"""
+
+import bisect
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, unquote
+
+import httpx
+
+FAKE_SUPABASE_URL = 'http://fake-supabase.local'
+FAKE_SUPABASE_KEY = 'fake.fake.fake'
+
+
+def _singular(name):
+    return name[:-1] if name.endswith('s') else name
+
+
+def _split_top(text, sep=','):
+    """Split on ``sep`` but not inside parentheses"""
+    parts, depth, current = [], 0, ''
+    for ch in text:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == sep and depth == 0:
+            parts.append(current)
+            current = ''
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _coerce(value):
+    if value == 'null':
+        return None
+    if value == 'true':
+        return True
+    if value == 'false':
+        return False
+    if value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _like(pattern, value, flags=0):
+    regex = '^' + '.*'.join(re.escape(part) for part in pattern.replace('%', '*').split('*')) + '$'
+    return value is not None and re.match(regex, str(value), flags) is not None
+
+
+def _compare(row_value, op, raw):
+    if op == 'eq':
+        return row_value == _coerce(raw) or str(row_value) == raw
+    if op == 'neq':
+        return not (row_value == _coerce(raw) or str(row_value) == raw)
+    if op == 'in':
+        values = [_coerce(v.strip()) for v in _split_top(raw.strip('()'))]
+        return row_value in values or str(row_value) in [str(v) for v in values]
+    if op == 'is':
+        return row_value is _coerce(raw)
+    if op in ('gt', 'gte', 'lt', 'lte'):
+        if row_value is None:
+            return False
+        target = _coerce(raw)
+        try:
+            if op == 'gt':
+                return row_value > target
+            if op == 'gte':
+                return row_value >= target
+            if op == 'lt':
+                return row_value < target
+            return row_value <= target
+        except TypeError:
+            return False
+    if op == 'like':
+        return _like(raw, row_value)
+    if op == 'ilike':
+        return _like(raw, row_value, re.IGNORECASE)
+    if op == 'cs':
+        wanted = json.loads(raw) if raw.startswith('[') else [_coerce(v) for v in raw.strip('{}').split(',')]
+        return isinstance(row_value, list) and all(w in row_value for w in wanted)
+    raise ValueError(f'unsupported operator {op}')
+
+
+class FakeSupabase:
+    """Tables are lists of dicts; ``rpc_handlers`` maps function names to ``fn(fake, params)``.
+
+    ``requests`` counts every round trip; ``thread_requests()`` and
+    ``thread_seconds()`` only those made by the calling thread (and the
+    time spent in them), so a benchmark can attribute round trips to the
+    request it is timing while background workers keep running. Rows are
+    also indexed by id, so lookups by primary key and keyset pages do not
+    scan the whole table and the fake's own cost stays small.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.tables = {}
+        self.rpc_handlers = {}
+        self.requests = 0
+        self._ids = {}
+        self._by_id = {}  # table -> {id: row}
+        self._children = {}  # (table, fk) -> {parent id: [row]}, dikosongkan setiap ada penulisan
+        self._local = threading.local()
+        self.lock = threading.RLock()
+
+    def thread_requests(self):
+        return getattr(self._local, 'requests', 0)
+
+    def thread_seconds(self):
+        return getattr(self._local, 'seconds', 0.0)
+
+    # ---- seeding -------------------------------------------------------
+    def insert_rows(self, table, rows):
+        out = []
+        with self.lock:
+            data = self.tables.setdefault(table, [])
+            for row in rows:
+                row = dict(row)
+                if row.get('id') is None:
+                    self._ids[table] = self._ids.get(table, 0) + 1
+                    row['id'] = self._ids[table]
+                elif isinstance(row['id'], int):
+                    self._ids[table] = max(self._ids.get(table, 0), row['id'])
+                data.append(row)
+                self._by_id.setdefault(table, {})[row['id']] = row
+                self._children.clear()
+                out.append(row)
+        return out
+
+    # ---- transport -----------------------------------------------------
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+    def handle(self, request):
+        started = time.perf_counter()
+        try:
+            return self._handle(request)
+        finally:
+            self._local.requests = self.thread_requests() + 1
+            self._local.seconds = self.thread_seconds() + time.perf_counter() - started
+
+    def _handle(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+            path = request.url.path
+            if not path.startswith('/rest/v1/'):
+                return httpx.Response(404, json={'message': 'not found'})
+            target = path[len('/rest/v1/'):]
+            params = parse_qsl(request.url.query.decode(), keep_blank_values=True)
+            body = json.loads(request.content) if request.content else None
+            prefer = request.headers.get('prefer', '')
+            single = 'vnd.pgrst.object' in request.headers.get('accept', '')
+
+            try:
+                if target.startswith('rpc/'):
+                    fn = self.rpc_handlers.get(target[4:])
+                    if fn is None:
+                        return httpx.Response(404, json={'message': f'function {target[4:]} not found'})
+                    return httpx.Response(200, json=fn(self, body or {}))
+
+                table = unquote(target)
+                total = None
+                if request.method == 'GET':
+                    rows = self._select(table, params)
+                    if 'count=exact' in prefer:
+                        total = len(self._filter(table, params))
+                elif request.method == 'POST':
+                    rows = [dict(r) for r in self.insert_rows(table, body if isinstance(body, list) else [body])]
+                elif request.method == 'PATCH':
+                    rows = self._filter(table, params)
+                    for row in rows:
+                        row.update(body)
+                    self._children.clear()
+                    rows = [dict(r) for r in rows]
+                elif request.method == 'DELETE':
+                    rows = self._filter(table, params)
+                    ids = {id(r) for r in rows}
+                    self.tables[table] = [r for r in self.tables.get(table, []) if id(r) not in ids]
+                    for row in rows:
+                        self._by_id.get(table, {}).pop(row.get('id'), None)
+                    self._children.clear()
+                else:
+                    return httpx.Response(405)
+            except Exception as e:
+                return httpx.Response(400, json={'message': str(e), 'code': 'PGRST100'})
+
+            headers = {}
+            if 'count=exact' in prefer:
+                total = len(rows) if total is None else total
+                headers['content-range'] = f'0-{max(len(rows) - 1, 0)}/{total}'
+            if single:
+                if len(rows) != 1:
+                    return httpx.Response(406, json={'message': 'JSON object requested, multiple (or no) rows returned',
+                                                     'code': 'PGRST116', 'details': f'Results contain {len(rows)} rows'})
+                return httpx.Response(200, json=rows[0], headers=headers)
+            return httpx.Response(200, json=rows, headers=headers)
+
+    # ---- query evaluation ---------------------------------------------
+    def _candidates(self, table, params):
+        """Rows that can match an ``id`` filter, found through the id index"""
+        rows = self.tables.get(table, [])
+        by_id = self._by_id.get(table, {})
+        for key, value in params:
+            if key != 'id' or len(by_id) != len(rows):
+                continue
+            op, _, raw = value.partition('.')
+            if op == 'eq':
+                row = by_id.get(_coerce(raw))
+                return [row] if row is not None else []
+            if op == 'in':
+                found = (by_id.get(_coerce(v.strip())) for v in _split_top(raw.strip('()')))
+                return sorted((row for row in found if row is not None), key=lambda row: row['id'])
+            if op in ('gt', 'gte') and isinstance(_coerce(raw), int):
+                # id naik sesuai urutan insert: cukup lompat ke posisi cursor
+                ids = [row['id'] for row in rows]
+                if ids == sorted(ids):
+                    position = bisect.bisect_right(ids, _coerce(raw)) if op == 'gt' else bisect.bisect_left(ids, _coerce(raw))
+                    return rows[position:]
+        return rows
+
+    def _filter(self, table, params):
+        rows = self._candidates(table, params)
+        for key, value in params:
+            if key in ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns'):
+                continue
+            if '.' in key:
+                continue  # filter pada resource embedded, diabaikan
+            negate = value.startswith('not.')
+            if negate:
+                value = value[4:]
+            op, _, raw = value.partition('.')
+            rows = [r for r in rows if _compare(r.get(key), op, raw) != negate]
+        return rows
+
+    def _select(self, table, params):
+        rows = list(self._filter(table, params))
+        param_map = dict(params)
+        order = param_map.get('order')
+        if order:
+            for spec in reversed(order.split(',')):
+                column, *mods = spec.split('.')
+                rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse='desc' in mods)
+        offset = int(param_map.get('offset', 0))
+        if 'limit' in param_map:
+            rows = rows[offset:offset + int(param_map['limit'])]
+        elif offset:
+            rows = rows[offset:]
+        return [self._project(table, r, param_map.get('select', '*')) for r in rows]
+
+    def _children_of(self, table, fk):
+        key = (table, fk)
+        if key not in self._children:
+            groups = {}
+            for row in self.tables.get(table, []):
+                groups.setdefault(row.get(fk), []).append(row)
+            self._children[key] = groups
+        return self._children[key]
+
+    def _project(self, table, row, select):
+        out = {}
+        for field in _split_top(select):
+            if '(' in field:
+                name, inner = field.split('(', 1)
+                inner = inner[:-1]
+                alias, _, rel = name.partition(':')
+                if not rel:
+                    rel, alias = alias, alias
+                rel = rel.split('!')[0]
+                fk = f'{_singular(rel)}_id'
+                back_fk = f'{_singular(table)}_id'
+                if fk in row:
+                    match = self._by_id.get(rel, {}).get(row[fk])
+                    out[alias] = self._project(rel, match, inner) if match else None
+                else:
+                    children = self._children_of(rel, back_fk).get(row.get('id'), [])
+                    out[alias] = [self._project(rel, child, inner) for child in children]
+            elif field == '*':
+                out.update(row)
+            else:
+                column = field.split('::')[0]
+                alias, _, real = column.partition(':')
+                if not real:
+                    real = alias
+                if real == 'count':
+                    continue
+                computed = COMPUTED_COLUMNS.get((table, real))
+                out[alias] = computed(row) if computed else row.get(real)
+        return out
+
+
+# Computed columns (fungsi SQL dengan argumen baris tabel) yang dipilih lewat select
+COMPUTED_COLUMNS = {
+    ('products', 'description_excerpt'): lambda row: (row.get('description') or '')[:101],  # migrations/010
+}
+
+
+def install(fake):
+    """Route every httpx client aimed at ``FAKE_SUPABASE_URL`` to ``fake`` (call before importing app)"""
+    original_init = httpx.Client.__init__
+
+    def patched(self, *args, **kwargs):
+        if str(kwargs.get('base_url', '')).startswith(FAKE_SUPABASE_URL):
+            kwargs['transport'] = fake.transport()
+            kwargs.pop('http2', None)
+        original_init(self, *args, **kwargs)
+
+    httpx.Client.__init__ = patched
+
+
+# ---- RPC functions (Python ports of migrations/*.sql) ----------------------
+def rpc_place_order(fake, params):
+    """migrations/001_place_order.sql + 002 (stock holds) + 003 (vouchers) + 006 (server-side pricing)"""
+    from services import pricing
+    wanted = {}
+    for line in params['p_items']:
+        wanted[line['product_id']] = wanted.get(line['product_id'], 0) + line['quantity']
+    voucher = None
+    code = params.get('p_voucher_code')
+    if code is not None and 'vouchers' in fake.tables:
+        voucher = next((v for v in fake.tables['vouchers'] if v['code'] == code.upper()), None)
+        if voucher is None or not voucher.get('active', True):
+            return {'ok': False, 'order_id': None, 'insufficient': [], 'voucher_error': 'invalid'}
+        now = datetime.now(timezone.utc).isoformat()
+        if voucher.get('starts_at') and now < voucher['starts_at']:
+            return {'ok': False, 'order_id': None, 'insufficient': [], 'voucher_error': 'not_started'}
+        if voucher.get('ends_at') and now >= voucher['ends_at']:
+            return {'ok': False, 'order_id': None, 'insufficient': [], 'voucher_error': 'expired'}
+        if voucher.get('max_uses') is not None and voucher['used_count'] >= voucher['max_uses']:
+            return {'ok': False, 'order_id': None, 'insufficient': [], 'voucher_error': 'exhausted'}
+        uses = [r for r in fake.tables.get('voucher_redemptions', [])
+                if r['voucher_code'] == voucher['code'] and r['user_id'] == params['p_user_id']]
+        if voucher.get('max_uses_per_user') is not None and len(uses) >= voucher['max_uses_per_user']:
+            return {'ok': False, 'order_id': None, 'insufficient': [], 'voucher_error': 'user_limit'}
+    products = {p['id']: p for p in fake.tables.get('products', [])}
+    insufficient = [
+        {'product_id': pid, 'requested': qty, 'available': products[pid]['stock'] if pid in products else 0}
+        for pid, qty in sorted(wanted.items())
+        if pid not in products or products[pid]['stock'] < qty
+    ]
+    if insufficient:
+        return {'ok': False, 'order_id': None, 'insufficient': insufficient}
+    minor = pricing.price_cart([{'price': products[pid]['price'], 'quantity': qty} for pid, qty in wanted.items()], voucher)
+    total = pricing.to_rupiah(minor['total'])
+    if params.get('p_expected_total') is not None and params['p_expected_total'] != total:
+        return {'ok': False, 'order_id': None, 'insufficient': [], 'price_changed': True, 'total': total,
+                'prices': [{'product_id': pid, 'price': products[pid]['price']} for pid in sorted(wanted)],
+                'voucher': None if voucher is None else {k: voucher[k] for k in ('code', 'type', 'value', 'description')}}
+    discount, shipping = pricing.to_rupiah(minor['discount']), pricing.to_rupiah(minor['shipping_cost'])
+    order = fake.insert_rows('orders', [{
+        'user_id': params['p_user_id'], 'total': total, 'status': 'pending',
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'discount_amount': discount,
+        'shipping_cost': shipping, 'voucher_code': voucher['code'] if voucher else None,
+    }])[0]
+    fake.insert_rows('order_items', [{'order_id': order['id'], 'product_id': pid, 'quantity': qty,
+                                      'price': round(products[pid]['price'])} for pid, qty in wanted.items()])
+    for pid, qty in wanted.items():
+        products[pid]['stock'] -= qty
+    expires_at = datetime.fromtimestamp(time.time() + params.get('p_hold_seconds', 1800), timezone.utc).isoformat()
+    fake.insert_rows('stock_reservations', [{'order_id': order['id'], 'product_id': pid, 'quantity': qty,
+                                             'status': 'held', 'expires_at': expires_at}
+                                            for pid, qty in wanted.items()])
+    if voucher is not None:
+        voucher['used_count'] += 1
+        fake.insert_rows('voucher_redemptions', [{'order_id': order['id'], 'voucher_code': voucher['code'],
+                                                  'user_id': params['p_user_id']}])
+    return {'ok': True, 'order_id': order['id'], 'insufficient': [], 'total': total,
+            'discount_amount': discount, 'shipping_cost': shipping}
+
+
+def _hold_rows(fake, order_ids, statuses):
+    return [r for r in fake.tables.get('stock_reservations', []) if r['order_id'] in order_ids and r['status'] in statuses]
+
+
+def rpc_commit_reservations(fake, params):
+    """migrations/007_commit_shortfall.sql"""
+    products = {p['id']: p for p in fake.tables.get('products', [])}
+    committed, shortfall = 0, []
+    for order_id in sorted(set(params['p_order_ids'])):
+        rows = _hold_rows(fake, [order_id], ('held', 'released'))
+        released = {}
+        for row in rows:
+            if row['status'] == 'released':
+                released[row['product_id']] = released.get(row['product_id'], 0) + row['quantity']
+        missing = [{'order_id': order_id, 'product_id': pid, 'requested': qty, 'available': products[pid]['stock']}
+                   for pid, qty in sorted(released.items()) if products[pid]['stock'] < qty]
+        if missing:
+            shortfall.extend(missing)
+            continue
+        for pid, qty in released.items():
+            products[pid]['stock'] -= qty
+        for row in rows:
+            row['status'] = 'committed'
+        committed += len(rows)
+    return {'committed': committed, 'shortfall': shortfall}
+
+
+def rpc_release_reservations(fake, params):
+    products = {p['id']: p for p in fake.tables.get('products', [])}
+    rows = _hold_rows(fake, params['p_order_ids'], ('held',))
+    for row in rows:
+        products[row['product_id']]['stock'] += row['quantity']
+        row['status'] = 'released'
+    return len(rows)
+
+
+def rpc_reservation_stats(fake, params):
+    held = [r for r in fake.tables.get('stock_reservations', []) if r['status'] == 'held']
+    return {'active_holds': len(held), 'active_units': sum(r['quantity'] for r in held), 'expired_holds': 0}
+
+
+def rpc_order_status_counts(fake, params):
+    """migrations/009_order_status_counts.sql"""
+    counts = {}
+    for order in fake.tables.get('orders', []):
+        if order.get('status') is not None:
+            counts[order['status']] = counts.get(order['status'], 0) + 1
+    return counts
+
+
+def install_rpcs(fake):
+    fake.rpc_handlers.update({
+        'place_order': rpc_place_order,
+        'commit_reservations': rpc_commit_reservations,
+        'release_reservations': rpc_release_reservations,
+        'release_expired_reservations': lambda fake, params: {'released_holds': 0, 'failed_orders': 0},
+        'reservation_stats': rpc_reservation_stats,
+        'order_status_counts': rpc_order_status_counts,
+    })
+
+
+# ---- seed data ---------------------------------------------------------------
+VOUCHERS = [
+    {'code': 'ONGKIRGRATIS', 'type': 'free_shipping', 'value': 0, 'description': 'Gratis Ongkir', 'active': True,
+     'starts_at': None, 'ends_at': None, 'max_uses': None, 'max_uses_per_user': None, 'used_count': 0},
+    {'code': 'DISKON10', 'type': 'percentage', 'value': 10, 'description': 'Diskon 10%', 'active': True,
+     'starts_at': None, 'ends_at': None, 'max_uses': None, 'max_uses_per_user': 1, 'used_count': 0},
+]
+
+
+def seed(fake, products=1000, orders=200, users=20, seed=1):
+    """Fill ``fake`` with a synthetic catalog, users and paid/pending orders; returns the product rows"""
+    from bench_search import make_catalog
+    from services.sizes import CHART_CATEGORIES, SIZE_CHART
+
+    rng = random.Random(seed)
+    sizes_by_category = {category: [s['id'] for s in SIZE_CHART[group]] for group, category in CHART_CATEGORIES.items()}
+    sports = ['running', 'basketball', 'football', 'tennis', 'training', 'lifestyle']
+    catalog = make_catalog(products, seed=seed)
+    for product in catalog:
+        product.update({
+            'price': rng.randrange(250000, 3000000, 5000),
+            'stock': rng.choice([0, 3, 10, 25, 50, 100]),
+            'image_url': f'https://img.example.com/{product["id"]}.jpg',
+            'sizes': sorted(rng.sample(sizes_by_category[product['category']], 4), key=float),
+            'sport': rng.choice(sports),
+        })
+    fake.insert_rows('products', catalog)
+    fake.insert_rows('users', [{'id': user_id, 'email': f'user{user_id}@example.com', 'name': f'User {user_id}',
+                                'supabase_user_id': f'u{user_id}'} for user_id in range(1, users + 1)])
+    fake.insert_rows('vouchers', [dict(v) for v in VOUCHERS])
+    for _ in range(orders):
+        lines = [{'product_id': rng.randint(1, products), 'quantity': rng.randint(1, 2),
+                  'price': rng.randrange(250000, 3000000, 5000)} for _ in range(rng.randint(1, 3))]
+        order = fake.insert_rows('orders', [{
+            'user_id': rng.randint(1, users), 'total': sum(l['price'] * l['quantity'] for l in lines),
+            'status': rng.choice(['paid', 'paid', 'pending', 'shipped']), 'created_at': '2025-01-01 00:00:00',
+            'discount_amount': 0, 'shipping_cost': 0, 'voucher_code': None,
+        }])[0]
+        fake.insert_rows('order_items', [dict(line, order_id=order['id']) for line in lines])
+    install_rpcs(fake)
+    return catalog
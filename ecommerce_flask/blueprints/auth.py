@@ -1,69 +1,38 @@
 # blueprints/auth.py
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from supabase import create_client
-import os, secrets, threading, requests
+import logging
+import os, secrets
 from datetime import datetime
 from urllib.parse import urlencode
 from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from services.db import supabase
+from services.mailer import mailer
+from services import google_oidc
 
 load_dotenv()
 
-# -------------------------
-# Supabase Configuration
-# -------------------------
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_KEY')
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
-
 # -------------------------
 # Google OAuth Configuration
 # -------------------------
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
-GOOGLE_DISCOVERY_URL = os.getenv('GOOGLE_DISCOVERY_URL', 'https://accounts.google.com/.well-known/openid-configuration')
 
 auth_bp = Blueprint('auth', __name__)
+log = logging.getLogger(__name__)
 
 def get_google_provider_cfg():
+    # Discovery document di-cache (lihat services/google_oidc.py)
     try:
-        return requests.get(GOOGLE_DISCOVERY_URL).json()
-    except Exception as e:
-        print("Google provider config error:", e)
+        return google_oidc.provider_config()
+    except Exception:
+        log.exception("Google provider config error")
         return None
 
 # -------------------------
-# Email Configuration
+# Email (dikirim lewat outbox di services/mailer.py, tidak memblokir request)
 # -------------------------
-EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
-EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
-EMAIL_USER = os.getenv('EMAIL_USER')
-EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
-EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
-
 def send_email(to_email, subject, body):
-    if not EMAIL_USER or not EMAIL_PASSWORD:
-        print("Email config missing, skipping")
-        return False
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USER
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'html'))
-
-        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-        if EMAIL_USE_TLS:
-            server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASSWORD)
-        server.sendmail(EMAIL_USER, to_email, msg.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        print("Error sending email:", e)
-        return False
+    return mailer.send(to_email, subject, body)
 
 def send_welcome_email(user_email, user_name):
     subject = "Welcome to 4 shoe!"
@@ -104,13 +73,13 @@ def register():
                     'role': 'user',
                     'provider': 'email'
                 }).execute()
-                threading.Thread(target=send_welcome_email, args=(email, email.split('@')[0]), daemon=True).start()
+                send_welcome_email(email, email.split('@')[0])
                 flash("Registration successful. Please login.", "success")
                 return redirect(url_for('auth.login'))
             else:
                 flash("Signup failed", "error")
-        except Exception as e:
-            print("Register error:", e)
+        except Exception:
+            log.exception("Register error")
             flash("Registration error. Check console.", "error")
     return render_template('register.html')
 
@@ -142,13 +111,13 @@ def login():
                     flash("User not found in database", "error")
                     return redirect(url_for('auth.login'))
 
-                threading.Thread(target=send_login_confirmation_email, args=(email, user_data['name']), daemon=True).start()
+                send_login_confirmation_email(email, user_data['name'])
                 flash("Login successful", "success")
                 return redirect(url_for('home'))
             else:
                 flash("Invalid email or password", "error")
-        except Exception as e:
-            print("Login error:", e)
+        except Exception:
+            log.exception("Login error")
             flash("Login failed. Check console.", "error")
     return render_template('login.html')
 
@@ -169,6 +138,9 @@ def google_login():
         flash('Google OAuth not configured', 'error')
         return redirect(url_for('auth.login'))
     google_cfg = get_google_provider_cfg()
+    if not google_cfg:
+        flash('Google login is unavailable right now', 'error')
+        return redirect(url_for('auth.login'))
     auth_endpoint = google_cfg.get("authorization_endpoint")
     params = {
         'client_id': GOOGLE_CLIENT_ID,
@@ -188,22 +160,10 @@ def google_callback():
             flash("Authorization code not received", "error")
             return redirect(url_for('auth.login'))
 
-        google_cfg = get_google_provider_cfg()
-        token_endpoint = google_cfg.get("token_endpoint")
-        token_resp = requests.post(token_endpoint, data={
-            'client_id': GOOGLE_CLIENT_ID,
-            'client_secret': GOOGLE_CLIENT_SECRET,
-            'code': code,
-            'grant_type': 'authorization_code',
-            'redirect_uri': url_for('auth.google_callback', _external=True)
-        }, headers={'Content-Type': 'application/x-www-form-urlencoded'})
-        token_resp.raise_for_status()
-        access_token = token_resp.json().get('access_token')
-
-        userinfo_endpoint = google_cfg.get("userinfo_endpoint")
-        userinfo_resp = requests.get(userinfo_endpoint, headers={'Authorization': f'Bearer {access_token}'})
-        userinfo_resp.raise_for_status()
-        user_info = userinfo_resp.json()
+        tokens = google_oidc.exchange_code(code, GOOGLE_CLIENT_SECRET,
+                                           url_for('auth.google_callback', _external=True))
+        # id_token diverifikasi lokal dengan kunci Google yang di-cache (tanpa panggilan userinfo)
+        user_info = google_oidc.user_info_from_tokens(tokens)
         email = user_info.get('email')
         name = user_info.get('name', email.split('@')[0])
 
@@ -242,12 +202,12 @@ def google_callback():
                 'login_time': datetime.now().isoformat()
             }
 
-        threading.Thread(target=send_welcome_email, args=(email, name), daemon=True).start()
-        threading.Thread(target=send_login_confirmation_email, args=(email, name), daemon=True).start()
+        send_welcome_email(email, name)
+        send_login_confirmation_email(email, name)
         flash(f"Welcome {name}!", "success")
         return redirect(url_for('home'))
 
-    except Exception as e:
-        print("Google callback error:", e)
+    except Exception:
+        log.exception("Google callback error")
         flash("Google login error", "error")
         return redirect(url_for('auth.login'))
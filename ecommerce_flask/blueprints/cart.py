@@ -1,22 +1,15 @@
 # blueprints/cart.py
+import logging
 from flask import Blueprint, session, redirect, url_for, request, flash, render_template, current_app, jsonify
-from supabase import create_client
-import os
-import requests
-from dotenv import load_dotenv
-from datetime import datetime
-
-load_dotenv()
-
-# Konfigurasi Supabase
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_KEY')
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
-
-# Kunci API Xendit (diatur di .env)
-XENDIT_API_KEY = os.getenv('XENDIT_API_KEY')
+from services.db import supabase, service_supabase
+from services.order_placement import place_order
+from services.product_repository import PRODUCT_CART_LINE, get_products_by_ids
+from services import pricing, reservations, xendit
+from services.vouchers import voucher_registry, ERROR_MESSAGES as VOUCHER_ERRORS
+from services.webhook_inbox import webhook_inbox
 
 cart_bp = Blueprint('cart', __name__, url_prefix='/cart')
+log = logging.getLogger(__name__)
 
 # -------------------------------
 # Fungsi Pembantu: Dapatkan produk berdasarkan ID
@@ -25,52 +18,84 @@ def get_product_by_id(product_id):
     if not supabase:
         return None
     try:
-        resp = supabase.table('products').select('*').eq('id', product_id).single().execute()
+        resp = supabase.table('products').select(PRODUCT_CART_LINE).eq('id', product_id).single().execute()
         return resp.data
     except Exception:
         return None
 
+# -------------------------------
+# Fungsi Pembantu: Lengkapi baris keranjang dengan data produk
+# -------------------------------
+def hydrate_cart(cart, with_products=True):
+    """Keranjang di sesi hanya berisi {product_id: {'quantity', 'price'}}.
+    Nama, gambar dan stok diambil dari katalog dengan satu query bulk
+    (dilewati jika with_products=False, mis. saat hanya menghitung total).
+    Total harga dihitung oleh cart_quote(), bukan di sini."""
+    lines = [(product_id, item) for product_id, item in cart.items()
+             if isinstance(item, dict) and 'price' in item and 'quantity' in item]
+    products = {}
+    if with_products and supabase and lines:
+        try:
+            products = get_products_by_ids(supabase, [product_id for product_id, _ in lines], PRODUCT_CART_LINE)
+        except Exception:
+            log.exception("Kesalahan mengambil produk keranjang")
+
+    cart_items = []
+    for product_id, item in lines:
+        product = products.get(int(product_id), {})
+        total_price = item['price'] * item['quantity']
+        cart_items.append({
+            'id': product_id,
+            'name': product.get('name') or item.get('name') or f'Produk #{product_id}',
+            'price': item['price'],  # harga saat produk dimasukkan ke keranjang
+            'quantity': item['quantity'],
+            'image_url': product.get('image_url') or '',
+            'total_price': total_price,
+            'stock': product.get('stock', 100)
+        })
+    return cart_items
+
+# -------------------------------
+# Fungsi Pembantu: Simpan keranjang dan hitung totalnya
+# -------------------------------
+def save_cart(cart):
+    """Simpan keranjang; cart_version naik supaya hasil cart_quote() lama tidak dipakai lagi"""
+    session['cart'] = cart
+    session['cart_version'] = session.get('cart_version', 0) + 1
+
+def clear_cart():
+    session.pop('cart', None)
+    session.pop('cart_quote', None)
+
+def cart_quote(cart, voucher):
+    """Subtotal/diskon/ongkir/total dalam sen (integer), dihitung oleh services/pricing.py.
+    Hasilnya disimpan di sesi per (cart_version, voucher) sehingga ketiga halaman
+    keranjang/checkout memakai satu perhitungan yang sama; dibulatkan ke rupiah
+    (pricing.to_rupiah) hanya saat ditampilkan atau dikirim ke place_order."""
+    key = [session.get('cart_version', 0), pricing.voucher_key(voucher)]
+    memo = session.get('cart_quote')
+    if memo and memo['key'] == key and 'minor' in memo:
+        return memo['minor']
+    lines = [item for item in cart.values() if isinstance(item, dict) and 'price' in item and 'quantity' in item]
+    minor = pricing.price_cart(lines, voucher)
+    session['cart_quote'] = {'key': key, 'minor': minor}
+    return minor
+
 # -------------------------------
 # Lihat Keranjang
 # -------------------------------
 @cart_bp.route('/')
 def view_cart():
     cart = session.get('cart', {})
-    cart_items = []
-    subtotal = 0
-    for product_id, item in cart.items():
-        if isinstance(item, dict) and 'price' in item and 'quantity' in item:
-            total_price = item['price'] * item['quantity']
-            cart_items.append({
-                'id': product_id,
-                'name': item.get('name', ''),
-                'description': item.get('description', ''),
-                'price': item['price'],
-                'quantity': item['quantity'],
-                'image_url': item.get('image_url', ''),
-                'total_price': total_price,
-                'stock': item.get('stock', 100)
-            })
-            subtotal += total_price
+    cart_items = hydrate_cart(cart)
     
     # Ambil voucher dari sesi
     applied_voucher = session.get('applied_voucher', None)
-    discount = 0
-    shipping_cost = 0 # Asumsi awal ada biaya pengiriman, nanti bisa diubah jadi gratis
-    
-    if applied_voucher:
-        if applied_voucher['type'] == 'percentage':
-            discount = subtotal * (applied_voucher['value'] / 100)
-        elif applied_voucher['type'] == 'fixed_amount':
-            discount = applied_voucher['value']
-        elif applied_voucher['type'] == 'free_shipping':
-            shipping_cost = 0 # Atau set ke nilai default jika ada
-            flash('Voucher gratis ongkir diterapkan!', 'info')
-            # Jika ada diskon lain, bisa digabungkan logikanya di sini
+    quote = cart_quote(cart, applied_voucher)
+    if applied_voucher and applied_voucher['type'] == 'free_shipping':
+        flash('Voucher gratis ongkir diterapkan!', 'info')
     
-    total = subtotal - discount + shipping_cost # Sesuaikan perhitungan total
-    
-    return render_template('cart.html', cart_items=cart_items, subtotal=subtotal, discount=discount, total=total, applied_voucher=applied_voucher)
+    return render_template('cart.html', cart_items=cart_items, subtotal=pricing.to_rupiah(quote['subtotal']), discount=pricing.to_rupiah(quote['discount']), total=pricing.to_rupiah(quote['total']), applied_voucher=applied_voucher)
 
 # -------------------------------
 # Tambah ke Keranjang
@@ -89,15 +114,12 @@ def add_to_cart(product_id):
     if key in cart:
         cart[key]['quantity'] += quantity
     else:
+        # Cukup id, jumlah dan harga; detail tampilan diambil ulang dari katalog
         cart[key] = {
-            'name': product['name'],
-            'description': product.get('description', ''),
-            'price': float(product['price']),
             'quantity': quantity,
-            'image_url': product.get('image_url', ''),
-            'stock': product.get('stock', 100)
+            'price': float(product['price'])
         }
-    session['cart'] = cart
+    save_cart(cart)
     flash('Produk ditambahkan ke keranjang', 'success')
     return redirect(url_for('cart.view_cart'))
 
@@ -130,7 +152,7 @@ def update_quantity(product_id):
         except ValueError:
             flash('Nilai jumlah tidak valid', 'error')
     
-    session['cart'] = cart
+    save_cart(cart)
     flash('Jumlah diperbarui', 'success')
     return redirect(url_for('cart.view_cart'))
 
@@ -144,11 +166,11 @@ def remove_from_cart(product_id):
 
     if not isinstance(cart, dict):
         cart = {}
-        session['cart'] = cart
+        save_cart(cart)
 
     if key in cart:
         cart.pop(key)
-        session['cart'] = cart
+        save_cart(cart)
         # Hapus voucher jika keranjang kosong setelah penghapusan
         if not cart:
             session.pop('applied_voucher', None)
@@ -162,23 +184,17 @@ def remove_from_cart(product_id):
 def apply_voucher():
     voucher_code = request.form.get('voucher_code', '').strip().upper()
     
-    # Daftar voucher yang tersedia (contoh sederhana)
-    available_vouchers = {
-        'ONGKIRGRATIS': {'type': 'free_shipping', 'value': 0, 'description': 'Gratis Ongkir'},
-        'DISKON10': {'type': 'percentage', 'value': 10, 'description': 'Diskon 10%'},
-        'HEMAT50RB': {'type': 'fixed_amount', 'value': 50000, 'description': 'Diskon Rp 50.000'}
-    }
+    # Voucher diambil dari tabel vouchers (di-cache di memori, lihat services/vouchers.py)
+    voucher = voucher_registry.lookup(voucher_code)
+    error = voucher_registry.validate(voucher)
 
-    if voucher_code in available_vouchers:
-      # Tambahan: Copy dict voucher dan tambah key 'code' untuk referensi
-      voucher_data = available_vouchers[voucher_code].copy()  # Baris baru: Copy untuk hindari modifikasi asli
-      voucher_data['code'] = voucher_code  # Baris baru: Tambah key 'code' dengan nilai kode input
-      session['applied_voucher'] = voucher_data  # Ganti: Simpan voucher_data (bukan langsung dari available_vouchers)
+    if error is None:
+      session['applied_voucher'] = voucher_registry.session_data(voucher)
       flash(f'Voucher "{voucher_code}" berhasil diterapkan!', 'success')
   
     else:
         session.pop('applied_voucher', None) # Hapus voucher yang mungkin sudah ada
-        flash('Kode voucher tidak valid atau sudah tidak berlaku.', 'error')
+        flash(VOUCHER_ERRORS[error], 'error')
     
     return redirect(url_for('cart.view_cart'))
 
@@ -211,39 +227,9 @@ def checkout_form():
         flash('Keranjang Anda kosong', 'error')
         return redirect(url_for('cart.view_cart'))
     
-    cart_items = []
-    subtotal = 0
-    total_quantity = 0  # <-- Tambahkan ini: inisialisasi total quantity
-    
-    for product_id, item in cart.items():
-        if isinstance(item, dict) and 'price' in item and 'quantity' in item:
-            total_price = item['price'] * item['quantity']
-            cart_items.append({
-                'id': product_id,
-                'name': item.get('name', ''),
-                'price': item['price'],
-                'quantity': item['quantity'],
-                'image_url': item.get('image_url', ''),
-                'total_price': total_price,
-                'stock': item.get('stock', 100)
-            })
-            subtotal += total_price
-            total_quantity += item['quantity']  # <-- Tambahkan ini: akumulasi quantity dari setiap item
-    
     # Hitung diskon dan biaya pengiriman berdasarkan voucher
     applied_voucher = session.get('applied_voucher', None)
-    discount = 0
-    shipping_cost = 0  # Default shipping cost, adjust as needed
-    
-    if applied_voucher:
-        if applied_voucher['type'] == 'percentage':
-            discount = subtotal * (applied_voucher['value'] / 100)
-        elif applied_voucher['type'] == 'fixed_amount':
-            discount = applied_voucher['value']
-        elif applied_voucher['type'] == 'free_shipping':
-            shipping_cost = 0  # Gratis ongkir
-            
-    total = subtotal - discount + shipping_cost
+    quote = cart_quote(cart, applied_voucher)
 
     if request.method == 'POST':
         shipping_info = {
@@ -260,13 +246,13 @@ def checkout_form():
         return redirect(url_for('cart.checkout_finalize'))
     
     return render_template('checkout_form.html', 
-                           cart_items=cart_items, 
-                           subtotal=subtotal, 
-                           discount=discount, 
-                           shipping_cost=shipping_cost,  # Kirim biaya pengiriman
-                           total=total,
+                           cart_items=hydrate_cart(cart), 
+                           subtotal=pricing.to_rupiah(quote['subtotal']), 
+                           discount=pricing.to_rupiah(quote['discount']), 
+                           shipping_cost=pricing.to_rupiah(quote['shipping_cost']),  # Kirim biaya pengiriman
+                           total=pricing.to_rupiah(quote['total']),
                            applied_voucher=applied_voucher,
-                           total_quantity=total_quantity)  # <-- Tambahkan ini: pass total_quantity ke template
+                           total_quantity=quote['quantity'])  # <-- Tambahkan ini: pass total_quantity ke template
 
 
 # -------------------------------
@@ -285,38 +271,12 @@ def checkout_finalize():
         flash('Keranjang atau informasi pengiriman tidak ada', 'error')
         return redirect(url_for('cart.view_cart'))
 
-    # siapkan item keranjang untuk ditampilkan
-    cart_items = []
-    subtotal = 0
-    for product_id, item in cart.items():
-        if isinstance(item, dict) and 'price' in item and 'quantity' in item:
-            total_price = item['price'] * item['quantity']
-            cart_items.append({
-                'id': product_id,
-                'name': item.get('name', ''),
-                'price': item['price'],
-                'quantity': item['quantity'],
-                'image_url': item.get('image_url', ''),
-                'total_price': total_price,
-                'stock': item.get('stock', 100)
-            })
-            subtotal += total_price
+    # siapkan item keranjang (detail produk hanya perlu untuk ditampilkan, bukan saat POST)
+    cart_items = hydrate_cart(cart, with_products=request.method == 'GET')
 
     # Hitung diskon dan biaya pengiriman berdasarkan voucher
     applied_voucher = session.get('applied_voucher', None)
-    discount = 0
-    shipping_cost = 0 # Default shipping cost, adjust as needed
-    
-    if applied_voucher:
-        if applied_voucher['type'] == 'percentage':
-            discount = subtotal * (applied_voucher['value'] / 100)
-        elif applied_voucher['type'] == 'fixed_amount':
-            discount = applied_voucher['value']
-        elif applied_voucher['type'] == 'free_shipping':
-            shipping_cost = 0 # Gratis ongkir
-            
-    total = subtotal - discount + shipping_cost
-    total_int = int(round(total))
+    quote = cart_quote(cart, applied_voucher)
 
     if request.method == 'POST':
         # validasi id pengguna di sesi (integer)
@@ -329,114 +289,81 @@ def checkout_finalize():
             flash('Keranjang kosong atau tidak valid.', 'error')
             return redirect(url_for('cart.view_cart'))
         
-        #Pengurangan Stok
-        #Periksa stok sebelum membuat pesanan
-        for item in cart_items:
-            product_id = int(item['id'])
-            quantity_ordered = item['quantity']
-
-            product_db = get_product_by_id(product_id)
-            if not product_db or product_db['stock'] < quantity_ordered:
-                flash(f"Stok untuk produk '{item['name']}' tidak mencukupi. Tersedia: {product_db['stock'] if product_db else 0}, Diminta: {quantity_ordered}", 'error')
+        # buat pesanan di supabase: harga dan total dihitung ulang dari tabel products/vouchers,
+        # cek stok, simpan order + order_items, dan tahan stok dalam satu transaksi di server
+        # (fungsi Postgres place_order, hanya bisa dipanggil dengan service key)
+        try:
+            result = place_order(
+                service_supabase,
+                user_id,
+                [{'product_id': item['id'], 'quantity': item['quantity']} for item in cart_items],
+                expected_total=pricing.to_rupiah(quote['total']),  # total yang dilihat pembeli
+                voucher_code=applied_voucher.get('code') if applied_voucher else None,  # Simpan kode (misalnya 'DISKON10')
+                hold_seconds=current_app.config.get('RESERVATION_TTL', 1800)  # Stok ditahan selama pembayaran
+            )
+
+            if result['voucher_error']:
+                # Batas pemakaian diperiksa ulang secara atomik saat pesanan dibuat
+                session.pop('applied_voucher', None)
+                voucher_registry.invalidate()
+                flash(VOUCHER_ERRORS.get(result['voucher_error'], VOUCHER_ERRORS['invalid']), 'error')
                 return redirect(url_for('cart.view_cart'))
 
-        # buat pesanan di supabase
-        try:
-            order_resp = supabase.table('orders').insert({
-                'user_id': user_id,
-                'total': total_int,
-                'status': 'pending',
-                'created_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
-                'discount_amount': int(round(discount)), # Simpan jumlah diskon
-                'shipping_cost': int(round(shipping_cost)), # Simpan biaya pengiriman
-                'voucher_code': applied_voucher.get('code') if applied_voucher else None  # Ganti: Simpan kode (misalnya 'DISKON10') ke kolom DB
-            }).execute()
-
-            if not order_resp.data or len(order_resp.data) == 0:
-                flash('Gagal membuat pesanan', 'error')
+            if result['price_changed']:
+                # Harga atau voucher berubah sejak keranjang dihitung: perbarui keranjang dan tampilkan ulang
+                for line in result['prices']:
+                    key = str(line['product_id'])
+                    if key in cart:
+                        cart[key]['price'] = float(line['price'])
+                save_cart(cart)
+                if result['voucher']:
+                    session['applied_voucher'] = voucher_registry.session_data(result['voucher'])
+                voucher_registry.invalidate()
+                flash('Harga atau voucher telah berubah. Periksa kembali total pesanan Anda.', 'info')
+                return redirect(url_for('cart.view_cart'))
+
+            if not result['ok']:
+                products = get_products_by_ids(supabase, [line['product_id'] for line in result['insufficient']], 'id, name')
+                names = {product_id: product['name'] for product_id, product in products.items()}
+                for line in result['insufficient']:
+                    flash(f"Stok untuk produk '{names.get(line['product_id'], line['product_id'])}' tidak mencukupi. Tersedia: {line['available']}, Diminta: {line['requested']}", 'error')
+                if not result['insufficient']:
+                    flash('Gagal membuat pesanan', 'error')
                 return redirect(url_for('cart.view_cart'))
 
-            order_id = order_resp.data[0]['id']
-
-            # masukkan order_items
-            order_items = []
-            for pid, item in cart.items():
-                try:
-                    product_id_int = int(pid)
-                except Exception:
-                    continue
-                order_items.append({
-                    'order_id': order_id,
-                    'product_id': product_id_int,
-                    'quantity': item['quantity'],
-                    'price': int(round(item['price']))
-                })
-            if order_items:
-                supabase.table('order_items').insert(order_items).execute()
-
-            #Pengurangan stok
-            for item in cart_items:
-                product_id = int(item['id'])
-                quantity_ordered = item['quantity']
-
-                product_db = get_product_by_id(product_id)
-                if product_db:
-                    new_stock = product_db['stock'] - quantity_ordered
-                    supabase.table('products').update({'stock': new_stock}).eq('id', product_id).execute()
-                else:
-                    print(f"Warning: Product {product_id} not found during stock update.")
+            order_id = result['order_id']
 
             # lampirkan informasi pengiriman ke pesanan (opsional) - jika tabel pesanan Anda memiliki kolom json pengiriman, Anda dapat memperbaruinya
             # mis., supabase.table('orders').update({'shipping': shipping_info}).eq('id', order_id).execute()
 
             # buat invoice Xendit
-            if not XENDIT_API_KEY:
+            if not xendit.is_configured():
                 flash('Layanan pembayaran tidak dikonfigurasi. Pesanan dibuat sebagai tertunda (demo).', 'info')
-                session.pop('cart', None)
+                clear_cart()
                 session.pop('shipping_info', None)
                 session.pop('applied_voucher', None) # Hapus voucher setelah pesanan dibuat
                 return redirect(url_for('orders.order_history'))
 
             invoice_payload = {
                 "external_id": f"order-{order_id}",
-                "amount": total_int,
+                "amount": int(result['total']),
                 "payer_email": session['user'].get('email'),
                 "description": f"Pembayaran untuk pesanan #{order_id}",
                 "success_redirect_url": url_for('cart.payment_success', order_id=order_id, _external=True),
-                "failure_redirect_url": url_for('cart.payment_failed', order_id=order_id, _external=True)
+                "failure_redirect_url": url_for('cart.payment_failed', order_id=order_id, _external=True),
+                # Invoice kedaluwarsa bersamaan dengan hold stok
+                "invoice_duration": current_app.config.get('RESERVATION_TTL', 1800)
             }
 
-            resp = requests.post(
-                "https://api.xendit.co/v2/invoices",
-                auth=(XENDIT_API_KEY, ""),
-                json=invoice_payload,
-                timeout=15
-            )
+            # Invoice dibuat oleh job queue di background; halaman "preparing" menunggu invoice_url
+            xendit.enqueue_invoice(order_id, user_id, invoice_payload)
 
-            try:
-                invoice = resp.json()
-            except Exception:
-                invoice = None
-
-            if resp.status_code in (200, 201) and invoice and invoice.get('invoice_url'):
-                # perbarui pesanan dengan info invoice
-                supabase.table('orders').update({
-                    'invoice_id': invoice.get('id'),
-                    'invoice_url': invoice.get('invoice_url')
-                }).eq('id', order_id).execute()
-
-                # Redirect langsung ke halaman invoice Xendit
-                # Jangan hapus cart dan shipping_info di sini
-                session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran dimulai
-                return redirect(invoice.get('invoice_url'))
-            else:
-                # pembuatan invoice gagal — simpan pesanan, tetapi informasikan pengguna
-                print("Kesalahan invoice Xendit:", resp.status_code, resp.text)
-                flash('Gagal membuat invoice pembayaran. Silakan hubungi admin.', 'error')
-                return redirect(url_for('orders.order_history'))
+            # Jangan hapus cart dan shipping_info di sini
+            session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran dimulai
+            return redirect(url_for('cart.payment_preparing', order_id=order_id))
 
         except Exception as e:
-            print("❌ Kesalahan checkout:", e)
+            log.exception("Kesalahan checkout")
             flash(f'Kesalahan memproses pesanan: {e}', 'error')
             return redirect(url_for('cart.view_cart'))
 
@@ -444,10 +371,10 @@ def checkout_finalize():
     return render_template('checkout_finalize.html', 
                            cart=cart_items, 
                            shipping=shipping_info, 
-                           subtotal=subtotal, 
-                           discount=discount, 
-                           shipping_cost=shipping_cost, # Kirim biaya pengiriman
-                           total=total,
+                           subtotal=pricing.to_rupiah(quote['subtotal']), 
+                           discount=pricing.to_rupiah(quote['discount']), 
+                           shipping_cost=pricing.to_rupiah(quote['shipping_cost']), # Kirim biaya pengiriman
+                           total=pricing.to_rupiah(quote['total']),
                            applied_voucher=applied_voucher)
 
 # -------------------------------
@@ -459,6 +386,52 @@ def checkout_finalize():
 #
 # Contoh: formulir POST ke payment/simulate atau anchor ke invoice_url target="_blank"
 
+# -------------------------------
+# Menunggu invoice Xendit dari job queue
+# -------------------------------
+def _invoice_job_for_user(order_id):
+    """Job invoice milik pengguna yang login (dibaca dari file job lokal, tanpa query Supabase)"""
+    job = xendit.invoice_status(order_id)
+    if job is None or job['payload'].get('user_id') != session['user'].get('id'):
+        return None
+    return job
+
+@cart_bp.route('/payment/preparing/<int:order_id>')
+def payment_preparing(order_id):
+    if 'user' not in session:
+        flash('Silakan login', 'error')
+        return redirect(url_for('auth.login'))
+
+    job = _invoice_job_for_user(order_id)
+    if job is None:
+        flash('Pesanan tidak ditemukan', 'error')
+        return redirect(url_for('orders.order_history'))
+    if job['status'] == 'done':
+        return redirect(job['result']['invoice_url'])
+    return render_template('payment_preparing.html', order_id=order_id, failed=job['status'] == 'failed')
+
+@cart_bp.route('/payment/status/<int:order_id>')
+def payment_status(order_id):
+    if 'user' not in session:
+        return jsonify({'status': 'unauthorized'}), 401
+
+    job = _invoice_job_for_user(order_id)
+    if job is None:
+        return jsonify({'status': 'not_found'}), 404
+    return jsonify({
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'invoice_url': (job['result'] or {}).get('invoice_url')
+    })
+
+def _order_for_user(order_id):
+    """Pesanan ``order_id`` jika milik pengguna yang login, selain itu None"""
+    if 'user' not in session:
+        return None
+    rows = (supabase.table('orders').select('id, status')
+            .eq('id', order_id).eq('user_id', session['user'].get('id')).limit(1).execute().data or [])
+    return rows[0] if rows else None
+
 # -------------------------------
 # Simulasi Pembayaran (demo) - tandai pesanan sebagai dibayar
 # -------------------------------
@@ -469,56 +442,74 @@ def payment_simulate(order_id):
         flash('Silakan login', 'error')
         return redirect(url_for('auth.login'))
 
-    # Konfirmasi bahwa pesanan milik pengguna (opsional)
+    # Hanya pesanan milik pengguna yang masih menunggu pembayaran
     try:
-        resp = supabase.table('orders').select('*').eq('id', order_id).single().execute()
-        order = resp.data
+        order = _order_for_user(order_id)
         if not order:
             flash('Pesanan tidak ditemukan', 'error')
             return redirect(url_for('orders.order_history'))
-        # perbarui status
+        if order['status'] != 'pending':
+            flash(f'Status pesanan adalah {order["status"]}. Tidak dapat disimulasikan.', 'error')
+            return redirect(url_for('orders.order_history'))
+        # perbarui status dan jadikan hold stok permanen
         supabase.table('orders').update({'status': 'success'}).eq('id', order_id).execute()
+        if reservations.commit(service_supabase, [order_id])['shortfall']:
+            supabase.table('orders').update({'status': 'out_of_stock'}).eq('id', order_id).execute()
+            flash('Pembayaran diterima, tetapi stok sudah habis. Admin akan menghubungi Anda.', 'error')
+            return redirect(url_for('orders.order_history'))
         
         # Hapus cart dan shipping_info setelah pembayaran berhasil (simulasi)
-        session.pop('cart', None)
+        clear_cart()
         session.pop('shipping_info', None)
         session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran berhasil
 
         flash('Pesanan berhasil dibayar (disimulasikan).', 'success')
         return redirect(url_for('orders.order_history'))
-    except Exception as e:
-        print("Kesalahan simulasi pembayaran:", e)
+    except Exception:
+        log.exception("Kesalahan simulasi pembayaran")
         flash('Kesalahan simulasi', 'error')
         return redirect(url_for('orders.order_history'))
 
 # -------------------------------
 # Penangan redirect untuk Xendit
 # -------------------------------
+# Halaman ini hanya menampilkan pesan: URL redirect bisa dibuka siapa saja, jadi status
+# pesanan dan stok hanya diubah oleh webhook (services/webhook_inbox.py) yang diverifikasi.
 @cart_bp.route('/payment/success/<int:order_id>')
 def payment_success(order_id):
     try:
-        supabase.table('orders').update({'status': 'success'}).eq('id', order_id).execute()
-        
-        # Hapus cart dan shipping_info setelah pembayaran berhasil
-        session.pop('cart', None)
-        session.pop('shipping_info', None)
-        session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran berhasil
+        order = _order_for_user(order_id)
+    except Exception:
+        log.exception("Kesalahan penangan sukses pembayaran")
+        order = None
+    if not order:
+        flash('Pesanan tidak ditemukan', 'error')
+        return redirect(url_for('orders.order_history'))
+
+    # Hapus cart dan shipping_info setelah pembayaran berhasil
+    clear_cart()
+    session.pop('shipping_info', None)
+    session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran berhasil
 
+    if order['status'] == 'pending':
+        flash('Pembayaran diterima. Status pesanan diperbarui setelah konfirmasi dari Xendit.', 'success')
+    else:
         flash('Pesanan berhasil dibayar!', 'success')
-    except Exception as e:
-        print("Kesalahan penangan sukses pembayaran:", e)
-        flash('Pembayaran berhasil tetapi tidak dapat memperbarui pesanan. Hubungi admin.', 'error')
     return redirect(url_for('orders.order_history'))
 
 @cart_bp.route('/payment/failed/<int:order_id>')
 def payment_failed(order_id):
     try:
-        # Perbarui status order menjadi 'failed'
-        supabase.table('orders').update({'status': 'failed'}).eq('id', order_id).execute()
-        # Jangan hapus cart dan shipping_info di sini, biarkan pengguna kembali ke checkout_finalize
-        # Voucher tetap dipertahankan agar pengguna bisa mencoba lagi dengan voucher yang sama
-    except Exception as e:
-        print("Kesalahan penangan gagal pembayaran:", e)
+        order = _order_for_user(order_id)
+    except Exception:
+        log.exception("Kesalahan penangan gagal pembayaran")
+        order = None
+    if not order:
+        flash('Pesanan tidak ditemukan', 'error')
+        return redirect(url_for('orders.order_history'))
+    # Stok yang ditahan dikembalikan oleh webhook (invoice EXPIRED) atau sweeper hold
+    # Jangan hapus cart dan shipping_info di sini, biarkan pengguna kembali ke checkout_finalize
+    # Voucher tetap dipertahankan agar pengguna bisa mencoba lagi dengan voucher yang sama
     flash('Pembayaran gagal atau dibatalkan. Silakan coba lagi.', 'error')
     # Arahkan kembali ke halaman checkout_finalize
     return redirect(url_for('cart.checkout_finalize'))
@@ -528,100 +519,82 @@ def payment_failed(order_id):
 # -------------------------------
 @cart_bp.route('/payment/webhook', methods=['POST'])
 def payment_webhook():
+    # Hanya callback dari Xendit (header x-callback-token) yang diterima
+    if not xendit.verify_callback(request.headers.get('x-callback-token')):
+        log.warning("Webhook dengan callback token tidak valid", extra={'remote_addr': request.remote_addr})
+        return jsonify({'status': 'forbidden'}), 403
+    # Event hanya dicatat (dideduplikasi per invoice + status) lalu diterapkan
+    # oleh worker di services/webhook_inbox.py, jadi Xendit langsung mendapat 200
+    payload = request.get_json(force=True, silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'status': 'ignored'}), 200
     try:
-        payload = request.get_json(force=True)
-        # Xendit mengirimkan notifikasi dengan field 'external_id' dan 'status' (dan 'id')
-        external_id = payload.get('external_id') or (payload.get('data') or {}).get('external_id')
-        status = payload.get('status') or (payload.get('data') or {}).get('status')
-        invoice_id = payload.get('id') or (payload.get('data') or {}).get('id')
-
-        if external_id:
-            # format external_id yang diharapkan: "order-<order_id>"
-            try:
-                order_id = int(str(external_id).split('-')[1])
-            except Exception:
-                order_id = None
-        else:
-            order_id = None
-
-        new_status = None
-        if status:
-            # Petakan status Xendit ke status kita
-            s = status.lower()
-            if s in ('paid', 'PAID'.lower()):
-                new_status = 'success'
-            elif s in ('pending',):
-                new_status = 'pending'
-            elif s in ('expired', 'failed', 'VOID'):
-                new_status = 'failed'
-
-        if order_id and new_status:
-            supabase.table('orders').update({'status': new_status, 'invoice_id': invoice_id}).eq('id', order_id).execute()
-            # Jika pembayaran berhasil melalui webhook, hapus cart dan shipping_info
-            if new_status == 'success':
-                session.pop('cart', None)
-                session.pop('shipping_info', None)
-                session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran berhasil
-        elif invoice_id and new_status:
-            # fallback: coba temukan pesanan berdasarkan invoice_id
-            sup = supabase.table('orders').select('*').eq('invoice_id', invoice_id).execute()
-            if sup.data:
-                supabase.table('orders').update({'status': new_status}).eq('invoice_id', invoice_id).execute()
-                # Jika pembayaran berhasil melalui webhook, hapus cart dan shipping_info
-                if new_status == 'success':
-                    session.pop('cart', None)
-                    session.pop('shipping_info', None)
-                    session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran berhasil
-
-    except Exception as e:
-        print("Kesalahan penanganan webhook:", e)
-    return jsonify({'status': 'ok'}), 200
+        result = webhook_inbox.record(payload)
+    except Exception:
+        # Gagal disimpan: balas error supaya Xendit mengirim ulang
+        log.exception("Kesalahan penanganan webhook")
+        return jsonify({'status': 'error'}), 500
+    return jsonify({'status': result}), 200
 
 # -------------------------------
-# Opsional: rute /payment/create langsung jika Anda lebih suka alur terpisah
+# Invoice untuk pesanan yang sudah ada (riwayat pesanan / rute eksplisit)
 # -------------------------------
-@cart_bp.route('/payment/create/<int:order_id>', methods=['POST'])
-def create_xendit_invoice_explicit(order_id):
-    """
-    Endpoint eksplisit alternatif untuk membuat invoice untuk pesanan yang sudah ada dan mengarahkan ke invoice_url.
-    """
-    if 'user' not in session:
-        flash('Silakan login', 'error')
-        return redirect(url_for('auth.login'))
-    # ambil pesanan
-    resp = supabase.table('orders').select('*').eq('id', order_id).single().execute()
-    order = resp.data
+# Invoice yang sisa waktunya lebih pendek dari ini tidak sempat dibayar
+MIN_INVOICE_SECONDS = 60
+
+def _enqueue_invoice_for_order(order_id):
+    """Antrikan invoice untuk pesanan pending milik pengguna yang login; kembalikan response redirect"""
+    order_resp = supabase.table('orders').select('*').eq('id', order_id).eq('user_id', session['user']['id']).limit(1).execute()
+    order = (order_resp.data or [None])[0]
+
     if not order:
-        flash('Pesanan tidak ditemukan', 'error')
+        flash('Pesanan tidak ditemukan atau bukan milik Anda.', 'error')
         return redirect(url_for('orders.order_history'))
 
-    if not XENDIT_API_KEY:
-        flash('Layanan pembayaran tidak dikonfigurasi', 'error')
+    if order['status'] != 'pending':
+        flash(f'Status pesanan adalah {order["status"]}. Tidak dapat melanjutkan pembayaran.', 'error')
         return redirect(url_for('orders.order_history'))
 
-    payload = {
+    if not xendit.is_configured():
+        flash('Layanan pembayaran tidak dikonfigurasi. Pesanan tetap tertunda (demo).', 'info')
+        return redirect(url_for('orders.order_history'))
+
+    # Invoice kedaluwarsa bersamaan dengan hold stok; setelah itu sweeper mengembalikan stok dan voucher
+    remaining = reservations.hold_remaining(service_supabase, order_id)
+    if remaining < MIN_INVOICE_SECONDS:
+        flash('Waktu pembayaran pesanan ini sudah habis. Silakan buat pesanan baru.', 'error')
+        return redirect(url_for('orders.order_history'))
+
+    invoice_payload = {
         "external_id": f"order-{order_id}",
         "amount": int(order['total']),
         "payer_email": session['user'].get('email'),
         "description": f"Pembayaran untuk pesanan #{order_id}",
         "success_redirect_url": url_for('cart.payment_success', order_id=order_id, _external=True),
-        "failure_redirect_url": url_for('cart.payment_failed', order_id=order_id, _external=True)
+        "failure_redirect_url": url_for('cart.payment_failed', order_id=order_id, _external=True),
+        "invoice_duration": remaining
     }
 
+    xendit.enqueue_invoice(order_id, session['user']['id'], invoice_payload)
+    session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran dimulai
+    return redirect(url_for('cart.payment_preparing', order_id=order_id))
+
+# -------------------------------
+# Opsional: rute /payment/create langsung jika Anda lebih suka alur terpisah
+# -------------------------------
+@cart_bp.route('/payment/create/<int:order_id>', methods=['POST'])
+def create_xendit_invoice_explicit(order_id):
+    """
+    Endpoint eksplisit alternatif untuk membuat invoice untuk pesanan yang sudah ada dan mengarahkan ke invoice_url.
+    """
+    if 'user' not in session:
+        flash('Silakan login', 'error')
+        return redirect(url_for('auth.login'))
+
     try:
-        r = requests.post("https://api.xendit.co/v2/invoices", auth=(XENDIT_API_KEY, ""), json=payload, timeout=15)
-        invoice = r.json()
-        if r.status_code in (200, 201) and invoice.get('invoice_url'):
-            supabase.table('orders').update({'invoice_id': invoice.get('id'), 'invoice_url': invoice.get('invoice_url')}).eq('id', order_id).execute()
-            # Jangan hapus cart dan shipping_info di sini
-            session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran dimulai
-            return redirect(invoice.get('invoice_url'))
-        else:
-            print("Kesalahan eksplisit pembuatan Xendit:", r.status_code, r.text)
-            flash('Gagal membuat invoice', 'error')
-            return redirect(url_for('orders.order_history'))
-    except Exception as e:
-        print("Kesalahan pembuatan invoice:", e)
+        return _enqueue_invoice_for_order(order_id)
+    except Exception:
+        log.exception("Kesalahan pembuatan invoice")
         flash('Kesalahan layanan pembayaran', 'error')
         return redirect(url_for('orders.order_history'))
 
@@ -635,64 +608,10 @@ def checkout_finalize_from_history(order_id):
         return redirect(url_for('auth.login'))
 
     try:
-        # Ambil detail pesanan
-        order_resp = supabase.table('orders').select('*').eq('id', order_id).eq('user_id', session['user']['id']).single().execute()
-        order = order_resp.data
-
-        if not order:
-            flash('Pesanan tidak ditemukan atau bukan milik Anda.', 'error')
-            return redirect(url_for('orders.order_history'))
-
-        if order['status'] != 'pending':
-            flash(f'Status pesanan adalah {order["status"]}. Tidak dapat melanjutkan pembayaran.', 'error')
-            return redirect(url_for('orders.order_history'))
-
-        # Ambil item pesanan untuk merekonstruksi keranjang untuk ditampilkan jika diperlukan, meskipun tidak terlalu penting untuk payload Xendit
-        # Ini penting jika checkout_finalize digunakan untuk merender halaman sebelum mengarahkan ke Xendit
-        # Untuk saat ini, kita akan langsung membuat invoice Xendit.
-        
-        if not XENDIT_API_KEY:
-            flash('Layanan pembayaran tidak dikonfigurasi. Pesanan tetap tertunda (demo).', 'info')
-            return redirect(url_for('orders.order_history'))
-
-        invoice_payload = {
-            "external_id": f"order-{order_id}",
-            "amount": int(order['total']),
-            "payer_email": session['user'].get('email'),
-            "description": f"Pembayaran untuk pesanan #{order_id}",
-            "success_redirect_url": url_for('cart.payment_success', order_id=order_id, _external=True),
-            "failure_redirect_url": url_for('cart.payment_failed', order_id=order_id, _external=True)
-        }
-
-        resp = requests.post(
-            "https://api.xendit.co/v2/invoices",
-            auth=(XENDIT_API_KEY, ""),
-            json=invoice_payload,
-            timeout=15
-        )
-
-        try:
-            invoice = resp.json()
-        except Exception:
-            invoice = None
-
-        if resp.status_code in (200, 201) and invoice and invoice.get('invoice_url'):
-            # Perbarui pesanan dengan info invoice
-            supabase.table('orders').update({
-                'invoice_id': invoice.get('id'),
-                'invoice_url': invoice.get('invoice_url')
-            }).eq('id', order_id).execute()
-
-            # Redirect langsung ke halaman invoice Xendit
-            session.pop('applied_voucher', None) # Hapus voucher setelah pembayaran dimulai
-            return redirect(invoice.get('invoice_url'))
-        else:
-            print("Kesalahan invoice Xendit dari riwayat:", resp.status_code, resp.text)
-            flash('Gagal membuat invoice pembayaran. Silakan hubungi admin.', 'error')
-            return redirect(url_for('orders.order_history'))
+        return _enqueue_invoice_for_order(order_id)
 
     except Exception as e:
-        print("❌ Kesalahan checkout dari riwayat:", e)
+        log.exception("Kesalahan checkout dari riwayat")
         flash(f'Kesalahan memproses pembayaran: {e}', 'error')
         return redirect(url_for('orders.order_history'))
 
@@ -1,28 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from supabase import create_client
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
+from postgrest import APIError
+import logging
 import os
 from datetime import datetime
 from dotenv import load_dotenv
+from services.db import supabase, service_supabase
+from services.pagination import keyset_page
+from services.product_repository import get_products_by_ids, PRODUCT_CART_LINE, PRODUCT_SUMMARY
 
 load_dotenv()
 
-supabase_url = os.getenv('SUPABASE_URL')
-supabase_key = os.getenv('SUPABASE_KEY')
-supabase = None
-
-# Initialize Supabase only if credentials are provided
-if supabase_url and supabase_key and supabase_url != 'your-supabase-url-here' and supabase_key != 'your-supabase-key-here':
-    try:
-        supabase = create_client(supabase_url, supabase_key)
-        print("[OK] Supabase client initialized successfully in orders blueprint")
-    except Exception as e:
-        print(f"[ERROR] Error initializing Supabase client in orders blueprint: {e}")
-        supabase = None
-else:
-    print("[WARNING] Supabase credentials not configured. Order features will be limited.")
-    supabase = None
-
 orders_bp = Blueprint('orders', __name__)
+log = logging.getLogger(__name__)
 
 @orders_bp.route('/checkout', methods=['GET', 'POST'])
 def checkout():
@@ -35,13 +24,18 @@ def checkout():
         flash('Your cart is empty', 'info')
         return redirect(url_for('cart.view_cart'))
 
-    # Ambil detail produk untuk setiap item di keranjang
+    # Keranjang di sesi berbentuk {product_id: item}
+    if isinstance(cart, dict):
+        cart = [{'product_id': pid, 'quantity': item['quantity']} for pid, item in cart.items()]
+
+    # Ambil detail semua produk di keranjang dalam satu query
+    products_by_id = get_products_by_ids(supabase, [item['product_id'] for item in cart], PRODUCT_CART_LINE) if supabase else {}
+
     cart_items = []
     total = 0
     for item in cart:
         if supabase:
-            response = supabase.table('products').select('*').eq('id', item['product_id']).execute()
-            product_detail = response.data[0] if response.data else None
+            product_detail = products_by_id.get(int(item['product_id']))
         else:
             product_detail = {
                 'id': item['product_id'],
@@ -87,50 +81,51 @@ def order_confirmation(order_id):
         return redirect(url_for('home'))
     
     try:
-        # Ambil order dengan kolom baru
-        response = supabase.table('orders').select('*, discount_amount, shipping_cost, voucher_code').eq('id', order_id).eq('user_id', session['user']['id']).single().execute()
+        # Ambil order + order_items + ringkasan produk dalam satu query (embedded select)
+        try:
+            response = supabase.table('orders') \
+                .select(f'*, order_items(product_id, quantity, price, products({PRODUCT_SUMMARY}))') \
+                .eq('id', order_id).eq('user_id', session['user']['id']).single().execute()
+        except APIError as e:
+            # PGRST200: relasi order_items -> products tidak ada di schema cache
+            if e.code != 'PGRST200':
+                raise
+            log.warning("Embedded product select failed: %s", e, extra={'order_id': order_id})
+            response = supabase.table('orders') \
+                .select('*, order_items(product_id, quantity, price)') \
+                .eq('id', order_id).eq('user_id', session['user']['id']).single().execute()
         order = response.data
         
         if not order:
             flash('Order not found', 'error')
             return redirect(url_for('home'))
         
-        # Ambil order_items untuk order ini
-        try:
-            order_items_response = supabase.table('order_items').select('*').eq('order_id', order['id']).execute()
-            order_items = order_items_response.data if order_items_response.data else []
-            
-            # Ambil informasi produk untuk setiap item
-            detailed_items = []
-            for item in order_items:
-                try:
-                    product_response = supabase.table('products').select('*').eq('id', item['product_id']).execute()
-                    product = product_response.data[0] if product_response.data else None
-                    
-                    detailed_items.append({
-                        'quantity': item['quantity'],
-                        'price': item['price'],
-                        'total_price': item['quantity'] * item['price'],
-                        'product': product
-                    })
-                except Exception as e:
-                    print(f"❌ Error getting product info for item {item.get('product_id', 'unknown')}: {e}")
-                    # Tambahkan item tanpa informasi produk jika gagal mengambil
-                    detailed_items.append({
-                        'quantity': item['quantity'],
-                        'price': item['price'],
-                        'total_price': item['quantity'] * item['price'],
-                        'product': {'name': f'Product #{item.get("product_id", "unknown")}'}
-                    })
-            
-            order['items'] = detailed_items
-        except Exception as e:
-            print(f"❌ Error getting items for order {order_id}: {e}")
-            order['items'] = []
+        order_items = order.pop('order_items', None) or []
+        
+        # Fallback: satu query in_() untuk item yang produknya tidak ikut ter-embed
+        missing_ids = [item['product_id'] for item in order_items if not item.get('products')]
+        products = {}
+        if missing_ids:
+            try:
+                products = get_products_by_ids(supabase, missing_ids, PRODUCT_SUMMARY)
+            except Exception:
+                log.exception("Error getting product info", extra={'order_id': order_id})
+        
+        detailed_items = []
+        for item in order_items:
+            product = item.get('products') or products.get(item['product_id'])
+            detailed_items.append({
+                'product_id': item['product_id'],
+                'quantity': item['quantity'],
+                'price': item['price'],
+                'total_price': item['quantity'] * item['price'],
+                'product': product
+            })
+        order['items'] = detailed_items
         
         return render_template('order_confirmation.html', order=order)
-    except Exception as e:
-        print("❌ Error loading order confirmation:", e)
+    except Exception:
+        log.exception("Error loading order confirmation")
         flash('Error loading order', 'error')
         return redirect(url_for('home'))
 
@@ -149,11 +144,7 @@ def order_history():
 
         # Ambil semua product info agar bisa tampil nama & gambar
         product_ids = [item['product_id'] for order in orders for item in order.get('order_items', [])]
-        products = {}
-        if product_ids:
-            products_resp = supabase.table('products').select('id, name, image_url').in_('id', product_ids).execute()
-            for p in products_resp.data:
-                products[p['id']] = p
+        products = get_products_by_ids(supabase, product_ids, PRODUCT_SUMMARY)
 
         # Tambahkan info produk ke tiap order_item
         for order in orders:
@@ -165,8 +156,8 @@ def order_history():
 
         return render_template('order_history.html', orders=orders)
 
-    except Exception as e:
-        print("❌ Error loading order history:", e)
+    except Exception:
+        log.exception("Error loading order history")
         flash("Error loading order history", "error")
         return render_template('order_history.html', orders=[])
 
@@ -182,15 +173,26 @@ def admin_orders():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('home'))
     
+    after = request.args.get('after', type=int)  # cursor: id order terakhir di halaman sebelumnya
+    page_size = current_app.config.get('ADMIN_PAGE_SIZE', 50)
+    
     try:
-        # Ambil order dengan kolom baru
-        response = supabase.table('orders').select('*, discount_amount, shipping_cost, voucher_code').order('created_at', desc=True).execute()
-        orders = response.data if response.data else []
+        # Ambil satu halaman order terbaru (id menurun = created_at menurun)
+        orders, next_cursor = keyset_page(
+            supabase.table('orders').select('*, discount_amount, shipping_cost, voucher_code'),
+            after, page_size, desc=True
+        )
+        
+        # Statistik dihitung di database (satu query GROUP BY status), bukan dari halaman yang sedang tampil
+        status_counts = service_supabase.rpc('order_status_counts', {}).execute().data or {}
         
-        return render_template('admin_orders.html', orders=orders)
-    except Exception as e:
+        return render_template('admin_orders.html', orders=orders, status_counts=status_counts,
+                               next_url=url_for('orders.admin_orders', after=next_cursor) if next_cursor else None,
+                               first_url=url_for('orders.admin_orders') if after else None)
+    except Exception:
+        log.exception("Error loading orders")
         flash('Error loading orders', 'error')
-        return render_template('admin_orders.html', orders=[])
+        return render_template('admin_orders.html', orders=[], status_counts={})
 
 @orders_bp.route('/admin/update_status/<int:order_id>', methods=['POST'])
 def update_order_status(order_id):
@@ -212,7 +214,8 @@ def update_order_status(order_id):
         }).eq('id', order_id).execute()
         
         flash('Order status updated!', 'success')
-    except Exception as e:
+    except Exception:
+        log.exception("Error updating order status", extra={'order_id': order_id})
         flash('Error updating order status', 'error')
     
     return redirect(url_for('orders.admin_orders'))
@@ -1,57 +1,67 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-from supabase import create_client
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, current_app
+import logging
 import os
 from dotenv import load_dotenv
+from services.brands import brand_index, detect_brand
+from services.catalog_cache import catalog_cache
+from services.page_cache import cached_page
+from services.db import supabase
+from services.pagination import keyset_page
+from services.product_repository import PRODUCT_CARD, PRODUCT_DETAIL, PRODUCT_PAGE, get_products_by_ids, get_stock
+from services.related import related_index
+from services.search import search_index
+from services.sizes import ALL_SIZES, clean_sizes, normalize_size, size_index
 
 load_dotenv()
 
-supabase_url = os.getenv('SUPABASE_URL')
-supabase_key = os.getenv('SUPABASE_KEY')
-supabase = None
+products_bp = Blueprint('products', __name__)
+log = logging.getLogger(__name__)
 
-# Initialize Supabase only if credentials are provided
-if supabase_url and supabase_key and supabase_url != 'your-supabase-url-here' and supabase_key != 'your-supabase-key-here':
-    try:
-        supabase = create_client(supabase_url, supabase_key)
-        print("[OK] Supabase client initialized successfully in products blueprint")
-    except Exception as e:
-        print(f"[ERROR] Error initializing Supabase client in products blueprint: {e}")
-        supabase = None
-else:
-    print("[WARNING] Supabase credentials not configured. Product features will be limited.")
-    supabase = None
 
-products_bp = Blueprint('products', __name__)
+def _index_product(product):
+    """Update the in-memory indexes (brand, search, size, related) after a product is added or edited"""
+    brand_index.set_brand(product['id'], product.get('brand'))
+    search_index.upsert(product)
+    size_index.update(product)
+    related_index.product_changed(product['id'], product.get('category'))
 
 @products_bp.route('/list')
+@cached_page
 def list_products():
     """List all products"""
     try:
         category = request.args.get('category')  # ambil query param
+        after = request.args.get('after', type=int)  # cursor: id produk terakhir di halaman sebelumnya
+        page_size = current_app.config.get('CATALOG_PAGE_SIZE', 24)
+        next_cursor = None
 
-        query = supabase.table('products').select('*')
+        query = supabase.table('products').select(PRODUCT_CARD)
 
         if category:  # filter hanya jika kategori ada
             query = query.eq('category', category.lower())  # pastikan lowercase sesuai DB
 
         try:
-            response = query.execute()
-            products = response.data if response.data else []
+            products, next_cursor = catalog_cache.get_or_load(
+                ('list', 'category', category.lower() if category else None, after, page_size),
+                lambda: keyset_page(query, after, page_size)
+            )
             
             # Debug: tampilkan kategori produk yang dikembalikan query
-            print("Query returned:", [p.get('category', 'NO_CATEGORY') for p in response.data])
-        except Exception as e:
-            print("❌ Error loading products:", e)
+            log.debug("product list", extra={'category': category, 'products': len(products), 'sample': 0.01})
+        except Exception:
+            log.exception("Error loading products", extra={'sample': 0.1})
             products = []
 
         if not supabase:
-            print("❌ Supabase client not initialized")
+            log.warning("Supabase client not initialized")
             flash('Database connection not available', 'error')
             return render_template('products.html', products=[], active_category=category)
 
-        return render_template('products.html', products=products, active_category=category)
-    except Exception as e:
-        print("❌ Error loading products:", e)
+        return render_template('products.html', products=products, active_category=category,
+                               next_url=url_for('products.list_products', category=category, after=next_cursor) if next_cursor else None,
+                               first_url=url_for('products.list_products', category=category) if after else None)
+    except Exception:
+        log.exception("Error loading products", extra={'sample': 0.1})
         flash('Error loading products', 'error')
         return render_template('products.html', products=[], active_category=category)
 
@@ -59,6 +69,81 @@ def list_products():
 
     # ... (kode yang sudah ada di atas) ...
 
+@products_bp.route('/search')
+def search_products():
+    """Product search (in-memory index, see services/search.py)"""
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = current_app.config.get('CATALOG_PAGE_SIZE', 24)
+    products = []
+    has_more = False
+    if query:
+        try:
+            product_ids, has_more = search_index.search(query, limit=page_size, offset=(page - 1) * page_size)
+            # Kartu produk diambil per primary key (stok selalu terbaru), urutan mengikuti hasil pencarian
+            found = get_products_by_ids(supabase, product_ids, PRODUCT_CARD)
+            products = [found[i] for i in product_ids if i in found]
+        except Exception:
+            log.exception("Error searching products", extra={'sample': 0.1})
+            flash('Error searching products', 'error')
+
+    return render_template('products.html', products=products, search_query=query,
+                           next_url=url_for('products.search_products', q=query, page=page + 1) if has_more else None,
+                           first_url=url_for('products.search_products', q=query) if page > 1 else None)
+
+
+@products_bp.route('/search/suggest')
+def search_suggest():
+    """Autocomplete for the search box (JSON, served from memory)"""
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 20)
+    suggestions = search_index.suggest(query, limit=limit)
+    for product in suggestions['products']:
+        product['url'] = url_for('products.view_product', product_id=product['id'])
+    return jsonify(query=query, **suggestions)
+
+
+@products_bp.route('/size/<size>')
+def list_by_size(size):
+    """Products available in one size (bitmap index, see services/sizes.py)"""
+    size = normalize_size(size)
+    if size is None:
+        flash('Ukuran tidak dikenal', 'warning')
+        return redirect(url_for('shop_by_size'))
+    category = request.args.get('category')
+    after = request.args.get('after', type=int)
+    page_size = current_app.config.get('CATALOG_PAGE_SIZE', 24)
+    products = []
+    next_cursor = None
+    try:
+        # Satu id ekstra untuk tahu apakah ada halaman berikutnya
+        product_ids = size_index.product_ids(size, category, after=after, limit=page_size + 1)
+        if len(product_ids) > page_size:
+            product_ids = product_ids[:page_size]
+            next_cursor = product_ids[-1]
+        found = get_products_by_ids(supabase, product_ids, PRODUCT_CARD)
+        # Stok di index bisa tertinggal sampai reload berikutnya; kartu selalu memakai stok terbaru
+        products = [found[i] for i in product_ids if i in found and found[i].get('stock', 0) > 0]
+    except Exception:
+        log.exception("Error loading products by size", extra={'sample': 0.1})
+        flash('Error loading products', 'error')
+
+    return render_template('products.html', products=products, active_category=category, active_size=size,
+                           next_url=url_for('products.list_by_size', size=size, category=category, after=next_cursor) if next_cursor else None,
+                           first_url=url_for('products.list_by_size', size=size, category=category) if after else None)
+
+
+@products_bp.route('/set_size', methods=['POST'])
+def set_size():
+    size = normalize_size(request.form.get('size'))
+    if size:
+        session['preferred_size'] = size
+        flash(f"Size {size} berhasil disimpan!", "success")
+        return redirect(url_for('products.list_by_size', size=size))
+    flash("Pilih size terlebih dahulu!", "warning")
+    return redirect(request.referrer or url_for('home'))
+
+
 @products_bp.route('/product/<int:product_id>')
 def view_product(product_id):
     """Product detail page"""
@@ -67,8 +152,15 @@ def view_product(product_id):
         related_products = [] # Pastikan ini diinisialisasi
 
         if supabase:
-            response = supabase.table('products').select('*').eq('id', product_id).execute()
-            product_detail = response.data[0] if response.data else None
+            rows = catalog_cache.get_or_load(
+                ('product', product_id),
+                lambda: supabase.table('products').select(PRODUCT_PAGE).eq('id', product_id).execute().data or []
+            )
+            product_detail = dict(rows[0]) if rows else None
+            if product_detail:
+                # Stok tidak ikut di-cache: place_order dan reservasi mengubahnya langsung di database,
+                # tanpa invalidasi cache di worker mana pun
+                product_detail['stock'] = get_stock(supabase, product_id)
         else:
             # sample product for demo - TAMBAHKAN KATEGORI DI SINI
             product_detail = {
@@ -88,15 +180,10 @@ def view_product(product_id):
         # --- LOGIKA BARU: Ambil produk terkait ---
         if supabase and product_detail.get('category'):
             try:
-                # Ambil produk lain dengan kategori yang sama, kecuali produk saat ini
-                related_response = supabase.table('products').select('*') \
-                                            .eq('category', product_detail['category']) \
-                                            .neq('id', product_id) \
-                                            .limit(4) \
-                                            .execute()
-                related_products = related_response.data if related_response.data else []
-            except Exception as e:
-                print(f"❌ Error loading related products: {e}")
+                # Produk lain dengan kategori yang sama, dari daftar per kategori di memori
+                related_products = related_index.for_product(product_detail)
+            except Exception:
+                log.exception("Error loading related products", extra={'sample': 0.1})
                 related_products = []
         elif not supabase:
             # Produk sampel terkait jika Supabase tidak terhubung
@@ -155,29 +242,36 @@ def add_product():
         image_url = request.form.get('image_url')
         stock = int(request.form.get('stock'))
         category = request.form.get('category')
+        sizes = clean_sizes(request.form.getlist('sizes'))
         
         try:
             if not supabase:
-                print("❌ Supabase client not initialized")
+                log.warning("Supabase client not initialized")
                 flash('Database connection not available', 'error')
                 return redirect(url_for('admin'))
                 
-            supabase.table('products').insert({
+            brand = detect_brand(name)  # dihitung sekali di sini, bukan di setiap halaman brand
+            response = supabase.table('products').insert({
                 'name': name,
                 'description': description,
                 'price': price,
                 'image_url': image_url,
                 'stock': stock,
-                'category': category
+                'category': category,
+                'brand': brand,
+                'sizes': sizes
             }).execute()
+            for product in response.data or []:
+                _index_product(product)
+            catalog_cache.invalidate_product()
             
             flash('Product added successfully!', 'success')
             return redirect(url_for('admin'))
-        except Exception as e:
-            print("❌ Error adding product:", e)
+        except Exception:
+            log.exception("Error adding product")
             flash('Error adding product', 'error')
     
-    return render_template('add_product.html')
+    return render_template('add_product.html', all_sizes=ALL_SIZES)
 
 @products_bp.route('/edit/<int:product_id>', methods=['GET', 'POST'])
 def edit_product(product_id):
@@ -198,36 +292,42 @@ def edit_product(product_id):
         image_url = request.form.get('image_url')
         stock = int(request.form.get('stock'))
         category = request.form.get('category')
+        sizes = clean_sizes(request.form.getlist('sizes'))
         
         try:
             if not supabase:
-                print("❌ Supabase client not initialized")
+                log.warning("Supabase client not initialized")
                 flash('Database connection not available', 'error')
                 return redirect(url_for('admin'))
                 
-            supabase.table('products').update({
+            product = {
                 'name': name,
                 'description': description,
                 'price': price,
                 'image_url': image_url,
                 'stock': stock,
-                'category': category
-            }).eq('id', product_id).execute()
+                'category': category,
+                'brand': detect_brand(name),
+                'sizes': sizes
+            }
+            supabase.table('products').update(product).eq('id', product_id).execute()
+            _index_product(dict(product, id=product_id))
+            catalog_cache.invalidate_product(product_id)
             
             flash('Product updated successfully!', 'success')
             return redirect(url_for('admin'))
-        except Exception as e:
-            print("❌ Error updating product:", e)
+        except Exception:
+            log.exception("Error updating product")
             flash('Error updating product', 'error')
     
     # GET request - show edit form
     try:
         if not supabase:
-            print("❌ Supabase client not initialized")
+            log.warning("Supabase client not initialized")
             flash('Database connection not available', 'error')
             return redirect(url_for('admin'))
         
-        response = supabase.table('products').select('*').eq('id', product_id).execute()
+        response = supabase.table('products').select(PRODUCT_DETAIL).eq('id', product_id).execute()
         product = response.data
         if not product or len(product) == 0:
             flash('Product not found', 'error')
@@ -236,9 +336,9 @@ def edit_product(product_id):
         # Since Supabase returns a list even for single records, take the first item
         product = product[0]
         
-        return render_template('edit_product.html', product=product)
-    except Exception as e:
-        print("❌ Error loading product:", e)
+        return render_template('edit_product.html', product=product, all_sizes=ALL_SIZES)
+    except Exception:
+        log.exception("Error loading product")
         flash('Error loading product', 'error')
         return redirect(url_for('admin'))
 
@@ -256,14 +356,19 @@ def delete_product(product_id):
     
     try:
         if not supabase:
-            print("❌ Supabase client not initialized")
+            log.warning("Supabase client not initialized")
             flash('Database connection not available', 'error')
             return redirect(url_for('admin'))
             
         supabase.table('products').delete().eq('id', product_id).execute()
+        brand_index.remove(product_id)
+        search_index.remove(product_id)
+        size_index.remove(product_id)
+        related_index.product_changed(product_id)
+        catalog_cache.invalidate_product(product_id)
         flash('Product deleted successfully!', 'success')
-    except Exception as e:
-        print("❌ Error deleting product:", e)
+    except Exception:
+        log.exception("Error deleting product")
         flash('Error deleting product', 'error')
     
     return redirect(url_for('admin'))
\ No newline at end of file
@@ -19,8 +19,11 @@ class Config:
     STATIC_FOLDER = 'static'
     
     # Session configuration
-    SESSION_TYPE = 'filesystem'
+    SESSION_TYPE = os.getenv('SESSION_TYPE', 'sqlite')  # 'sqlite' (services/sqlite_session.py) or any Flask-Session type
     SESSION_FILE_DIR = 'flask_session'
+    SESSION_SQLITE_PATH = os.getenv('SESSION_SQLITE_PATH', 'instance/sessions.db')  # relative to the app directory
+    SESSION_SWEEP_INTERVAL = int(os.getenv('SESSION_SWEEP_INTERVAL', '300'))  # seconds between expiry sweeps
+    SESSION_SWEEP_BATCH = int(os.getenv('SESSION_SWEEP_BATCH', '500'))  # rows deleted per statement
     PERMANENT_SESSION_LIFETIME = 1800  # 30 minutes
     
     # Google OAuth configuration
@@ -28,10 +31,17 @@ class Config:
     GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
     GOOGLE_REDIRECT_URI = os.getenv('GOOGLE_REDIRECT_URI', 'http://localhost:5001/auth/google/callback')
     GOOGLE_DISCOVERY_URL = os.getenv('GOOGLE_DISCOVERY_URL', 'https://accounts.google.com/.well-known/openid-configuration')
+    GOOGLE_HTTP_TIMEOUT = float(os.getenv('GOOGLE_HTTP_TIMEOUT', '5'))  # seconds, discovery/JWKS/token requests
+    GOOGLE_METADATA_TTL = int(os.getenv('GOOGLE_METADATA_TTL', '3600'))  # used when Google sends no max-age
     
     # Supabase configuration
     SUPABASE_URL = os.getenv('SUPABASE_URL')
     SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+    SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY')  # service_role key for place_order and stock holds; server only
+    SUPABASE_POOL_SIZE = int(os.getenv('SUPABASE_POOL_SIZE', '10'))  # keep-alive connections per worker
+    SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', '30'))  # seconds
+    SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '10'))  # seconds
+    SUPABASE_CONNECT_TIMEOUT = float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '5'))  # seconds
     
     # Email configuration
     EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -39,11 +49,68 @@ class Config:
     EMAIL_USER = os.getenv('EMAIL_USER')
     EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
     EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
+    EMAIL_WORKERS = int(os.getenv('EMAIL_WORKERS', '2'))  # SMTP connections per process
+    EMAIL_QUEUE_SIZE = int(os.getenv('EMAIL_QUEUE_SIZE', '1000'))  # outbox capacity, extra mail is dropped
+    EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', '20'))  # messages per connection wake-up
+    EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '4'))
+    EMAIL_IDLE_TIMEOUT = float(os.getenv('EMAIL_IDLE_TIMEOUT', '30'))  # seconds before an idle connection is closed
     
     # Security configuration
     RATE_LIMIT_MAX_ATTEMPTS = 5
     RATE_LIMIT_TIMEOUT = 300  # 5 minutes
     
+    # Catalog cache configuration
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', '60'))  # seconds
+    CATALOG_CACHE_MAXSIZE = int(os.getenv('CATALOG_CACHE_MAXSIZE', '512'))  # entries
+    CATALOG_VERSION_PATH = os.getenv('CATALOG_VERSION_PATH', 'instance/catalog.version')  # shared by all workers so a product write invalidates every worker's cache
+    PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', '60'))  # seconds, 0 = halaman katalog tidak di-cache
+    PAGE_CACHE_MAXSIZE = int(os.getenv('PAGE_CACHE_MAXSIZE', '256'))  # rendered pages
+    
+    # Aset statis ber-fingerprint (static/dist), boleh di-cache selamanya oleh browser
+    ASSET_MAX_AGE = int(os.getenv('ASSET_MAX_AGE', '31536000'))  # seconds (1 year)
+    
+    # Pagination configuration (keyset/cursor pagination)
+    CATALOG_PAGE_SIZE = int(os.getenv('CATALOG_PAGE_SIZE', '24'))  # products per page
+    ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '50'))  # rows per admin page
+    
+    # Stock reservation configuration (hold stok selama pembayaran Xendit)
+    RESERVATION_TTL = int(os.getenv('RESERVATION_TTL', '1800'))  # 30 minutes
+    RESERVATION_SWEEP_INTERVAL = int(os.getenv('RESERVATION_SWEEP_INTERVAL', '60'))  # seconds
+    
+    # Voucher registry (tabel vouchers, di-cache di memori)
+    VOUCHER_CACHE_TTL = int(os.getenv('VOUCHER_CACHE_TTL', '60'))  # seconds
+    
+    # Index brand, pencarian, ukuran & produk terkait di memori (dimuat ulang untuk menangkap perubahan dari worker lain)
+    BRAND_INDEX_TTL = int(os.getenv('BRAND_INDEX_TTL', '300'))  # seconds
+    SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', '900'))  # seconds, dibangun ulang di background
+    SIZE_INDEX_TTL = int(os.getenv('SIZE_INDEX_TTL', '60'))  # seconds, juga mengikuti perubahan stok
+    RELATED_PRODUCTS_TTL = int(os.getenv('RELATED_PRODUCTS_TTL', '300'))  # seconds
+    
+    # Xendit + background job queue (invoice dibuat di luar request)
+    XENDIT_API_KEY = os.getenv('XENDIT_API_KEY')
+    XENDIT_API_URL = os.getenv('XENDIT_API_URL', 'https://api.xendit.co')  # point at tools/fake_xendit.py for local testing
+    XENDIT_TIMEOUT = float(os.getenv('XENDIT_TIMEOUT', '15'))  # seconds
+    XENDIT_CALLBACK_TOKEN = os.getenv('XENDIT_CALLBACK_TOKEN')  # webhook verification token (Xendit dashboard); webhooks are refused without it
+    JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'instance/jobs.db')  # relative to the app directory
+    JOB_QUEUE_WORKERS = int(os.getenv('JOB_QUEUE_WORKERS', '1'))  # threads per process
+    JOB_QUEUE_POLL_INTERVAL = float(os.getenv('JOB_QUEUE_POLL_INTERVAL', '0.5'))  # seconds
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+    JOB_RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', '2'))  # delay = backoff ** attempt seconds
+    WEBHOOK_INBOX_PATH = os.getenv('WEBHOOK_INBOX_PATH', 'instance/webhooks.db')  # relative to the app directory
+    WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '100'))  # events applied per batch
+    WEBHOOK_RETENTION_DAYS = int(os.getenv('WEBHOOK_RETENTION_DAYS', '30'))  # applied events kept for deduplication
+    
+    # Logging (services/logs.py)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json | text
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # records waiting for the writer thread; more are dropped
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')  # override per message, e.g. 'home page=1;Error loading products=1'
+    
+    # /metrics (Prometheus): snapshot per worker digabung saat scrape
+    METRICS_DIR = os.getenv('METRICS_DIR', 'instance/metrics')  # relative to the app directory, clear on deploy
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '10'))  # seconds
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token for /metrics; unset = localhost only
+    
     @staticmethod
     def is_valid_config():
         """Check if critical configuration is valid"""
@@ -62,6 +129,7 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # lebih mudah dibaca di terminal
     
 class ProductionConfig(Config):
     """Production configuration"""
@@ -0,0 +1,71 @@
+-- Order placement in one transaction: validate stock, create the order and
+-- its items, and decrement stock. Called from cart.checkout_finalize via
+-- supabase.rpc('place_order', ...).
+--
+-- Apply with the Supabase SQL editor or against a local Postgres:
+--   psql "$DATABASE_URL" -f migrations/001_place_order.sql
+
+create or replace function public.place_order(
+    p_user_id bigint,
+    p_items jsonb,                    -- [{"product_id": 1, "quantity": 2, "price": 150000}, ...]
+    p_total bigint,
+    p_discount_amount bigint default 0,
+    p_shipping_cost bigint default 0,
+    p_voucher_code text default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_order_id bigint;
+    v_insufficient jsonb;
+begin
+    create temporary table if not exists _place_order_lines (
+        product_id bigint primary key,
+        quantity integer not null
+    ) on commit drop;
+    truncate _place_order_lines;
+
+    insert into _place_order_lines (product_id, quantity)
+    select (e->>'product_id')::bigint, sum((e->>'quantity')::integer)
+      from jsonb_array_elements(p_items) e
+     group by 1;
+
+    -- Kunci baris produk (urut id supaya pembeli bersamaan tidak deadlock)
+    perform 1
+       from products p
+      where p.id in (select product_id from _place_order_lines)
+      order by p.id
+        for update;
+
+    select coalesce(jsonb_agg(jsonb_build_object(
+               'product_id', l.product_id,
+               'requested', l.quantity,
+               'available', coalesce(p.stock, 0)
+           ) order by l.product_id), '[]'::jsonb)
+      into v_insufficient
+      from _place_order_lines l
+      left join products p on p.id = l.product_id
+     where p.id is null or p.stock < l.quantity;
+
+    if jsonb_array_length(v_insufficient) > 0 then
+        return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', v_insufficient);
+    end if;
+
+    insert into orders (user_id, total, status, created_at, discount_amount, shipping_cost, voucher_code)
+    values (p_user_id, p_total, 'pending', timezone('utc', now()), p_discount_amount, p_shipping_cost, p_voucher_code)
+    returning id into v_order_id;
+
+    insert into order_items (order_id, product_id, quantity, price)
+    select v_order_id, (e->>'product_id')::bigint, (e->>'quantity')::integer, (e->>'price')::bigint
+      from jsonb_array_elements(p_items) e;
+
+    update products p
+       set stock = p.stock - l.quantity
+      from _place_order_lines l
+     where p.id = l.product_id;
+
+    return jsonb_build_object('ok', true, 'order_id', v_order_id, 'insufficient', '[]'::jsonb);
+end;
+$$;
+
+grant execute on function public.place_order(bigint, jsonb, bigint, bigint, bigint, text) to anon, authenticated;
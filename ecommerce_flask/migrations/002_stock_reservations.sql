@@ -0,0 +1,217 @@
+-- Stock reservation holds for orders waiting on Xendit payment.
+--
+-- place_order now takes the stock out of `products.stock` as a *hold*
+-- (one stock_reservations row per line, status 'held', with an expiry).
+-- The hold becomes permanent on payment success (commit_reservations) and
+-- is given back on failure (release_reservations) or by the background
+-- sweeper once it expires (release_expired_reservations).
+--
+-- Apply after 001_place_order.sql:
+--   psql "$DATABASE_URL" -f migrations/002_stock_reservations.sql
+
+create table if not exists public.stock_reservations (
+    id bigserial primary key,
+    order_id bigint not null references public.orders(id) on delete cascade,
+    product_id bigint not null references public.products(id),
+    quantity integer not null check (quantity > 0),
+    status text not null default 'held' check (status in ('held', 'committed', 'released')),
+    expires_at timestamptz not null,
+    created_at timestamptz not null default now(),
+    resolved_at timestamptz
+);
+
+create index if not exists stock_reservations_order_id_idx
+    on public.stock_reservations (order_id);
+create index if not exists stock_reservations_held_expiry_idx
+    on public.stock_reservations (expires_at) where status = 'held';
+
+
+drop function if exists public.place_order(bigint, jsonb, bigint, bigint, bigint, text);
+
+create or replace function public.place_order(
+    p_user_id bigint,
+    p_items jsonb,                    -- [{"product_id": 1, "quantity": 2, "price": 150000}, ...]
+    p_total bigint,
+    p_discount_amount bigint default 0,
+    p_shipping_cost bigint default 0,
+    p_voucher_code text default null,
+    p_hold_seconds integer default 1800
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_order_id bigint;
+    v_insufficient jsonb;
+begin
+    create temporary table if not exists _place_order_lines (
+        product_id bigint primary key,
+        quantity integer not null
+    ) on commit drop;
+    truncate _place_order_lines;
+
+    insert into _place_order_lines (product_id, quantity)
+    select (e->>'product_id')::bigint, sum((e->>'quantity')::integer)
+      from jsonb_array_elements(p_items) e
+     group by 1;
+
+    -- Kunci baris produk (urut id supaya pembeli bersamaan tidak deadlock)
+    perform 1
+       from products p
+      where p.id in (select product_id from _place_order_lines)
+      order by p.id
+        for update;
+
+    select coalesce(jsonb_agg(jsonb_build_object(
+               'product_id', l.product_id,
+               'requested', l.quantity,
+               'available', coalesce(p.stock, 0)
+           ) order by l.product_id), '[]'::jsonb)
+      into v_insufficient
+      from _place_order_lines l
+      left join products p on p.id = l.product_id
+     where p.id is null or p.stock < l.quantity;
+
+    if jsonb_array_length(v_insufficient) > 0 then
+        return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', v_insufficient);
+    end if;
+
+    insert into orders (user_id, total, status, created_at, discount_amount, shipping_cost, voucher_code)
+    values (p_user_id, p_total, 'pending', timezone('utc', now()), p_discount_amount, p_shipping_cost, p_voucher_code)
+    returning id into v_order_id;
+
+    insert into order_items (order_id, product_id, quantity, price)
+    select v_order_id, (e->>'product_id')::bigint, (e->>'quantity')::integer, (e->>'price')::bigint
+      from jsonb_array_elements(p_items) e;
+
+    -- Stok ditahan (hold) sampai pembayaran selesai atau kedaluwarsa
+    update products p
+       set stock = p.stock - l.quantity
+      from _place_order_lines l
+     where p.id = l.product_id;
+
+    insert into stock_reservations (order_id, product_id, quantity, expires_at)
+    select v_order_id, l.product_id, l.quantity, now() + make_interval(secs => p_hold_seconds)
+      from _place_order_lines l;
+
+    return jsonb_build_object('ok', true, 'order_id', v_order_id, 'insufficient', '[]'::jsonb);
+end;
+$$;
+
+
+-- Pembayaran sukses: hold menjadi pengurangan stok permanen.
+-- Hold yang sudah dilepas (pembayaran terlambat) diambil lagi dari stok.
+create or replace function public.commit_reservations(p_order_ids bigint[])
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    -- Tunggu sweeper yang mungkin sedang memproses hold order ini
+    perform 1 from stock_reservations where order_id = any(p_order_ids) for update;
+
+    update products p
+       set stock = p.stock - s.quantity
+      from (select product_id, sum(quantity) as quantity
+              from stock_reservations
+             where order_id = any(p_order_ids) and status = 'released'
+             group by product_id) s
+     where p.id = s.product_id;
+
+    update stock_reservations r
+       set status = 'committed', resolved_at = now()
+     where r.order_id = any(p_order_ids) and r.status in ('held', 'released');
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
+
+
+-- Pembayaran gagal: kembalikan stok yang masih ditahan.
+create or replace function public.release_reservations(p_order_ids bigint[])
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    with released as (
+        update stock_reservations r
+           set status = 'released', resolved_at = now()
+         where r.order_id = any(p_order_ids) and r.status = 'held'
+        returning r.product_id, r.quantity
+    ), restocked as (
+        update products p
+           set stock = p.stock + s.quantity
+          from (select product_id, sum(quantity) as quantity from released group by product_id) s
+         where p.id = s.product_id
+        returning 1
+    )
+    select count(*) into v_count from released;
+    return v_count;
+end;
+$$;
+
+
+-- Sweeper: lepas hold yang kedaluwarsa secara massal dan tandai order-nya gagal.
+-- SKIP LOCKED membuat beberapa worker gunicorn aman menjalankannya bersamaan.
+create or replace function public.release_expired_reservations(p_limit integer default 500)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_holds integer;
+    v_orders integer;
+begin
+    with expired as (
+        select r.id
+          from stock_reservations r
+         where r.status = 'held' and r.expires_at < now()
+         order by r.expires_at
+         limit p_limit
+           for update skip locked
+    ), released as (
+        update stock_reservations r
+           set status = 'released', resolved_at = now()
+          from expired e
+         where r.id = e.id
+        returning r.order_id, r.product_id, r.quantity
+    ), restocked as (
+        update products p
+           set stock = p.stock + s.quantity
+          from (select product_id, sum(quantity) as quantity from released group by product_id) s
+         where p.id = s.product_id
+        returning 1
+    ), failed as (
+        update orders o
+           set status = 'failed'
+         where o.id in (select order_id from released) and o.status = 'pending'
+        returning 1
+    )
+    select (select count(*) from released), (select count(*) from failed)
+      into v_holds, v_orders;
+    return jsonb_build_object('released_holds', v_holds, 'failed_orders', v_orders);
+end;
+$$;
+
+
+create or replace function public.reservation_stats()
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'active_holds', count(*),
+        'active_units', coalesce(sum(quantity), 0),
+        'expired_holds', count(*) filter (where expires_at < now())
+    )
+      from stock_reservations
+     where status = 'held';
+$$;
+
+
+grant execute on function public.place_order(bigint, jsonb, bigint, bigint, bigint, text, integer) to anon, authenticated;
+grant execute on function public.commit_reservations(bigint[]) to anon, authenticated;
+grant execute on function public.release_reservations(bigint[]) to anon, authenticated;
+grant execute on function public.release_expired_reservations(integer) to anon, authenticated;
+grant execute on function public.reservation_stats() to anon, authenticated;
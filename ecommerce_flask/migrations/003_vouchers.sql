@@ -0,0 +1,178 @@
+-- Voucher registry with validity windows and usage limits.
+--
+-- `vouchers` replaces the hard-coded dict in cart.apply_voucher (the app
+-- caches the active rows in memory, see services/vouchers.py).
+-- place_order checks the limits and records a redemption in the same
+-- transaction as the order, with the voucher row locked, so concurrent
+-- checkouts cannot exceed max_uses / max_uses_per_user.
+-- When an order becomes 'failed' its redemption is given back.
+--
+-- Apply after 002_stock_reservations.sql:
+--   psql "$DATABASE_URL" -f migrations/003_vouchers.sql
+
+create table if not exists public.vouchers (
+    code text primary key check (code = upper(code)),
+    type text not null check (type in ('percentage', 'fixed_amount', 'free_shipping')),
+    value numeric not null default 0,
+    description text not null default '',
+    starts_at timestamptz,                 -- null = berlaku sejak dibuat
+    ends_at timestamptz,                   -- null = tidak kedaluwarsa
+    max_uses integer,                      -- null = tanpa batas
+    max_uses_per_user integer,             -- null = tanpa batas
+    used_count integer not null default 0,
+    active boolean not null default true,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists public.voucher_redemptions (
+    order_id bigint primary key references public.orders(id) on delete cascade,
+    voucher_code text not null references public.vouchers(code),
+    user_id bigint not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists voucher_redemptions_code_user_idx
+    on public.voucher_redemptions (voucher_code, user_id);
+
+-- Voucher yang sebelumnya tertulis di kode
+insert into public.vouchers (code, type, value, description) values
+    ('ONGKIRGRATIS', 'free_shipping', 0, 'Gratis Ongkir'),
+    ('DISKON10', 'percentage', 10, 'Diskon 10%'),
+    ('HEMAT50RB', 'fixed_amount', 50000, 'Diskon Rp 50.000')
+on conflict (code) do nothing;
+
+
+create or replace function public.place_order(
+    p_user_id bigint,
+    p_items jsonb,                    -- [{"product_id": 1, "quantity": 2, "price": 150000}, ...]
+    p_total bigint,
+    p_discount_amount bigint default 0,
+    p_shipping_cost bigint default 0,
+    p_voucher_code text default null,
+    p_hold_seconds integer default 1800
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_order_id bigint;
+    v_insufficient jsonb;
+    v_voucher public.vouchers%rowtype;
+    v_user_uses integer;
+begin
+    -- Voucher dikunci lebih dulu (lalu produk) supaya urutan kunci selalu sama
+    if p_voucher_code is not null then
+        select * into v_voucher from vouchers where code = upper(p_voucher_code) for update;
+        if not found or not v_voucher.active then
+            return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                      'voucher_error', 'invalid');
+        end if;
+        if (v_voucher.starts_at is not null and now() < v_voucher.starts_at)
+           or (v_voucher.ends_at is not null and now() >= v_voucher.ends_at) then
+            return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                      'voucher_error', 'expired');
+        end if;
+        if v_voucher.max_uses is not null and v_voucher.used_count >= v_voucher.max_uses then
+            return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                      'voucher_error', 'exhausted');
+        end if;
+        if v_voucher.max_uses_per_user is not null then
+            select count(*) into v_user_uses
+              from voucher_redemptions
+             where voucher_code = v_voucher.code and user_id = p_user_id;
+            if v_user_uses >= v_voucher.max_uses_per_user then
+                return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                          'voucher_error', 'user_limit');
+            end if;
+        end if;
+    end if;
+
+    create temporary table if not exists _place_order_lines (
+        product_id bigint primary key,
+        quantity integer not null
+    ) on commit drop;
+    truncate _place_order_lines;
+
+    insert into _place_order_lines (product_id, quantity)
+    select (e->>'product_id')::bigint, sum((e->>'quantity')::integer)
+      from jsonb_array_elements(p_items) e
+     group by 1;
+
+    -- Kunci baris produk (urut id supaya pembeli bersamaan tidak deadlock)
+    perform 1
+       from products p
+      where p.id in (select product_id from _place_order_lines)
+      order by p.id
+        for update;
+
+    select coalesce(jsonb_agg(jsonb_build_object(
+               'product_id', l.product_id,
+               'requested', l.quantity,
+               'available', coalesce(p.stock, 0)
+           ) order by l.product_id), '[]'::jsonb)
+      into v_insufficient
+      from _place_order_lines l
+      left join products p on p.id = l.product_id
+     where p.id is null or p.stock < l.quantity;
+
+    if jsonb_array_length(v_insufficient) > 0 then
+        return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', v_insufficient);
+    end if;
+
+    insert into orders (user_id, total, status, created_at, discount_amount, shipping_cost, voucher_code)
+    values (p_user_id, p_total, 'pending', timezone('utc', now()), p_discount_amount, p_shipping_cost,
+            coalesce(v_voucher.code, p_voucher_code))
+    returning id into v_order_id;
+
+    insert into order_items (order_id, product_id, quantity, price)
+    select v_order_id, (e->>'product_id')::bigint, (e->>'quantity')::integer, (e->>'price')::bigint
+      from jsonb_array_elements(p_items) e;
+
+    -- Stok ditahan (hold) sampai pembayaran selesai atau kedaluwarsa
+    update products p
+       set stock = p.stock - l.quantity
+      from _place_order_lines l
+     where p.id = l.product_id;
+
+    insert into stock_reservations (order_id, product_id, quantity, expires_at)
+    select v_order_id, l.product_id, l.quantity, now() + make_interval(secs => p_hold_seconds)
+      from _place_order_lines l;
+
+    if v_voucher.code is not null then
+        update vouchers set used_count = used_count + 1 where code = v_voucher.code;
+        insert into voucher_redemptions (order_id, voucher_code, user_id)
+        values (v_order_id, v_voucher.code, p_user_id);
+    end if;
+
+    return jsonb_build_object('ok', true, 'order_id', v_order_id, 'insufficient', '[]'::jsonb);
+end;
+$$;
+
+
+-- Pesanan gagal/kedaluwarsa: kuota voucher dikembalikan
+-- (berlaku untuk payment_failed, webhook, dan sweeper hold yang kedaluwarsa)
+create or replace function public.release_voucher_redemption()
+returns trigger
+language plpgsql
+as $$
+begin
+    with released as (
+        delete from voucher_redemptions where order_id = new.id returning voucher_code
+    )
+    update vouchers v
+       set used_count = greatest(v.used_count - 1, 0)
+      from released r
+     where v.code = r.voucher_code;
+    return new;
+end;
+$$;
+
+drop trigger if exists orders_release_voucher on public.orders;
+create trigger orders_release_voucher
+    after update of status on public.orders
+    for each row
+    when (new.status = 'failed' and old.status is distinct from 'failed')
+    execute function public.release_voucher_redemption();
+
+
+grant select on public.vouchers to anon, authenticated;
+grant execute on function public.place_order(bigint, jsonb, bigint, bigint, bigint, text, integer) to anon, authenticated;
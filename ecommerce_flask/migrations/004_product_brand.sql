@@ -0,0 +1,28 @@
+-- Brand column for products.
+--
+-- Brand pages used to find their products with
+-- `name ilike '%<brand>%'`, a full scan on every page view. The brand is
+-- now computed once when a product is added or edited
+-- (services/brands.detect_brand) and stored here; the app keeps an
+-- in-memory brand -> product id index built from this column.
+--
+-- Apply after 003_vouchers.sql:
+--   psql "$DATABASE_URL" -f migrations/004_product_brand.sql
+
+alter table public.products add column if not exists brand text;
+
+create index if not exists products_brand_id_idx on public.products (brand, id);
+
+-- Isi brand produk yang sudah ada; urutan sama dengan BRAND_LIST (brand pertama yang cocok menang)
+update public.products
+   set brand = case
+       when name ilike '%nike%' then 'nike'
+       when name ilike '%adidas%' then 'adidas'
+       when name ilike '%puma%' then 'puma'
+       when name ilike '%reebok%' then 'reebok'
+       when name ilike '%converse%' then 'converse'
+       when name ilike '%specs%' then 'specs'
+       when name ilike '%ellesse%' then 'ellesse'
+       when name ilike '%diadora%' then 'diadora'
+   end
+ where brand is null;
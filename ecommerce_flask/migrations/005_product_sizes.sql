@@ -0,0 +1,14 @@
+-- Sizes a product is offered in.
+--
+-- `sizes` holds EU sizes from SIZE_CHART in services/sizes.py, e.g.
+-- {'40', '40.5', '41.5'}. The app keeps an in-memory size -> product id
+-- bitmap built from this column and products.stock, which backs
+-- /shop-by-size and /products/size/<size>.
+--
+-- Apply after 004_product_brand.sql:
+--   psql "$DATABASE_URL" -f migrations/005_product_sizes.sql
+
+alter table public.products add column if not exists sizes text[] not null default '{}';
+
+-- Untuk query "produk dengan ukuran X" langsung di database (app memakai index di memori)
+create index if not exists products_sizes_idx on public.products using gin (sizes);
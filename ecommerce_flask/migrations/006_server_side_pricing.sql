@@ -0,0 +1,182 @@
+-- Server-side order pricing and service-role-only order/stock functions.
+--
+-- place_order no longer takes the total, discount, shipping cost or line
+-- prices from the caller: it prices the lines from `products.price` and
+-- the voucher from `vouchers`, with the same integer arithmetic as
+-- services/pricing.py (sen, rounded to whole rupiah at the end). The app
+-- passes the total it showed the buyer as p_expected_total; when the
+-- database disagrees (a price or voucher changed in the meantime) no
+-- order is created and the current prices are returned instead. A
+-- voucher whose starts_at is still in the future is now reported as
+-- 'not_started' instead of 'expired'.
+--
+-- place_order and the reservation functions trust their arguments
+-- (user id, order ids), so they can only be executed with the
+-- service_role key (SUPABASE_SERVICE_KEY), never with the public anon key.
+--
+-- Apply after 005_product_sizes.sql:
+--   psql "$DATABASE_URL" -f migrations/006_server_side_pricing.sql
+
+drop function if exists public.place_order(bigint, jsonb, bigint, bigint, bigint, text, integer);
+
+create or replace function public.place_order(
+    p_user_id bigint,
+    p_items jsonb,                    -- [{"product_id": 1, "quantity": 2}, ...]
+    p_expected_total bigint default null,
+    p_voucher_code text default null,
+    p_hold_seconds integer default 1800
+) returns jsonb
+language plpgsql
+as $$
+declare
+    v_order_id bigint;
+    v_insufficient jsonb;
+    v_voucher public.vouchers%rowtype;
+    v_user_uses integer;
+    v_subtotal bigint;               -- sen
+    v_discount bigint := 0;          -- sen
+    v_shipping bigint := 0;          -- sen; ongkir belum dihitung (sama dengan services/pricing.py)
+    v_total bigint;                  -- rupiah utuh
+begin
+    -- Voucher dikunci lebih dulu (lalu produk) supaya urutan kunci selalu sama
+    if p_voucher_code is not null then
+        select * into v_voucher from vouchers where code = upper(p_voucher_code) for update;
+        if not found or not v_voucher.active then
+            return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                      'voucher_error', 'invalid');
+        end if;
+        if v_voucher.starts_at is not null and now() < v_voucher.starts_at then
+            return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                      'voucher_error', 'not_started');
+        end if;
+        if v_voucher.ends_at is not null and now() >= v_voucher.ends_at then
+            return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                      'voucher_error', 'expired');
+        end if;
+        if v_voucher.max_uses is not null and v_voucher.used_count >= v_voucher.max_uses then
+            return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                      'voucher_error', 'exhausted');
+        end if;
+        if v_voucher.max_uses_per_user is not null then
+            select count(*) into v_user_uses
+              from voucher_redemptions
+             where voucher_code = v_voucher.code and user_id = p_user_id;
+            if v_user_uses >= v_voucher.max_uses_per_user then
+                return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+                                          'voucher_error', 'user_limit');
+            end if;
+        end if;
+    end if;
+
+    create temporary table if not exists _place_order_lines (
+        product_id bigint primary key,
+        quantity integer not null
+    ) on commit drop;
+    truncate _place_order_lines;
+
+    insert into _place_order_lines (product_id, quantity)
+    select (e->>'product_id')::bigint, sum((e->>'quantity')::integer)
+      from jsonb_array_elements(p_items) e
+     group by 1;
+
+    if not exists (select 1 from _place_order_lines) or exists (select 1 from _place_order_lines where quantity <= 0) then
+        raise exception 'place_order: every line needs a positive quantity' using errcode = '22023';
+    end if;
+
+    -- Kunci baris produk (urut id supaya pembeli bersamaan tidak deadlock)
+    perform 1
+       from products p
+      where p.id in (select product_id from _place_order_lines)
+      order by p.id
+        for update;
+
+    select coalesce(jsonb_agg(jsonb_build_object(
+               'product_id', l.product_id,
+               'requested', l.quantity,
+               'available', coalesce(p.stock, 0)
+           ) order by l.product_id), '[]'::jsonb)
+      into v_insufficient
+      from _place_order_lines l
+      left join products p on p.id = l.product_id
+     where p.id is null or p.stock < l.quantity;
+
+    if jsonb_array_length(v_insufficient) > 0 then
+        return jsonb_build_object('ok', false, 'order_id', null, 'insufficient', v_insufficient);
+    end if;
+
+    -- Harga dari tabel products, dihitung dalam sen seperti services/pricing.price_cart
+    select sum(round(p.price * 100)::bigint * l.quantity)
+      into v_subtotal
+      from _place_order_lines l
+      join products p on p.id = l.product_id;
+
+    if v_voucher.code is not null then
+        if v_voucher.type = 'percentage' then
+            v_discount := (v_subtotal * round(v_voucher.value * 100)::bigint + 5000) / 10000;
+        elsif v_voucher.type = 'fixed_amount' then
+            v_discount := round(v_voucher.value * 100)::bigint;
+        elsif v_voucher.type = 'free_shipping' then
+            v_shipping := 0;
+        end if;
+    end if;
+    v_discount := least(v_discount, v_subtotal);
+    v_total := (v_subtotal - v_discount + v_shipping + 50) / 100;
+
+    if p_expected_total is not null and p_expected_total <> v_total then
+        -- Harga atau voucher berubah sejak pembeli melihat total: jangan buat pesanan
+        return jsonb_build_object(
+            'ok', false, 'order_id', null, 'insufficient', '[]'::jsonb,
+            'price_changed', true, 'total', v_total,
+            'prices', (select jsonb_agg(jsonb_build_object('product_id', p.id, 'price', p.price) order by p.id)
+                         from products p where p.id in (select product_id from _place_order_lines)),
+            'voucher', case when v_voucher.code is null then null
+                            else jsonb_build_object('code', v_voucher.code, 'type', v_voucher.type,
+                                                    'value', v_voucher.value, 'description', v_voucher.description)
+                       end);
+    end if;
+
+    insert into orders (user_id, total, status, created_at, discount_amount, shipping_cost, voucher_code)
+    values (p_user_id, v_total, 'pending', timezone('utc', now()), (v_discount + 50) / 100, (v_shipping + 50) / 100,
+            v_voucher.code)
+    returning id into v_order_id;
+
+    insert into order_items (order_id, product_id, quantity, price)
+    select v_order_id, l.product_id, l.quantity, round(p.price)::bigint
+      from _place_order_lines l
+      join products p on p.id = l.product_id;
+
+    -- Stok ditahan (hold) sampai pembayaran selesai atau kedaluwarsa
+    update products p
+       set stock = p.stock - l.quantity
+      from _place_order_lines l
+     where p.id = l.product_id;
+
+    insert into stock_reservations (order_id, product_id, quantity, expires_at)
+    select v_order_id, l.product_id, l.quantity, now() + make_interval(secs => p_hold_seconds)
+      from _place_order_lines l;
+
+    if v_voucher.code is not null then
+        update vouchers set used_count = used_count + 1 where code = v_voucher.code;
+        insert into voucher_redemptions (order_id, voucher_code, user_id)
+        values (v_order_id, v_voucher.code, p_user_id);
+    end if;
+
+    return jsonb_build_object('ok', true, 'order_id', v_order_id, 'insufficient', '[]'::jsonb,
+                              'total', v_total, 'discount_amount', (v_discount + 50) / 100,
+                              'shipping_cost', (v_shipping + 50) / 100);
+end;
+$$;
+
+
+-- Fungsi pesanan & stok hanya untuk service_role (Postgres memberi EXECUTE ke PUBLIC secara default)
+revoke all on function public.place_order(bigint, jsonb, bigint, text, integer) from public, anon, authenticated;
+revoke all on function public.commit_reservations(bigint[]) from public, anon, authenticated;
+revoke all on function public.release_reservations(bigint[]) from public, anon, authenticated;
+revoke all on function public.release_expired_reservations(integer) from public, anon, authenticated;
+revoke all on function public.reservation_stats() from public, anon, authenticated;
+
+grant execute on function public.place_order(bigint, jsonb, bigint, text, integer) to service_role;
+grant execute on function public.commit_reservations(bigint[]) to service_role;
+grant execute on function public.release_reservations(bigint[]) to service_role;
+grant execute on function public.release_expired_reservations(integer) to service_role;
+grant execute on function public.reservation_stats() to service_role;
@@ -0,0 +1,86 @@
+-- commit_reservations without overselling.
+--
+-- A payment can arrive after the hold of its order expired and was
+-- released (the stock went back on sale). The old function took that
+-- stock again unconditionally, which could push products.stock below
+-- zero. Now the product rows are locked and a released hold is only
+-- taken again when the stock still covers it; orders that cannot be
+-- covered keep their released holds and are returned as a shortfall so
+-- the app can flag them (orders.status = 'out_of_stock').
+--
+-- Returns {"committed": <holds committed>,
+--          "shortfall": [{"order_id", "product_id", "requested", "available"}, ...]}
+--
+-- Apply after 006_server_side_pricing.sql:
+--   psql "$DATABASE_URL" -f migrations/007_commit_shortfall.sql
+
+drop function if exists public.commit_reservations(bigint[]);
+
+create or replace function public.commit_reservations(p_order_ids bigint[])
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_order_id bigint;
+    v_missing jsonb;
+    v_shortfall jsonb := '[]'::jsonb;
+    v_count integer;
+    v_committed integer := 0;
+begin
+    -- Tunggu sweeper yang mungkin sedang memproses hold order ini
+    perform 1 from stock_reservations where order_id = any(p_order_ids) order by id for update;
+
+    -- Kunci produk yang holdnya sudah dilepas (urut id supaya tidak deadlock dengan place_order)
+    perform 1
+       from products p
+      where p.id in (select product_id from stock_reservations
+                      where order_id = any(p_order_ids) and status = 'released')
+      order by p.id
+        for update;
+
+    for v_order_id in
+        select distinct order_id from stock_reservations
+         where order_id = any(p_order_ids) and status in ('held', 'released')
+         order by order_id
+    loop
+        select coalesce(jsonb_agg(jsonb_build_object(
+                   'order_id', v_order_id,
+                   'product_id', s.product_id,
+                   'requested', s.quantity,
+                   'available', p.stock
+               ) order by s.product_id), '[]'::jsonb)
+          into v_missing
+          from (select product_id, sum(quantity) as quantity
+                  from stock_reservations
+                 where order_id = v_order_id and status = 'released'
+                 group by product_id) s
+          join products p on p.id = s.product_id
+         where p.stock < s.quantity;
+
+        if jsonb_array_length(v_missing) > 0 then
+            -- Stok sudah terjual lagi: jangan dikurangi, laporkan ke aplikasi
+            v_shortfall := v_shortfall || v_missing;
+            continue;
+        end if;
+
+        update products p
+           set stock = p.stock - s.quantity
+          from (select product_id, sum(quantity) as quantity
+                  from stock_reservations
+                 where order_id = v_order_id and status = 'released'
+                 group by product_id) s
+         where p.id = s.product_id;
+
+        update stock_reservations r
+           set status = 'committed', resolved_at = now()
+         where r.order_id = v_order_id and r.status in ('held', 'released');
+        get diagnostics v_count = row_count;
+        v_committed := v_committed + v_count;
+    end loop;
+
+    return jsonb_build_object('committed', v_committed, 'shortfall', v_shortfall);
+end;
+$$;
+
+revoke all on function public.commit_reservations(bigint[]) from public, anon, authenticated;
+grant execute on function public.commit_reservations(bigint[]) to service_role;
@@ -0,0 +1,41 @@
+-- Voucher quota for orders that are paid after they failed.
+--
+-- orders_release_voucher (003) gives the voucher back when an order moves
+-- to 'failed', e.g. when the hold sweeper expires it. The buyer can still
+-- pay that invoice later; the webhook then moves the order to 'success'
+-- (or 'out_of_stock', see 007) and the order keeps its discount. From now
+-- on an order that leaves 'failed' takes its voucher again: the
+-- voucher_redemptions row is re-inserted and used_count incremented, so
+-- the order counts against max_uses and max_uses_per_user again. The
+-- limits are not checked here: the buyer has already paid.
+--
+-- Apply after 007_commit_shortfall.sql:
+--   psql "$DATABASE_URL" -f migrations/008_voucher_reclaim.sql
+
+create or replace function public.reclaim_voucher_redemption()
+returns trigger
+language plpgsql
+as $$
+begin
+    with reclaimed as (
+        insert into voucher_redemptions (order_id, voucher_code, user_id)
+        select new.id, v.code, new.user_id
+          from vouchers v
+         where v.code = new.voucher_code
+        on conflict (order_id) do nothing
+        returning voucher_code
+    )
+    update vouchers v
+       set used_count = v.used_count + 1
+      from reclaimed r
+     where v.code = r.voucher_code;
+    return new;
+end;
+$$;
+
+drop trigger if exists orders_reclaim_voucher on public.orders;
+create trigger orders_reclaim_voucher
+    after update of status on public.orders
+    for each row
+    when (old.status = 'failed' and new.status is distinct from 'failed' and new.voucher_code is not null)
+    execute function public.reclaim_voucher_redemption();
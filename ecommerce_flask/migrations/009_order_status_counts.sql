@@ -0,0 +1,23 @@
+-- Order counts per status for the admin orders page in one query.
+--
+-- admin_orders ran one count='exact' query per status card (four round
+-- trips, each counting the whole table). order_status_counts() groups
+-- once over an index on orders.status and returns {"<status>": <count>}.
+-- Only the service_role key may call it: order volume is not public.
+--
+-- Apply after 008_voucher_reclaim.sql:
+--   psql "$DATABASE_URL" -f migrations/009_order_status_counts.sql
+
+create index if not exists orders_status_idx on public.orders (status);
+
+create or replace function public.order_status_counts()
+returns jsonb
+language sql
+stable
+as $$
+    select coalesce(jsonb_object_agg(status, n), '{}'::jsonb)
+      from (select status, count(*) as n from orders where status is not null group by status) s;
+$$;
+
+revoke all on function public.order_status_counts() from public, anon, authenticated;
+grant execute on function public.order_status_counts() to service_role;
@@ -0,0 +1,23 @@
+-- Description excerpt for product cards.
+--
+-- Product cards (home, listings, search, sport pages) show the first 100
+-- characters of the description, followed by "..." when it is longer.
+-- Listing queries do not select the full description; instead they
+-- select this computed column, aliased as description
+-- (services/product_repository.PRODUCT_CARD:
+-- 'description:description_excerpt'). PostgREST exposes a function that
+-- takes a products row as a column of products. It returns 101 characters
+-- so the template can still tell whether the text was cut.
+--
+-- Apply after 009_order_status_counts.sql:
+--   psql "$DATABASE_URL" -f migrations/010_description_excerpt.sql
+
+create or replace function public.description_excerpt(p public.products)
+returns text
+language sql
+stable
+as $$
+    select left(coalesce(p.description, ''), 101);
+$$;
+
+grant execute on function public.description_excerpt(public.products) to anon, authenticated, service_role;
@@ -0,0 +1,135 @@
+"""
+Static asset pipeline: content-hashed copies of static/ with gzip/brotli variants (tools/build_assets.py)
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli opsional: tanpa modul ini hanya varian .gz yang dibuat
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+DIST_DIRNAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Hanya tipe teks yang dikompresi; gambar/font sudah terkompresi
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml', '.ico'}
+MIN_COMPRESS_SIZE = 512  # bytes
+
+_settings = {'static_dir': None, 'dist_dir': None, 'max_age': 31536000, 'manifest': {}}
+
+
+def fingerprint(path, data):
+    """``css/style.css`` -> ``css/style.<hash>.css`` (first 12 hex chars of the SHA-256)"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build(static_dir, verbose=False):
+    """Write fingerprinted copies of every file under ``static_dir`` (plus .gz/.br) to ``static_dir/dist``.
+
+    The new tree is built next to the old one and swapped in at the end,
+    so a running app never sees a half-written manifest. Returns the
+    manifest ``{original path: fingerprinted path}``.
+    """
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    staging = dist_dir + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    manifest = {}
+
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir:
+            dirs[:] = [d for d in dirs if d not in (DIST_DIRNAME, DIST_DIRNAME + '.tmp')]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            path = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            hashed = fingerprint(path, data)
+            target = os.path.join(staging, hashed)
+            _write(target, data)
+            manifest[path] = hashed
+
+            sizes = [len(data)]
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE and len(data) >= MIN_COMPRESS_SIZE:
+                # mtime=0 supaya hasil build sama persis untuk isi yang sama
+                variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+                if brotli is not None:
+                    variants.append(('.br', brotli.compress(data, quality=11)))
+                for suffix, compressed in variants:
+                    if len(compressed) < len(data):
+                        _write(target + suffix, compressed)
+                        sizes.append(len(compressed))
+            if verbose:
+                print(f'{path} -> {hashed} ({", ".join(str(size) for size in sizes)} bytes)')
+
+    _write(os.path.join(staging, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    old = dist_dir + '.old'
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.isdir(dist_dir):
+        os.rename(dist_dir, old)
+    os.rename(staging, dist_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+def configure(static_dir, max_age=None):
+    """Load the manifest written by ``build()``; without one, asset_url() falls back to plain /static URLs"""
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    _settings['static_dir'] = static_dir
+    _settings['dist_dir'] = dist_dir
+    if max_age is not None:
+        _settings['max_age'] = max_age
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME)) as f:
+            _settings['manifest'] = json.load(f)
+    except FileNotFoundError:
+        log.info("Manifest aset belum ada (jalankan tools/build_assets.py); memakai /static biasa")
+        _settings['manifest'] = {}
+    return _settings['manifest']
+
+
+def asset_url(endpoint, **values):
+    """Drop-in for ``url_for('static', filename=...)`` that points at the fingerprinted copy when there is one"""
+    if endpoint == 'static':
+        hashed = _settings['manifest'].get(values.get('filename'))
+        if hashed:
+            values['filename'] = hashed
+            return url_for('static_asset', **values)
+    return url_for(endpoint, **values)
+
+
+def send_asset(filename):
+    """Response for a fingerprinted file: brotli or gzip variant when accepted, cached for a year as immutable"""
+    dist_dir = _settings['dist_dir']
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    served = filename
+    for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[name] and os.path.isfile(os.path.join(dist_dir, filename + suffix)):
+            encoding = name
+            served = filename + suffix
+            break
+
+    response = send_from_directory(dist_dir, served, mimetype=mimetype, max_age=_settings['max_age'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={_settings["max_age"]}, immutable'
+    return response
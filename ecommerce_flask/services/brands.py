@@ -0,0 +1,166 @@
+"""
+Brand taxonomy: brand assignment for products and an in-memory brand -> product id index
+(see migrations/004_product_brand.sql)
+"""
+
+import logging
+import threading
+import time
+
+from services.product_repository import iter_products
+
+log = logging.getLogger(__name__)
+
+BRAND_LIST = [
+    {'name': 'Nike', 'logo_url': 'https://upload.wikimedia.org/wikipedia/commons/a/a6/Logo_NIKE.svg', 'slug': 'nike'},
+    {'name': 'Adidas', 'logo_url': 'https://upload.wikimedia.org/wikipedia/commons/2/20/Adidas_Logo.svg', 'slug': 'adidas'},
+    {'name': 'Puma', 'logo_url': 'https://www.svgrepo.com/show/303470/puma-logo-logo.svg', 'slug': 'puma'},
+    {'name': 'Reebok', 'logo_url': 'https://upload.wikimedia.org/wikipedia/commons/5/53/Reebok_2019_logo.svg', 'slug': 'reebok'},
+    {'name': 'Converse', 'logo_url': 'https://wallpapers.com/images/hd/white-2007-converse-logo-f9eskkopzvb311gm.jpg', 'slug': 'converse'},
+    {'name': 'Specs', 'logo_url': 'https://2.bp.blogspot.com/-EcYgWHarEUs/VuYo9G8nuNI/AAAAAAAACEQ/JiIZWu9pH7IE0GAAU1B6H2K3HGQhe4gng/s1600/specs.png', 'slug': 'specs'},
+    {'name': 'Ellesse', 'logo_url': 'https://logos-world.net/wp-content/uploads/2022/06/Ellesse-Logo.jpg', 'slug': 'ellesse'},
+    {'name': 'Diadora', 'logo_url': 'https://cdn.freebiesupply.com/logos/thumbs/2x/diadora-logo.png', 'slug': 'diadora'},
+]
+
+BRANDS_BY_SLUG = {brand['slug']: brand for brand in BRAND_LIST}
+
+
+def detect_brand(name):
+    """Slug of the first brand in BRAND_LIST whose name occurs in ``name``, or None.
+
+    Same rule the brand pages used to apply with ``ilike('%brand%')``,
+    now evaluated once when the product is written.
+    """
+    lowered = (name or '').lower()
+    for brand in BRAND_LIST:
+        if brand['name'].lower() in lowered:
+            return brand['slug']
+    return None
+
+
+class BrandIndex:
+    """brand slug -> sorted product ids, loaded with one pass over ``products``.
+
+    Product writes in this process update the index directly; a reload
+    in a background thread every ``ttl`` seconds picks up writes made by
+    other workers, while lookups keep using the previous index.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.loads = 0
+        self._client = None
+        self._ids = None
+        self._brand_of = {}
+        self._expires_at = 0
+        self._rebuilding = False
+        self._pending = None  # tulis produk selama reload, diterapkan ulang ke index baru
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def configure(self, client=None, ttl=None):
+        with self._lock:
+            if client is not None:
+                self._client = client
+            if ttl is not None:
+                self.ttl = ttl
+            self._expires_at = 0
+
+    def _load(self):
+        brand_of = {}
+        if self._client:
+            try:
+                rows = list(iter_products(self._client, 'id, brand'))
+            except Exception as e:
+                # Kolom brand belum ada (migrasi 004 belum dijalankan): hitung dari nama
+                log.warning("Kolom brand tidak tersedia, brand dihitung dari nama produk: %s", e)
+                rows = [{'id': row['id'], 'brand': detect_brand(row.get('name'))} for row in iter_products(self._client, 'id, name')]
+            for row in rows:
+                if row.get('brand') in BRANDS_BY_SLUG:
+                    brand_of[row['id']] = row['brand']
+        ids = {slug: [] for slug in BRANDS_BY_SLUG}
+        for product_id in sorted(brand_of):
+            ids[brand_of[product_id]].append(product_id)
+        return brand_of, ids
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                brand_of, ids = self._load()
+                with self._lock:
+                    for product_id, brand in self._pending or ():
+                        self._apply(brand_of, ids, product_id, brand)
+                    self._brand_of, self._ids = brand_of, ids
+                    self._expires_at = time.monotonic() + self.ttl
+                    self.loads += 1
+            except Exception:
+                # Tetap pakai index terakhir, dicoba lagi paling lambat semenit kemudian
+                log.exception("Kesalahan memuat index brand")
+                with self._lock:
+                    if self._ids is None:
+                        self._brand_of, self._ids = {}, {slug: [] for slug in BRANDS_BY_SLUG}
+                    self._expires_at = time.monotonic() + min(self.ttl, 60)
+            finally:
+                with self._lock:
+                    self._pending = None
+                    self._rebuilding = False
+                self._ready.set()
+
+        self._rebuilding = True
+        self._pending = []
+        threading.Thread(target=run, name='brand-index-rebuild', daemon=True).start()
+
+    def _current(self):
+        with self._lock:
+            if self._ids is not None:
+                if time.monotonic() >= self._expires_at and not self._rebuilding:
+                    self._rebuild_in_background()
+                return self._ids
+            if not self._rebuilding:
+                self._rebuild_in_background()
+        # Lookup pertama menunggu load awal selesai
+        self._ready.wait()
+        with self._lock:
+            return self._ids
+
+    def product_ids(self, slug):
+        """Product ids of brand ``slug`` in id order"""
+        return list(self._current().get(slug, []))
+
+    @staticmethod
+    def _apply(brand_of, ids, product_id, brand):
+        old = brand_of.pop(product_id, None)
+        if old is not None:
+            ids[old] = [i for i in ids[old] if i != product_id]
+        if brand in ids:
+            brand_of[product_id] = brand
+            ids[brand] = sorted(ids[brand] + [product_id])
+
+    def set_brand(self, product_id, brand):
+        """Record a product write (``brand`` None = no known brand)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((product_id, brand))
+            if self._ids is None:
+                return
+            self._apply(self._brand_of, self._ids, product_id, brand)
+
+    def remove(self, product_id):
+        self.set_brand(product_id, None)
+
+    def invalidate(self):
+        """Reload on the next lookup"""
+        with self._lock:
+            self._expires_at = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'products': len(self._brand_of),
+                'brands': {slug: len(ids) for slug, ids in (self._ids or {}).items()},
+                'loads': self.loads,
+                'ttl': self.ttl,
+            }
+
+
+brand_index = BrandIndex()
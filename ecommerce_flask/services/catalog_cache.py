@@ -0,0 +1,156 @@
+"""
+Read-through cache for product catalog queries
+"""
+
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class CatalogCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    Keys are tuples whose first element is a namespace, e.g.
+    ``('list', 'category', 'man')`` or ``('product', 12)``.
+
+    With a ``version_path`` the invalidations are shared between
+    processes (gunicorn workers): a write replaces that file, and every
+    lookup compares the file's identity (inode, mtime) with the last one
+    it saw -- one ``stat()`` -- and drops its entries when it changed.
+    """
+
+    def __init__(self, maxsize=512, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self.version_path = None
+        self._stamp = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, ttl=None, version_path=None):
+        """Resize the cache / change the TTL / share invalidations through ``version_path`` (called once from app.py)"""
+        if version_path is not None:
+            os.makedirs(os.path.dirname(version_path) or '.', exist_ok=True)
+        with self._lock:
+            if version_path is not None:
+                self.version_path = version_path
+                self._stamp = self._read_stamp()
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key`` or call ``loader()`` and cache it.
+
+        Exceptions raised by the loader are not cached.
+        """
+        now = time.monotonic()
+        stamp = self._read_stamp()
+        with self._lock:
+            self._sync(stamp)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            version = self.version
+
+        value = loader()
+
+        with self._lock:
+            # Jangan simpan hasil jika katalog berubah selama query berjalan
+            if version == self.version and self.maxsize > 0:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate_product(self, product_id=None):
+        """Drop every listing plus the detail entry of ``product_id``, here and in the other workers"""
+        with self._lock:
+            self.version += 1
+            for key in [k for k in self._entries if k[0] == 'list']:
+                del self._entries[key]
+            if product_id is not None:
+                self._entries.pop(('product', product_id), None)
+        self._publish()
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+        self._publish()
+
+    def current_version(self):
+        """``version`` after picking up invalidations from other workers (used in page cache keys)"""
+        stamp = self._read_stamp()
+        with self._lock:
+            self._sync(stamp)
+            return self.version
+
+    def _read_stamp(self):
+        if not self.version_path:
+            return None
+        try:
+            st = os.stat(self.version_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _sync(self, stamp):
+        # Dipanggil dengan _lock dipegang
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.version += 1
+            self._entries.clear()
+
+    def _publish(self):
+        # File baru (inode baru) lalu os.replace: worker lain melihat perubahan
+        # walaupun dua penulisan jatuh pada tick mtime yang sama. Stamp lokal
+        # sengaja tidak diperbarui, jadi proses ini juga mengosongkan cache
+        # sekali lagi -- penulisan produk jarang, dan tidak ada yang terlewat.
+        if not self.version_path:
+            return
+        directory = os.path.dirname(self.version_path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-version-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(f'{os.getpid()} {time.time()}\n')
+            os.replace(tmp_path, self.version_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def stats(self):
+        """Hit/miss counters used to size the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,181 @@
+"""
+Shared Supabase clients (project key and service role key): one each per process, created on first use
+"""
+
+import logging
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient as PostgrestSession
+from supabase import Client, ClientOptions, SupabaseAuthClient
+
+from services.metrics import metrics
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+_settings = {
+    'url': os.getenv('SUPABASE_URL'),
+    'key': os.getenv('SUPABASE_KEY'),
+    'service_key': os.getenv('SUPABASE_SERVICE_KEY'),
+    'pool_size': 10,
+    'keepalive_expiry': 30.0,
+    'timeout': 10.0,
+    'connect_timeout': 5.0,
+}
+_clients = {}  # nama setting kunci ('key' / 'service_key') -> client, atau None jika tidak dikonfigurasi
+_lock = threading.Lock()
+
+
+def is_valid_supabase_credentials(url, key):
+    """Check if Supabase credentials are valid (not placeholders)"""
+    if not url or not key:
+        return False
+
+    # Check for various placeholder patterns
+    placeholders = [
+        'your-supabase-url-here',
+        'your-supabase-key-here',
+        'your-project-id',
+        'placeholder',
+        'your-'
+    ]
+
+    url_lower = url.lower()
+    key_lower = key.lower()
+
+    for placeholder in placeholders:
+        if placeholder in url_lower or placeholder in key_lower:
+            return False
+
+    return True
+
+
+def configure(url=None, key=None, service_key=None, pool_size=None, keepalive_expiry=None, timeout=None,
+              connect_timeout=None):
+    """Override the settings read from the environment (called once from app.py).
+
+    Has no effect once the client has been created.
+    """
+    values = {
+        'url': url,
+        'key': key,
+        'service_key': service_key,
+        'pool_size': pool_size,
+        'keepalive_expiry': keepalive_expiry,
+        'timeout': timeout,
+        'connect_timeout': connect_timeout,
+    }
+    with _lock:
+        _settings.update({name: value for name, value in values.items() if value is not None})
+
+
+class PooledClient(Client):
+    """Supabase client whose PostgREST calls share one keep-alive connection pool.
+
+    Data queries always authenticate with the project key: this client is
+    shared by every request in the process, so a user's auth session (from
+    ``auth.sign_in_with_password``) must not leak into its headers.
+    """
+
+    def _init_postgrest_client(self, rest_url, headers, schema, timeout=None):
+        postgrest = SyncPostgrestClient(rest_url, headers=headers, schema=schema)
+        default_session = postgrest.session
+        postgrest.session = PostgrestSession(
+            base_url=rest_url,
+            headers=default_session.headers,
+            timeout=httpx.Timeout(_settings['timeout'], connect=_settings['connect_timeout']),
+            limits=httpx.Limits(
+                max_connections=_settings['pool_size'],
+                max_keepalive_connections=_settings['pool_size'],
+                keepalive_expiry=_settings['keepalive_expiry'],
+            ),
+            follow_redirects=True,
+            http2=True,
+            event_hooks=metrics.httpx_hooks('supabase'),
+        )
+        default_session.close()
+        return postgrest
+
+    @staticmethod
+    def _init_supabase_auth_client(auth_url, client_options):
+        # Sama dengan bawaan supabase-py, ditambah hook metrics pada client HTTP-nya
+        return SupabaseAuthClient(
+            url=auth_url,
+            auto_refresh_token=client_options.auto_refresh_token,
+            persist_session=client_options.persist_session,
+            storage=client_options.storage,
+            headers=client_options.headers,
+            flow_type=client_options.flow_type,
+            http_client=PostgrestSession(follow_redirects=True, http2=True,
+                                         event_hooks=metrics.httpx_hooks('supabase')),
+        )
+
+    def _listen_to_auth_events(self, event, session):
+        pass
+
+
+def _get(key_setting):
+    client = _clients.get(key_setting)
+    if client is not None or key_setting in _clients:
+        return client
+    with _lock:
+        if key_setting in _clients:
+            return _clients[key_setting]
+        client = None
+        if not is_valid_supabase_credentials(_settings['url'], _settings[key_setting]):
+            if key_setting == 'service_key':
+                log.warning("SUPABASE_SERVICE_KEY not configured. Placing orders and updating payments will be disabled.")
+            else:
+                log.warning("Supabase credentials not configured or using placeholders. Database features will be disabled.")
+        else:
+            try:
+                options = ClientOptions(auto_refresh_token=False, persist_session=False)
+                client = PooledClient(_settings['url'], _settings[key_setting], options)
+                log.info("Supabase client initialized", extra={'key': key_setting})
+            except Exception:
+                log.exception("Error initializing Supabase client", extra={'key': key_setting})
+        _clients[key_setting] = client
+        return client
+
+
+def get_client():
+    """Return the process-wide client (project key), or None when Supabase is not configured"""
+    return _get('key')
+
+
+def get_service_client():
+    """Return the process-wide service role client, or None when SUPABASE_SERVICE_KEY is not set.
+
+    Only for server-side calls that the public key may not make: placing
+    orders and committing/releasing stock holds (see migrations/006).
+    """
+    return _get('service_key')
+
+
+class LazySupabase:
+    """Stand-in for a client that modules can import at load time.
+
+    ``if supabase:`` is False when Supabase is not configured; attribute
+    access (``supabase.table(...)``) creates the client on first use.
+    """
+
+    def __init__(self, getter=get_client):
+        self._getter = getter
+
+    def __bool__(self):
+        return self._getter() is not None
+
+    def __getattr__(self, name):
+        client = self._getter()
+        if client is None:
+            raise RuntimeError('Supabase client not configured')
+        return getattr(client, name)
+
+
+supabase = LazySupabase()
+service_supabase = LazySupabase(get_service_client)
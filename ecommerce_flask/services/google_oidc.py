@@ -0,0 +1,172 @@
+"""
+Google OpenID Connect: cached discovery document / signing keys and local ID-token verification
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+from services.metrics import metrics
+
+try:
+    import jwt
+    from jwt.algorithms import has_crypto
+except ImportError:  # PyJWT tidak terpasang: callback memakai endpoint userinfo
+    jwt = None
+    has_crypto = False
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ('https://accounts.google.com', 'accounts.google.com')
+
+_settings = {
+    'discovery_url': os.getenv('GOOGLE_DISCOVERY_URL', 'https://accounts.google.com/.well-known/openid-configuration'),
+    'client_id': os.getenv('GOOGLE_CLIENT_ID'),
+    'timeout': 5.0,
+    'default_ttl': 3600,
+}
+# name -> (expires_at, value)
+_cache = {}
+# name -> Event yang di-set saat refresh yang sedang berjalan selesai
+_refreshing = {}
+_lock = threading.RLock()
+_http = requests.Session()
+
+
+def configure(discovery_url=None, client_id=None, timeout=None, default_ttl=None):
+    """Override the settings read from the environment (called once from app.py)"""
+    values = {'discovery_url': discovery_url, 'client_id': client_id, 'timeout': timeout, 'default_ttl': default_ttl}
+    with _lock:
+        _settings.update({name: value for name, value in values.items() if value is not None})
+        _cache.clear()
+
+
+def can_verify_locally():
+    """True when PyJWT with RSA support is installed"""
+    return jwt is not None and has_crypto
+
+
+def _max_age(resp):
+    match = re.search(r'max-age=(\d+)', resp.headers.get('Cache-Control', ''))
+    return int(match.group(1)) if match else _settings['default_ttl']
+
+
+def _cached(name, fetch, force=False):
+    """Return the cached value of ``name``, refetching it once it expired.
+
+    Only one thread fetches at a time and the lock is not held during the
+    HTTP call: while a refresh runs, other threads get the expired copy
+    (or wait for the refresh when there is no copy yet or ``force`` is
+    set). If a refresh fails, the expired copy is served instead of
+    failing the login.
+    """
+    while True:
+        with _lock:
+            entry = _cache.get(name)
+            if entry is not None and not force and entry[0] > time.monotonic():
+                return entry[1]
+            running = _refreshing.get(name)
+            if running is None:
+                done = _refreshing[name] = threading.Event()
+                break
+            if entry is not None and not force:
+                return entry[1]
+        # Refresh paksa (kid tidak dikenal) atau belum ada salinan: tunggu hasil refresh yang berjalan
+        running.wait()
+        with _lock:
+            entry = _cache.get(name)
+        if entry is not None:
+            return entry[1]
+
+    try:
+        value, ttl = fetch()
+    except Exception:
+        if entry is None:
+            raise
+        log.warning("Google metadata refresh failed, using cached copy", exc_info=True, extra={'document': name})
+        return entry[1]
+    else:
+        with _lock:
+            _cache[name] = (time.monotonic() + ttl, value)
+        return value
+    finally:
+        with _lock:
+            _refreshing.pop(name, None)
+        done.set()
+
+
+def _fetch_json(url):
+    with metrics.track('google'):
+        resp = _http.get(url, timeout=_settings['timeout'])
+        resp.raise_for_status()
+    return resp.json(), _max_age(resp)
+
+
+def provider_config():
+    """The discovery document (authorization/token/userinfo endpoints, jwks_uri)"""
+    return _cached('discovery', lambda: _fetch_json(_settings['discovery_url']))
+
+
+def _signing_keys(force=False):
+    def fetch():
+        jwks, ttl = _fetch_json(provider_config()['jwks_uri'])
+        return {key.key_id: key for key in jwt.PyJWKSet.from_dict(jwks).keys}, ttl
+    return _cached('jwks', fetch, force=force)
+
+
+def verify_id_token(id_token):
+    """Check signature, audience, issuer and expiry of ``id_token``; return its claims.
+
+    Raises ``jwt.InvalidTokenError`` when the token is not valid.
+    """
+    kid = jwt.get_unverified_header(id_token).get('kid')
+    keys = _signing_keys()
+    if kid not in keys:
+        # Google merotasi kuncinya: ambil ulang JWKS sekali sebelum menolak token
+        keys = _signing_keys(force=True)
+    if kid not in keys:
+        raise jwt.InvalidTokenError(f'unknown signing key {kid}')
+    claims = jwt.decode(id_token, keys[kid].key, algorithms=['RS256'], audience=_settings['client_id'], leeway=60)
+    if claims.get('iss') not in GOOGLE_ISSUERS:
+        raise jwt.InvalidIssuerError(f"unexpected issuer {claims.get('iss')}")
+    return claims
+
+
+def exchange_code(code, client_secret, redirect_uri):
+    """Trade the authorization code for tokens (access_token, id_token)"""
+    token_endpoint = provider_config()['token_endpoint']
+    with metrics.track('google'):
+        resp = _http.post(token_endpoint, data={
+            'client_id': _settings['client_id'],
+            'client_secret': client_secret,
+            'code': code,
+            'grant_type': 'authorization_code',
+            'redirect_uri': redirect_uri
+        }, timeout=_settings['timeout'])
+        resp.raise_for_status()
+    return resp.json()
+
+
+def fetch_userinfo(access_token):
+    """Fallback when the ID token cannot be verified locally: one extra round trip"""
+    userinfo_endpoint = provider_config()['userinfo_endpoint']
+    with metrics.track('google'):
+        resp = _http.get(userinfo_endpoint,
+                         headers={'Authorization': f'Bearer {access_token}'},
+                         timeout=_settings['timeout'])
+        resp.raise_for_status()
+    return resp.json()
+
+
+def user_info_from_tokens(tokens):
+    """Email/name of the user who logged in, from the ID token when possible"""
+    if tokens.get('id_token') and can_verify_locally():
+        return verify_id_token(tokens['id_token'])
+    return fetch_userinfo(tokens.get('access_token'))
@@ -0,0 +1,222 @@
+"""
+Persistent background job queue backed by a local SQLite file
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    locked_until REAL,
+    result TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready_idx ON jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS jobs_key_idx ON jobs (key, id);
+"""
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help (e.g. the request was rejected)"""
+
+
+class JobQueue:
+    """Jobs survive restarts and are shared by every worker process on the host.
+
+    A job is claimed with a lease (``locked_until``); if the process dies
+    while running it, another worker picks it up once the lease runs out.
+    Failed attempts are retried with exponential backoff.
+    """
+
+    def __init__(self, path='jobs.db', poll_interval=0.5, max_attempts=5, retry_backoff=2.0, lease=120):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease = lease
+        self._handlers = {}
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._workers = []
+        self._workers_pid = None
+        self._lock = threading.Lock()
+        self._counters = {'enqueued': 0, 'succeeded': 0, 'retried': 0, 'failed': 0}
+
+    def configure(self, path=None, poll_interval=None, max_attempts=None, retry_backoff=None, lease=None):
+        """Change the settings (called once from app.py, before the first job)"""
+        if path is not None:
+            self.path = path
+        if poll_interval is not None:
+            self.poll_interval = poll_interval
+        if max_attempts is not None:
+            self.max_attempts = max_attempts
+        if retry_backoff is not None:
+            self.retry_backoff = retry_backoff
+        if lease is not None:
+            self.lease = lease
+
+    def register(self, kind, handler):
+        """``handler(payload)`` runs in a worker thread; its return value is stored as the result"""
+        self._handlers[kind] = handler
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.path = self.path
+        return conn
+
+    def _bump(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def enqueue(self, kind, payload, key=None, max_attempts=None):
+        """Queue a job and return its id.
+
+        If a job with the same ``key`` is still queued or running, no new job
+        is added and the id of the existing one is returned.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if key is not None:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running') ORDER BY id DESC LIMIT 1",
+                    (key,)).fetchone()
+                if row is not None:
+                    conn.execute('COMMIT')
+                    return row['id']
+            cursor = conn.execute(
+                'INSERT INTO jobs (kind, key, payload, max_attempts, run_after, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (kind, key, json.dumps(payload), max_attempts or self.max_attempts, now, now, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._bump('enqueued')
+        self._wake.set()
+        return cursor.lastrowid
+
+    def latest(self, key):
+        """Status of the newest job with ``key``: dict with status/result/error/payload, or None"""
+        row = self._conn().execute(
+            'SELECT id, kind, status, attempts, payload, result, last_error FROM jobs WHERE key = ? ORDER BY id DESC LIMIT 1',
+            (key,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'payload': json.loads(row['payload']),
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['last_error'],
+        }
+
+    def _claim(self):
+        now = time.time()
+        return self._conn().execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?, updated_at = ? "
+            "WHERE id = (SELECT id FROM jobs "
+            "            WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND locked_until < ?) "
+            "            ORDER BY run_after, id LIMIT 1) "
+            "RETURNING id, kind, payload, attempts, max_attempts",
+            (now + self.lease, now, now, now)).fetchone()
+
+    def _finish(self, job_id, status, result=None, error=None, run_after=None):
+        now = time.time()
+        self._conn().execute(
+            'UPDATE jobs SET status = ?, result = ?, last_error = ?, run_after = COALESCE(?, run_after), '
+            'locked_until = NULL, updated_at = ? WHERE id = ?',
+            (status, json.dumps(result) if result is not None else None, error, run_after, now, job_id))
+
+    def run_pending(self, limit=None):
+        """Run ready jobs in this thread until none are left (or ``limit`` ran); return how many ran"""
+        ran = 0
+        while limit is None or ran < limit:
+            job = self._claim()
+            if job is None:
+                break
+            ran += 1
+            handler = self._handlers.get(job['kind'])
+            try:
+                if handler is None:
+                    raise PermanentJobError(f"no handler for job kind {job['kind']}")
+                result = handler(json.loads(job['payload']))
+                self._finish(job['id'], 'done', result=result)
+                self._bump('succeeded')
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                if isinstance(e, PermanentJobError) or job['attempts'] >= job['max_attempts']:
+                    self._finish(job['id'], 'failed', error=error)
+                    self._bump('failed')
+                    log.error("Job gagal permanen: %s", error, extra={'job_id': job['id'], 'kind': job['kind']})
+                else:
+                    delay = min(self.retry_backoff ** job['attempts'], 300)
+                    self._finish(job['id'], 'queued', error=error, run_after=time.time() + delay)
+                    self._bump('retried')
+                    log.warning("Job gagal, dicoba lagi: %s", error, extra={'job_id': job['id'], 'kind': job['kind'], 'retry_in': round(delay)})
+        return ran
+
+    def start_worker(self, threads=1):
+        """Start ``threads`` daemon threads that run jobs as they become ready"""
+        # Thread tidak ikut ter-fork: proses anak memulai workernya sendiri
+        if self._workers and self._workers_pid == os.getpid():
+            return self._workers
+        self._workers = []
+        self._workers_pid = os.getpid()
+
+        def run():
+            while True:
+                try:
+                    if self.run_pending():
+                        continue
+                except Exception:
+                    log.exception("Error in job worker")
+                # Dibangunkan oleh enqueue() di proses ini; job dari proses lain terlihat lewat polling
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+        for index in range(threads):
+            worker = threading.Thread(target=run, name=f'job-worker-{index}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self._workers
+
+    def stats(self):
+        """Jobs per status (from the file) plus this process' counters"""
+        rows = self._conn().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall()
+        with self._lock:
+            result = dict(self._counters)
+        result['jobs'] = {row['status']: row['n'] for row in rows}
+        return result
+
+
+job_queue = JobQueue()
@@ -0,0 +1,198 @@
+"""
+Structured logging: JSON lines written by a background thread, with per-message sampling
+"""
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+from flask import has_request_context, request
+
+# Atribut bawaan LogRecord; atribut lain (dari extra=...) ikut ditulis sebagai field
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'sample'}
+
+# Library yang terlalu ramai untuk level INFO
+QUIET_LOGGERS = ('httpx', 'httpcore', 'hpack')
+
+
+def _fields(record):
+    return {name: value for name, value in vars(record).items() if name not in _RECORD_FIELDS}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, the ``extra`` fields and the traceback"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(_fields(record))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """``time LEVEL logger: msg key=value ...`` for reading logs in a terminal"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line = line.split('\n', 1)
+            line[0] += ' ' + ' '.join(f'{name}={value}' for name, value in fields.items())
+            line = '\n'.join(line)
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of a message: ``log.info(..., extra={'sample': 0.01})`` keeps about 1 in 100.
+
+    ``rates`` ({message template: rate}) overrides the rate given at the
+    call site, e.g. to see every occurrence while debugging. Kept records
+    get a ``sample_rate`` field so counts can be scaled back up.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.sampled_out = 0
+
+    def filter(self, record):
+        rate = self.rates.get(record.msg, getattr(record, 'sample', None))
+        if rate is None or rate >= 1:
+            return True
+        if random.random() >= rate:
+            self.sampled_out += 1
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds method and path of the current request (read here, the writer thread has no request)"""
+
+    def filter(self, record):
+        if has_request_context() and not hasattr(record, 'path'):
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """Puts records on a bounded queue that a listener thread writes out.
+
+    Logging never blocks a request: when the queue is full the record is
+    dropped and counted. The listener is started per process on the first
+    record, so it also runs in gunicorn workers forked after import.
+    """
+
+    def __init__(self, target, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = target
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.queue_size)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Write out what is still queued (registered with atexit)"""
+        if self._listener is not None and self._pid == os.getpid():
+            try:
+                self._listener.stop()
+            except queue.Full:
+                pass
+            self._listener = None
+            self._pid = None
+
+    def prepare(self, record):
+        # Pesan dan traceback dibentuk di thread pemanggil (argumen bisa berubah setelahnya),
+        # sisanya (JSON, tulis ke stdout) di thread listener
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+
+
+def configure(level='INFO', fmt='json', queue_size=10000, sample_rates=None):
+    """Send all logging (app, blueprints, services, werkzeug) through one background writer.
+
+    Called once from app.py; replaces the root logger's handlers.
+    """
+    global _handler
+    target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+    handler = BackgroundQueueHandler(target, queue_size=queue_size)
+    handler.addFilter(SamplingFilter(sample_rates))
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    if _handler is not None:
+        _handler.stop()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # httpx mencatat setiap request Supabase di level INFO
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    if _handler is None:
+        atexit.register(lambda: _handler and _handler.stop())
+    _handler = handler
+    return handler
+
+
+def parse_sample_rates(text):
+    """``'home page=1;product list=0.1'`` -> {'home page': 1.0, 'product list': 0.1}"""
+    rates = {}
+    for item in (text or '').split(';'):
+        message, sep, rate = item.rpartition('=')
+        if sep and message.strip():
+            rates[message.strip()] = float(rate)
+    return rates
+
+
+def stats():
+    """Records dropped because the queue was full or left out by sampling"""
+    if _handler is None:
+        return {'dropped': 0, 'sampled_out': 0, 'queued': 0}
+    sampling = next(f for f in _handler.filters if isinstance(f, SamplingFilter))
+    return {'dropped': _handler.dropped, 'sampled_out': sampling.sampled_out, 'queued': _handler.queue.qsize()}
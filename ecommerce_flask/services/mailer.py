@@ -0,0 +1,226 @@
+"""
+Email outbox: a bounded queue drained by a fixed pool of SMTP workers
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from dotenv import load_dotenv
+
+from services.metrics import metrics
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+
+class Mailer:
+    """``send()`` only queues the message; worker threads deliver it.
+
+    Each worker keeps its authenticated SMTP connection open between
+    messages, sends whatever is waiting in the queue (up to ``batch_size``)
+    over that connection, and closes it after ``idle_timeout`` seconds
+    without mail. Failed deliveries are retried with exponential backoff:
+    the message is parked with a not-before time and picked up again by
+    whichever worker is free once it is due, so no worker sleeps on it.
+    """
+
+    def __init__(self):
+        self.host = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
+        self.port = int(os.getenv('EMAIL_PORT', '587'))
+        self.user = os.getenv('EMAIL_USER')
+        self.password = os.getenv('EMAIL_PASSWORD')
+        self.use_tls = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
+        self.workers = 2
+        self.queue_size = 1000
+        self.batch_size = 20
+        self.max_attempts = 4
+        self.retry_backoff = 2.0
+        self.idle_timeout = 30.0
+        self.timeout = 10.0
+        self._queue = None
+        self._retries = []  # heap (not_before, seq, msg, attempt), dilindungi _lock
+        self._retry_seq = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counters = {'queued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'retried': 0,
+                          'connections': 0, 'batches': 0}
+
+    def configure(self, **settings):
+        """Override settings read from the environment (called once from app.py, before the first send)"""
+        for name, value in settings.items():
+            if not hasattr(self, name) or name.startswith('_'):
+                raise TypeError(f'unknown mailer setting {name}')
+            if value is not None:
+                setattr(self, name, value)
+
+    def is_configured(self):
+        # Tanpa password: server lokal/sink yang tidak butuh login
+        return bool(self.host and self.user)
+
+    def _bump(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _start(self):
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                for index in range(self.workers):
+                    worker = threading.Thread(target=self._run, name=f'mail-worker-{index}', daemon=True)
+                    worker.start()
+                    self._threads.append(worker)
+        return self._queue
+
+    def send(self, to_email, subject, body):
+        """Queue an HTML email; returns False if mail is not configured or the outbox is full"""
+        if not self.is_configured():
+            log.warning("Email config missing, skipping")
+            return False
+        msg = MIMEMultipart()
+        msg['From'] = self.user
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'html'))
+        try:
+            self._start().put_nowait((msg, 1))
+        except queue.Full:
+            # Lebih baik email hilang daripada request login ikut tertahan
+            self._bump('dropped')
+            log.warning("Email outbox full, dropping message", extra={'to': to_email})
+            return False
+        self._bump('queued')
+        return True
+
+    def _connect(self):
+        with metrics.track('smtp'):
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                server.starttls()
+            if self.password:
+                server.login(self.user, self.password)
+        self._bump('connections')
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _deliver(self, server, msg, attempt):
+        """Send one message; returns the connection to keep using (None if it was dropped)"""
+        try:
+            if server is not None:
+                try:
+                    with metrics.track('smtp'):
+                        server.send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # Server menutup koneksi yang lama menganggur: sambung ulang tanpa menunggu
+                    server.close()
+                    server = None
+            if server is None:
+                server = self._connect()
+                with metrics.track('smtp'):
+                    server.send_message(msg)
+            self._bump('sent')
+            return server
+        except smtplib.SMTPRecipientsRefused as e:
+            # Alamat ditolak: mengulang tidak akan membantu, koneksi masih bisa dipakai
+            self._bump('failed')
+            log.error("Error sending email: %s", e, extra={'to': msg['To']})
+            return server
+        except Exception as e:
+            if server is not None:
+                server.close()
+            if attempt >= self.max_attempts:
+                self._bump('failed')
+                log.error("Error sending email: %s", e, extra={'to': msg['To']})
+            else:
+                self._bump('retried')
+                delay = self.retry_backoff ** attempt
+                log.warning("Error sending email, retrying: %s", e, extra={'to': msg['To'], 'retry_in': round(delay)})
+                self._requeue(msg, attempt + 1, delay)
+            return None
+
+    def _requeue(self, msg, attempt, delay):
+        """Park ``msg`` until ``delay`` seconds from now; workers pick it up when it is due"""
+        with self._lock:
+            if len(self._retries) >= self.queue_size:
+                self._counters['dropped'] += 1
+                return
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._retry_seq), msg, attempt))
+
+    def _due_retries(self, limit):
+        """Pop up to ``limit`` parked messages whose retry time has come"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._retries and len(due) < limit and self._retries[0][0] <= now:
+                _, _, msg, attempt = heapq.heappop(self._retries)
+                due.append((msg, attempt, False))
+        return due
+
+    def _next_retry_in(self):
+        """Seconds until the next parked message is due (None if there is none)"""
+        with self._lock:
+            if not self._retries:
+                return None
+            return max(0.0, self._retries[0][0] - time.monotonic())
+
+    def _run(self):
+        server = None
+        last_used = time.monotonic()
+        while True:
+            batch = self._due_retries(self.batch_size)
+            if not batch:
+                # Tunggu email baru, retry berikutnya, atau batas idle koneksi (mana yang lebih dulu)
+                timeout = self._next_retry_in()
+                if server is not None:
+                    idle_left = max(0.0, last_used + self.idle_timeout - time.monotonic())
+                    timeout = idle_left if timeout is None else min(timeout, idle_left)
+                try:
+                    msg, attempt = self._queue.get(timeout=timeout)
+                    batch.append((msg, attempt, True))
+                except queue.Empty:
+                    if server is not None and time.monotonic() - last_used >= self.idle_timeout:
+                        self._close(server)
+                        server = None
+                    continue
+
+            # Kirim semua yang sudah menunggu lewat koneksi yang sama
+            while len(batch) < self.batch_size:
+                try:
+                    msg, attempt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append((msg, attempt, True))
+            self._bump('batches')
+            for msg, attempt, from_queue in batch:
+                try:
+                    server = self._deliver(server, msg, attempt)
+                finally:
+                    if from_queue:
+                        self._queue.task_done()
+            last_used = time.monotonic()
+
+    def stats(self):
+        """Outbox counters for this process"""
+        with self._lock:
+            result = dict(self._counters)
+        result['pending'] = self._queue.qsize() if self._queue is not None else 0
+        result['retrying'] = len(self._retries)
+        result['workers'] = len(self._threads)
+        return result
+
+
+mailer = Mailer()
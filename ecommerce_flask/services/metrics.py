@@ -0,0 +1,254 @@
+"""
+Request latency histograms, external call counters and cache hit ratios in Prometheus text format (/metrics)
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+log = logging.getLogger(__name__)
+
+# Batas bucket latency (detik), sama dengan default prometheus_client
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BACKGROUND = '(background)'  # panggilan dari thread worker, bukan dari request
+UNMATCHED = '(unmatched)'    # 404 tanpa endpoint: satu label, bukan satu per URL
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Metrics:
+    """Counters of this worker, merged with the other workers' on every scrape.
+
+    Each worker writes a snapshot to ``<directory>/metrics-<pid>.json``
+    every ``flush_interval`` seconds; /metrics adds up all snapshots in the
+    directory, so the result does not depend on which worker answers.
+    Counters of workers that have exited stay in the total (their file is
+    kept), cache sizes only come from live workers. Clear the directory
+    when deploying. Without a directory only this worker is reported.
+    """
+
+    def __init__(self, directory=None, flush_interval=10):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._requests = {}  # (endpoint, method, status) -> [count per bucket..., +Inf, sum]
+        self._calls = {}     # (dependency, endpoint) -> [calls, errors, seconds]
+        self._caches = {}    # name -> stats() dengan hits, misses, size
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def configure(self, directory=None, flush_interval=None):
+        """Change the settings (called once from app.py)"""
+        if directory is not None:
+            self.directory = directory
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+
+    def register_cache(self, name, stats):
+        """Report ``stats()['hits' / 'misses' / 'size']`` as cache ``name``"""
+        self._caches[name] = stats
+
+    def observe_request(self, endpoint, method, status, seconds):
+        key = (endpoint, method, str(status))
+        with self._lock:
+            entry = self._requests.get(key)
+            if entry is None:
+                entry = self._requests[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    break
+            else:
+                index = len(LATENCY_BUCKETS)
+            entry[index] += 1
+            entry[-1] += seconds
+
+    def record_call(self, dependency, seconds, error=False):
+        """Count one call to an external service, under the endpoint of the current request"""
+        endpoint = (request.endpoint or UNMATCHED) if has_request_context() else BACKGROUND
+        with self._lock:
+            entry = self._calls.setdefault((dependency, endpoint), [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += 1 if error else 0
+            entry[2] += seconds
+
+    @contextmanager
+    def track(self, dependency):
+        """``with metrics.track('xendit'): ...`` times the block; an exception counts as an error"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record_call(dependency, time.perf_counter() - started, error=True)
+            raise
+        self.record_call(dependency, time.perf_counter() - started)
+
+    def httpx_hooks(self, dependency):
+        """``event_hooks`` for an httpx client: every response is counted, 5xx as an error.
+
+        The time is measured until the response headers arrive; requests
+        that fail before a response (connection errors) are not counted.
+        """
+        def on_request(http_request):
+            http_request.extensions['metrics_started'] = time.perf_counter()
+
+        def on_response(response):
+            started = response.request.extensions.pop('metrics_started', None)
+            if started is not None:
+                self.record_call(dependency, time.perf_counter() - started, error=response.status_code >= 500)
+
+        return {'request': [on_request], 'response': [on_response]}
+
+    def init_app(self, app):
+        """Time every request of ``app``"""
+        @app.before_request
+        def _start_timer():
+            g._metrics_started = time.perf_counter()
+            if self.directory and self._flusher_pid != os.getpid():
+                self._start_flusher()
+
+        @app.after_request
+        def _observe(response):
+            started = g.pop('_metrics_started', None)
+            if started is not None:
+                self.observe_request(request.endpoint or UNMATCHED, request.method, response.status_code,
+                                     time.perf_counter() - started)
+            return response
+
+    def _start_flusher(self):
+        # Dijalankan dari request pertama di tiap worker: thread tidak ikut ter-fork dari master gunicorn
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+        thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Kesalahan menulis metrics")
+
+    def snapshot(self):
+        """Counters of this process as a JSON-friendly dict"""
+        caches = {}
+        for name, stats in self._caches.items():
+            try:
+                values = stats()
+            except Exception:
+                continue
+            caches[name] = [values.get('hits', 0), values.get('misses', 0), values.get('size', 0)]
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'requests': [list(key) + list(entry) for key, entry in self._requests.items()],
+                'calls': [list(key) + list(entry) for key, entry in self._calls.items()],
+                'caches': caches,
+            }
+
+    def flush(self):
+        """Write this worker's snapshot to its file (atomically)"""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def _snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # file sedang ditulis ulang atau rusak
+        return snapshots
+
+    def render(self):
+        """All workers' metrics in the Prometheus text exposition format"""
+        histograms, calls, caches = {}, {}, {}
+        workers = 0
+        for snap in self._snapshots():
+            alive = snap['pid'] == os.getpid() or _pid_alive(snap['pid'])
+            workers += 1 if alive else 0
+            for row in snap['requests']:
+                entry = histograms.setdefault(tuple(row[:3]), [0] * (len(row) - 3))
+                for index, value in enumerate(row[3:]):
+                    entry[index] += value
+            for row in snap['calls']:
+                entry = calls.setdefault(tuple(row[:2]), [0, 0, 0.0])
+                for index, value in enumerate(row[2:]):
+                    entry[index] += value
+            for name, (hits, misses, size) in snap['caches'].items():
+                entry = caches.setdefault(name, [0, 0, 0])
+                entry[0] += hits
+                entry[1] += misses
+                entry[2] += size if alive else 0
+
+        lines = ['# HELP app_request_duration_seconds Request latency per Flask endpoint',
+                 '# TYPE app_request_duration_seconds histogram']
+        for (endpoint, method, status), entry in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), entry[:-1]):
+                cumulative += count
+                labels = _labels(endpoint=endpoint, method=method, status=status, le=bound)
+                lines.append(f'app_request_duration_seconds_bucket{labels} {cumulative}')
+            labels = _labels(endpoint=endpoint, method=method, status=status)
+            lines.append(f'app_request_duration_seconds_sum{labels} {entry[-1]:.6f}')
+            lines.append(f'app_request_duration_seconds_count{labels} {cumulative}')
+
+        series = [
+            ('app_dependency_calls_total', 'Calls to Supabase, Xendit, SMTP and Google per endpoint', 0, 'd'),
+            ('app_dependency_errors_total', 'Failed calls (exception or HTTP 5xx)', 1, 'd'),
+            ('app_dependency_duration_seconds_total', 'Time spent in those calls', 2, '.6f'),
+        ]
+        for name, help_text, index, fmt in series:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (dependency, endpoint), entry in sorted(calls.items()):
+                lines.append(f'{name}{_labels(dependency=dependency, endpoint=endpoint)} {entry[index]:{fmt}}')
+
+        lines += ['# HELP app_cache_hits_total Cache hits', '# TYPE app_cache_hits_total counter']
+        lines += [f'app_cache_hits_total{_labels(cache=name)} {entry[0]}' for name, entry in sorted(caches.items())]
+        lines += ['# HELP app_cache_misses_total Cache misses', '# TYPE app_cache_misses_total counter']
+        lines += [f'app_cache_misses_total{_labels(cache=name)} {entry[1]}' for name, entry in sorted(caches.items())]
+        lines += ['# HELP app_cache_hit_ratio Hits / lookups since the workers started',
+                  '# TYPE app_cache_hit_ratio gauge']
+        for name, (hits, misses, _) in sorted(caches.items()):
+            ratio = hits / (hits + misses) if hits + misses else 0.0
+            lines.append(f'app_cache_hit_ratio{_labels(cache=name)} {ratio:.4f}')
+        lines += ['# HELP app_cache_entries Entries held by live workers', '# TYPE app_cache_entries gauge']
+        lines += [f'app_cache_entries{_labels(cache=name)} {entry[2]}' for name, entry in sorted(caches.items())]
+        lines += ['# HELP app_workers Worker processes reporting metrics', '# TYPE app_workers gauge',
+                  f'app_workers {workers}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,55 @@
+"""
+Order placement through the ``place_order`` Postgres function
+(see migrations/001_place_order.sql and 006_server_side_pricing.sql)
+"""
+
+
+def place_order(client, user_id, lines, expected_total=None, voucher_code=None, hold_seconds=1800):
+    """Validate stock, price the order, create it with its items and hold the stock atomically.
+
+    ``client`` must use the service role key: the function trusts
+    ``user_id``. ``lines`` is a list of ``{'product_id', 'quantity'}``
+    dicts; prices, discount and total are computed in the database from
+    ``products`` and ``vouchers``. Everything happens in one RPC call (one
+    transaction, product rows locked), so concurrent buyers cannot
+    oversell. The stock is held for ``hold_seconds`` until the payment is
+    committed or released (see services/reservations.py).
+
+    ``expected_total`` is the total (whole rupiah) the buyer was shown.
+    If the database arrives at a different total, no order is created and
+    ``price_changed`` is True, with the current ``prices``
+    (``[{'product_id', 'price'}]``) and ``voucher`` terms to show instead.
+
+    Returns ``{'ok', 'order_id', 'total', 'discount_amount', 'shipping_cost',
+    'insufficient', 'voucher_error', 'price_changed', 'prices', 'voucher'}``
+    where each insufficient entry is ``{'product_id', 'requested', 'available'}``
+    and ``voucher_error`` says why ``voucher_code`` was refused
+    (see migrations/003_vouchers.sql).
+    """
+    response = client.rpc('place_order', {
+        'p_user_id': user_id,
+        'p_items': [
+            {
+                'product_id': int(line['product_id']),
+                'quantity': int(line['quantity'])
+            }
+            for line in lines
+        ],
+        'p_expected_total': int(expected_total) if expected_total is not None else None,
+        'p_voucher_code': voucher_code,
+        'p_hold_seconds': int(hold_seconds)
+    }).execute()
+
+    result = response.data or {}
+    return {
+        'ok': bool(result.get('ok')),
+        'order_id': result.get('order_id'),
+        'total': result.get('total'),
+        'discount_amount': result.get('discount_amount'),
+        'shipping_cost': result.get('shipping_cost'),
+        'insufficient': result.get('insufficient') or [],
+        'voucher_error': result.get('voucher_error'),
+        'price_changed': bool(result.get('price_changed')),
+        'prices': result.get('prices') or [],
+        'voucher': result.get('voucher')
+    }
@@ -0,0 +1,135 @@
+"""
+Rendered-page cache for anonymous catalog views, with strong ETags and 304 Not Modified
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from services.catalog_cache import catalog_cache
+
+
+class PageCache:
+    """LRU of rendered pages, ``(etag, body, content_type)`` per key.
+
+    Keys contain ``catalog_cache.current_version()``, so a product write
+    in any worker makes every stored page unreachable at once (see
+    ``CatalogCache.version_path``); entries also expire after ``ttl``
+    seconds. ``ttl=0`` turns the cache off.
+    """
+
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.not_modified = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._entries.clear()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, page):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, page)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypasses': self.bypasses,
+                'not_modified': self.not_modified,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+page_cache = PageCache()
+
+
+def _anonymous():
+    """True when the session holds nothing that can change the page (no login, flash or preference)"""
+    return all(key == '_permanent' for key in session)
+
+
+def _respond(page, state):
+    etag, body, content_type = page
+    if request.if_none_match.contains(etag):
+        page_cache.count('not_modified')
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, content_type=content_type)
+    response.set_etag(etag)
+    # Browser selalu validasi ulang (ETag); halaman untuk user login berbeda di URL yang sama
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Cookie'
+    response.headers['X-Page-Cache'] = state
+    return response
+
+
+def cached_page(view):
+    """Serve an anonymous GET of ``view`` from the page cache.
+
+    The key is the endpoint, its URL arguments, the query string and the
+    catalog version. Requests whose session carries a login, flashed
+    messages or preferences bypass the cache, as do non-200 responses.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not page_cache.ttl or not _anonymous():
+            page_cache.count('bypasses')
+            return view(*args, **kwargs)
+
+        key = (request.endpoint,
+               tuple(sorted(request.view_args.items())),
+               tuple(sorted(request.args.items(multi=True))),
+               catalog_cache.current_version())
+        page = page_cache.get(key)
+        if page is not None:
+            return _respond(page, 'HIT')
+
+        response = make_response(view(*args, **kwargs))
+        # Jangan simpan halaman error/redirect atau halaman yang baru saja memanggil flash()
+        if response.status_code != 200 or response.direct_passthrough or not _anonymous():
+            return response
+        body = response.get_data()
+        page = (hashlib.blake2b(body, digest_size=16).hexdigest(), body, response.headers.get('Content-Type'))
+        page_cache.put(key, page)
+        return _respond(page, 'MISS')
+
+    return wrapper
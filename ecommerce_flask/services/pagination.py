@@ -0,0 +1,26 @@
+"""
+Keyset (cursor) pagination helpers for PostgREST queries
+"""
+
+
+def keyset_page(query, after=None, page_size=24, key='id', desc=False):
+    """Fetch one page of ``query`` ordered by ``key``, starting after ``after``.
+
+    Uses ``key > after`` (or ``<`` when ``desc``) instead of an offset, so
+    every page costs the same regardless of how deep it is. One extra row
+    is fetched to know whether a next page exists.
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    if after is not None:
+        query = query.lt(key, after) if desc else query.gt(key, after)
+    rows = query.order(key, desc=desc).limit(page_size + 1).execute().data or []
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, rows[-1][key]
+    return rows, None
+
+
+def count_rows(query):
+    """Exact row count of ``query`` (built with ``select(..., count='exact')``) without fetching the rows"""
+    return query.limit(1).execute().count or 0
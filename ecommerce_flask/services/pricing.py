@@ -0,0 +1,56 @@
+"""
+Cart pricing: subtotal, voucher discount, shipping and total in integer minor units (sen)
+"""
+
+MINOR_PER_RUPIAH = 100
+
+
+def to_minor(amount):
+    """Rupiah (int/float/str) -> integer sen"""
+    return int(round(float(amount) * MINOR_PER_RUPIAH))
+
+
+def to_rupiah(minor):
+    """Integer sen -> whole rupiah, rounding half up (Xendit and the orders table use whole rupiah)"""
+    return (minor + MINOR_PER_RUPIAH // 2) // MINOR_PER_RUPIAH
+
+
+def voucher_key(voucher):
+    """Part of the memo key that identifies a voucher (code and terms)"""
+    if not voucher:
+        return None
+    return [voucher.get('code'), voucher.get('type'), voucher.get('value')]
+
+
+def price_cart(lines, voucher=None, shipping_cost=0):
+    """Price cart ``lines`` (dicts with 'price' in rupiah and 'quantity').
+
+    Returns a dict of integer sen amounts: subtotal, discount,
+    shipping_cost and total, plus the total quantity. The discount never
+    exceeds the subtotal, so the total cannot go negative.
+    """
+    subtotal = 0
+    quantity = 0
+    for line in lines:
+        subtotal += to_minor(line['price']) * int(line['quantity'])
+        quantity += int(line['quantity'])
+
+    shipping = to_minor(shipping_cost)
+    discount = 0
+    if voucher:
+        if voucher['type'] == 'percentage':
+            basis_points = int(round(float(voucher['value']) * 100))
+            discount = (subtotal * basis_points + 5000) // 10000
+        elif voucher['type'] == 'fixed_amount':
+            discount = to_minor(voucher['value'])
+        elif voucher['type'] == 'free_shipping':
+            shipping = 0  # Gratis ongkir
+    discount = min(discount, subtotal)
+
+    return {
+        'subtotal': subtotal,
+        'discount': discount,
+        'shipping_cost': shipping,
+        'total': subtotal - discount + shipping,
+        'quantity': quantity,
+    }
@@ -0,0 +1,68 @@
+"""
+Bulk product lookups against the Supabase ``products`` table
+"""
+
+# Jumlah id maksimum per query in_() agar URL PostgREST tidak terlalu panjang
+IN_CHUNK_SIZE = 100
+
+# Kolom yang diambil per kebutuhan tampilan, supaya halaman daftar tidak ikut
+# mengirim deskripsi lengkap dan kolom yang tidak dirender. Kartu produk hanya
+# menampilkan potongan deskripsi: description_excerpt (computed column, lihat
+# migrations/010_description_excerpt.sql) dikirim dengan nama description.
+PRODUCT_CARD = 'id, name, price, stock, image_url, description:description_excerpt'  # kartu produk: home, daftar, brand, sport, terkait
+PRODUCT_DETAIL = 'id, name, description, price, stock, image_url, category, sizes'  # form edit
+PRODUCT_PAGE = 'id, name, description, price, image_url, category, sizes'  # halaman detail (di-cache; stok dibaca terpisah)
+PRODUCT_CART_LINE = 'id, name, price, stock, image_url'  # baris keranjang & checkout
+PRODUCT_ADMIN_ROW = 'id, name, price, stock, image_url'  # tabel produk di /admin
+PRODUCT_SUMMARY = 'id, name, image_url, price'  # ringkasan di riwayat & konfirmasi pesanan
+
+
+def get_products_by_ids(client, product_ids, columns='*'):
+    """Resolve many product ids at once and return an ``{id: product}`` map.
+
+    Ids are de-duplicated and fetched with one ``in_()`` query per
+    ``IN_CHUNK_SIZE`` ids, so a cart costs one round trip instead of one
+    per line. Unknown ids are simply missing from the result.
+    """
+    ids = []
+    seen = set()
+    for product_id in product_ids:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            continue
+        if product_id not in seen:
+            seen.add(product_id)
+            ids.append(product_id)
+
+    products = {}
+    if not client or not ids:
+        return products
+
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CHUNK_SIZE]
+        response = client.table('products').select(columns).in_('id', chunk).execute()
+        for product in response.data or []:
+            products[product['id']] = product
+    return products
+
+
+def get_stock(client, product_id):
+    """Current stock of one product (0 if it does not exist); never cached, orders change it in the database"""
+    rows = client.table('products').select('stock').eq('id', product_id).execute().data or []
+    return rows[0]['stock'] if rows else 0
+
+
+def iter_products(client, columns='*', page_size=1000):
+    """Yield every product in id order, ``page_size`` rows per query (for building in-memory indexes).
+
+    The default page size matches PostgREST's default row limit.
+    """
+    after = 0
+    while True:
+        rows = (client.table('products').select(columns)
+                .gt('id', after).order('id').limit(page_size).execute().data or [])
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1]['id']
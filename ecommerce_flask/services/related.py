@@ -0,0 +1,101 @@
+"""
+Related products for the detail page: a short list per category kept in memory
+"""
+
+import logging
+import threading
+import time
+
+from services.product_repository import PRODUCT_SUMMARY
+
+log = logging.getLogger(__name__)
+
+
+class RelatedProducts:
+    """category -> the first ``size + 1`` products of that category.
+
+    One extra product is kept so the viewed product can be left out and
+    still fill ``size`` slots. A category is loaded with one query the
+    first time it is needed and then served from memory. Product writes
+    recompute the lists they touch right away, and every list is
+    reloaded after ``ttl`` seconds to pick up other workers' writes.
+    """
+
+    def __init__(self, size=4, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self.loads = 0
+        self._client = None
+        self._lists = {}  # category -> (expires_at, products)
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def configure(self, client=None, size=None, ttl=None):
+        with self._lock:
+            if client is not None:
+                self._client = client
+            if size is not None:
+                self.size = size
+            if ttl is not None:
+                self.ttl = ttl
+            self._lists.clear()
+
+    def _load(self, category):
+        return (self._client.table('products').select(PRODUCT_SUMMARY)
+                .eq('category', category).order('id').limit(self.size + 1).execute().data or [])
+
+    def for_product(self, product):
+        """Up to ``size`` other products from the category of ``product``"""
+        category = product.get('category')
+        if not category or not self._client:
+            return []
+        with self._lock:
+            entry = self._lists.get(category)
+        if entry is None or entry[0] <= time.monotonic():
+            products = self._store(category)
+        else:
+            products = entry[1]
+        return [p for p in products if p['id'] != product.get('id')][:self.size]
+
+    def _store(self, category):
+        with self._lock:
+            version = self._version
+        products = self._load(category)
+        with self._lock:
+            self.loads += 1
+            # Jangan simpan daftar lama jika ada penulisan produk selama query berjalan
+            if version == self._version:
+                self._lists[category] = (time.monotonic() + self.ttl, products)
+        return products
+
+    def product_changed(self, product_id, category=None):
+        """Recompute the lists a product write touches.
+
+        A list is affected when it shows the product, or when the product
+        (now in ``category``) sorts into its first ``size + 1`` slots.
+        Categories that are not in memory are simply loaded on first use.
+        """
+        with self._lock:
+            self._version += 1
+            affected = set()
+            for name, (_, products) in self._lists.items():
+                ids = [p['id'] for p in products]
+                if product_id in ids or (name == category and (len(ids) <= self.size or product_id < ids[-1])):
+                    affected.add(name)
+            for name in affected:
+                del self._lists[name]
+        if not self._client:
+            return
+        for name in sorted(affected):
+            try:
+                self._store(name)
+            except Exception:
+                # Dimuat ulang saat halaman detail berikutnya dibuka
+                log.exception("Kesalahan memuat produk terkait", extra={'category': name})
+
+    def stats(self):
+        with self._lock:
+            return {'categories': sorted(self._lists), 'loads': self.loads, 'size': self.size, 'ttl': self.ttl}
+
+
+related_index = RelatedProducts()
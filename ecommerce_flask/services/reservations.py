@@ -0,0 +1,111 @@
+"""
+Stock reservation holds for orders waiting on payment
+(see migrations/002_stock_reservations.sql)
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+# Counter per proses, diekspos lewat stats()
+_counters = {
+    'committed': 0,
+    'shortfalls': 0,
+    'released': 0,
+    'expired_released': 0,
+    'sweeps': 0,
+    'sweep_errors': 0,
+}
+_counters_lock = threading.Lock()
+_sweeper = None
+_sweeper_pid = None
+
+
+def _bump(name, amount=1):
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def commit(client, order_ids):
+    """Payment succeeded: turn the holds of ``order_ids`` into a permanent decrement.
+
+    Returns ``{'committed', 'shortfall'}``. An order whose hold already
+    expired is only committed if the stock still covers it; otherwise it
+    is listed in ``shortfall`` (``{'order_id', 'product_id', 'requested',
+    'available'}``) and its stock is left alone (see
+    migrations/007_commit_shortfall.sql).
+    """
+    order_ids = [int(order_id) for order_id in order_ids]
+    if not client or not order_ids:
+        return {'committed': 0, 'shortfall': []}
+    result = client.rpc('commit_reservations', {'p_order_ids': order_ids}).execute().data or {}
+    result = {'committed': result.get('committed', 0), 'shortfall': result.get('shortfall') or []}
+    _bump('committed', result['committed'])
+    _bump('shortfalls', len({line['order_id'] for line in result['shortfall']}))
+    return result
+
+
+def release(client, order_ids):
+    """Payment failed: give the held stock of ``order_ids`` back"""
+    order_ids = [int(order_id) for order_id in order_ids]
+    if not client or not order_ids:
+        return 0
+    count = client.rpc('release_reservations', {'p_order_ids': order_ids}).execute().data or 0
+    _bump('released', count)
+    return count
+
+
+def hold_remaining(client, order_id):
+    """Seconds until the first hold of ``order_id`` expires; 0 when it holds nothing anymore"""
+    rows = (client.table('stock_reservations').select('expires_at')
+            .eq('order_id', int(order_id)).eq('status', 'held')
+            .order('expires_at').limit(1).execute().data or [])
+    if not rows:
+        return 0
+    expires_at = datetime.fromisoformat(rows[0]['expires_at'])
+    return max(0, int((expires_at - datetime.now(timezone.utc)).total_seconds()))
+
+
+def release_expired(client, limit=500):
+    """Release up to ``limit`` expired holds and fail their pending orders"""
+    result = client.rpc('release_expired_reservations', {'p_limit': limit}).execute().data or {}
+    _bump('expired_released', result.get('released_holds', 0))
+    return result
+
+
+def stats(client=None):
+    """Active holds (from the database) plus this process' counters"""
+    with _counters_lock:
+        result = dict(_counters)
+    if client:
+        result.update(client.rpc('reservation_stats', {}).execute().data or {})
+    return result
+
+
+def start_sweeper(client, interval=60, batch_size=500):
+    """Start the background thread that releases expired holds every ``interval`` seconds"""
+    global _sweeper, _sweeper_pid
+    # Thread tidak ikut ter-fork: proses anak memulai sweepernya sendiri
+    if (_sweeper is not None and _sweeper_pid == os.getpid()) or not client:
+        return _sweeper
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                # Ulangi selama batch penuh supaya backlog besar cepat habis
+                while release_expired(client, batch_size).get('released_holds', 0) >= batch_size:
+                    pass
+                _bump('sweeps')
+            except Exception:
+                _bump('sweep_errors')
+                log.exception("Error releasing expired reservations")
+
+    _sweeper = threading.Thread(target=run, name='reservation-sweeper', daemon=True)
+    _sweeper_pid = os.getpid()
+    _sweeper.start()
+    return _sweeper
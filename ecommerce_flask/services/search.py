@@ -0,0 +1,357 @@
+"""
+In-memory product search: inverted index over name, brand, category and description with prefix autocomplete
+"""
+
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+
+from services.brands import BRANDS_BY_SLUG, detect_brand
+from services.product_repository import iter_products
+
+log = logging.getLogger(__name__)
+
+SEARCH_FIELDS = 'id, name, description, category, brand'
+
+# Kata umum di deskripsi yang tidak berguna untuk pencarian
+STOPWORDS = frozenset({
+    'dan', 'yang', 'untuk', 'dengan', 'di', 'ke', 'dari', 'ini', 'itu', 'atau', 'pada',
+    'the', 'and', 'for', 'with', 'of', 'a', 'an', 'to', 'in', 'on',
+})
+
+# Batas jumlah term yang digabung untuk satu prefix (mis. "s" cocok dengan ribuan kata)
+MAX_PREFIX_TERMS = 256
+
+# Posting sampai ukuran ini langsung diiris (operasi set di C); yang lebih besar
+# dijalani berurutan menurut id dan berhenti begitu satu halaman terisi
+INTERSECT_LIMIT = 8000
+SORT_LIMIT = 4096
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Lowercased ASCII word tokens of ``text`` (accents stripped)"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return _TOKEN_RE.findall(text.lower())
+
+
+def document_tokens(product):
+    """``(strong, all)`` token sets of a product row.
+
+    ``strong`` holds name and brand tokens, which rank a product above
+    one that only matches on category or description.
+    """
+    brand = product.get('brand') or detect_brand(product.get('name'))
+    strong = set(tokenize(product.get('name')))
+    if brand in BRANDS_BY_SLUG:
+        strong.update(tokenize(BRANDS_BY_SLUG[brand]['name']))
+    weak = set(tokenize(product.get('description')))
+    weak -= STOPWORDS
+    weak.update(tokenize(product.get('category')))
+    return frozenset(strong), frozenset(strong | weak)
+
+
+class _Index:
+    """Postings plus the sorted vocabulary used for prefix lookups"""
+
+    def __init__(self):
+        self.names = {}         # product id -> nama (untuk saran autocomplete)
+        self.tokens = {}        # product id -> (strong, all)
+        self.postings = {}      # token -> set(product id), semua field
+        self.strong = {}        # token -> set(product id), nama & brand saja
+        self.terms = []         # kosakata terurut untuk bisect
+        self.prefixes = OrderedDict()  # cache gabungan posting per prefix
+        self.ordered = OrderedDict()   # cache posting yang sudah diurutkan per id
+
+    def add(self, product):
+        product_id = product['id']
+        self.remove(product_id)
+        strong, tokens = document_tokens(product)
+        self.names[product_id] = product.get('name') or ''
+        self.tokens[product_id] = (strong, tokens)
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                if self.terms is not None:
+                    self.terms.insert(bisect_left(self.terms, token), token)
+            ids.add(product_id)
+        for token in strong:
+            self.strong.setdefault(token, set()).add(product_id)
+        self.prefixes.clear()
+        self.ordered.clear()
+
+    def remove(self, product_id):
+        entry = self.tokens.pop(product_id, None)
+        if entry is None:
+            return
+        self.names.pop(product_id, None)
+        strong, tokens = entry
+        for token in tokens:
+            ids = self.postings[token]
+            ids.discard(product_id)
+            if not ids:
+                del self.postings[token]
+                if self.terms is not None:
+                    del self.terms[bisect_left(self.terms, token)]
+        for token in strong:
+            ids = self.strong[token]
+            ids.discard(product_id)
+            if not ids:
+                del self.strong[token]
+        self.prefixes.clear()
+        self.ordered.clear()
+
+    def term_range(self, prefix):
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + '\x7f', start)
+        return start, end
+
+    def prefix_sets(self, prefix):
+        """``(all, strong)`` id sets of every term starting with ``prefix``"""
+        cached = self.prefixes.get(prefix)
+        if cached is not None:
+            self.prefixes.move_to_end(prefix)
+            return cached
+        start, end = self.term_range(prefix)
+        terms = self.terms[start:end]
+        if len(terms) > MAX_PREFIX_TERMS:
+            # Prefix sangat pendek: pakai term yang paling sering muncul saja
+            terms = heapq.nlargest(MAX_PREFIX_TERMS, terms, key=lambda t: len(self.postings[t]))
+        empty = set()
+        if len(terms) == 1:
+            result = (self.postings[terms[0]], self.strong.get(terms[0], empty))
+        else:
+            result = (empty.union(*(self.postings[t] for t in terms)),
+                      empty.union(*(self.strong.get(t, empty) for t in terms)))
+        self.prefixes[prefix] = result
+        if len(self.prefixes) > 1024:
+            self.prefixes.popitem(last=False)
+        return result
+
+    def sorted_ids(self, key, ids):
+        """``ids`` in ascending order, cached under ``key`` until the next write"""
+        ordered = self.ordered.get(key)
+        if ordered is None:
+            ordered = self.ordered[key] = sorted(ids)
+            if len(self.ordered) > 1024:
+                self.ordered.popitem(last=False)
+        else:
+            self.ordered.move_to_end(key)
+        return ordered
+
+    def first_ids(self, terms, wanted, skip=frozenset()):
+        """Up to ``wanted`` smallest ids present in every set of ``terms`` ((key, ids) pairs), minus ``skip``"""
+        terms = sorted(terms, key=lambda term: len(term[1]))
+        head_key, head = terms[0]
+        others = [ids for _, ids in terms[1:]]
+        if not head:
+            return []
+        if others and len(head) <= INTERSECT_LIMIT:
+            hits = head.intersection(*others)
+            hits.difference_update(skip)
+            if len(hits) <= SORT_LIMIT:
+                return sorted(hits)[:wanted]
+            others = [hits]
+        result = []
+        for product_id in self.sorted_ids(head_key, head):
+            for ids in others:
+                if product_id not in ids:
+                    break
+            else:
+                if product_id not in skip:
+                    result.append(product_id)
+                    if len(result) >= wanted:
+                        break
+        return result
+
+
+class SearchIndex:
+    """Inverted index over the whole catalog, held in memory per process.
+
+    Every query word must match; the last word is matched as a prefix so
+    the same lookup serves autocomplete. Products whose name or brand
+    match all words come first, then the rest, each in id order; only
+    the requested page is materialised, never the full result. Writes
+    update the index in place; a background rebuild every ``ttl``
+    seconds picks up writes made by other workers.
+    """
+
+    def __init__(self, ttl=900):
+        self.ttl = ttl
+        self.builds = 0
+        self.build_seconds = 0.0
+        self.queries = 0
+        self._client = None
+        self._index = None
+        self._expires_at = 0
+        self._rebuilding = False
+        self._pending = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def configure(self, client=None, ttl=None):
+        with self._lock:
+            if client is not None:
+                self._client = client
+            if ttl is not None:
+                self.ttl = ttl
+            self._expires_at = 0
+
+    def build(self, products):
+        """Replace the index with ``products`` (an iterable of rows with SEARCH_FIELDS)"""
+        started = time.perf_counter()
+        index = _Index()
+        index.terms = None  # kosakata diurutkan sekali di akhir
+        for product in products:
+            index.add(product)
+        index.terms = sorted(index.postings)
+        with self._lock:
+            if self._pending is not None:
+                # Tulis yang terjadi selama rebuild diterapkan ulang
+                for product_id, product in self._pending:
+                    if product is None:
+                        index.remove(product_id)
+                    else:
+                        index.add(product)
+                self._pending = None
+            self._index = index
+            self._expires_at = time.monotonic() + self.ttl
+            self.builds += 1
+            self.build_seconds = round(time.perf_counter() - started, 3)
+        self._ready.set()
+        return index
+
+    def _load(self):
+        if not self._client:
+            return []
+        try:
+            return list(iter_products(self._client, SEARCH_FIELDS))
+        except Exception as e:
+            # Kolom brand belum ada (migrasi 004 belum dijalankan)
+            log.warning("Kolom brand tidak tersedia untuk index pencarian: %s", e)
+            return list(iter_products(self._client, 'id, name, description, category'))
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                self.build(self._load())
+            except Exception:
+                log.exception("Error rebuilding search index")
+                with self._lock:
+                    self._pending = None
+                    if self._index is None:
+                        self._index = _Index()
+                    # Dicoba lagi paling lambat semenit kemudian
+                    self._expires_at = time.monotonic() + min(self.ttl, 60)
+            finally:
+                self._rebuilding = False
+                self._ready.set()
+
+        self._rebuilding = True
+        self._pending = []
+        threading.Thread(target=run, name='search-index-rebuild', daemon=True).start()
+
+    def start(self):
+        """Build the index in the background at startup instead of on the first search"""
+        with self._lock:
+            if self._index is None and not self._rebuilding and self._client:
+                self._rebuild_in_background()
+
+    def _current(self):
+        with self._lock:
+            if self._index is not None:
+                if time.monotonic() >= self._expires_at and not self._rebuilding:
+                    self._rebuild_in_background()
+                return self._index
+            if not self._rebuilding:
+                self._rebuild_in_background()
+        # Pencarian pertama menunggu build awal selesai
+        self._ready.wait()
+        return self._index
+
+    def search(self, query, limit=24, offset=0):
+        """Return ``(product_ids, has_more)`` for one page of results"""
+        words = tokenize(query)
+        if not words:
+            return [], False
+        index = self._current()
+        with self._lock:
+            self.queries += 1
+            terms = []
+            strong_terms = []
+            empty = frozenset()
+            for word in words[:-1]:
+                ids = index.postings.get(word)
+                if not ids:
+                    return [], False
+                terms.append((('all', word), ids))
+                strong_terms.append((('strong', word), index.strong.get(word, empty)))
+            ids, strong_ids = index.prefix_sets(words[-1])
+            if not ids:
+                return [], False
+            terms.append((('all', words[-1], '*'), ids))
+            strong_terms.append((('strong', words[-1], '*'), strong_ids))
+
+            # Satu id ekstra untuk tahu apakah ada halaman berikutnya
+            wanted = offset + limit + 1
+            hits = index.first_ids(strong_terms, wanted)
+            if len(hits) < wanted:
+                # Semua kecocokan nama/brand sudah terambil; sisanya dari kategori/deskripsi
+                hits += index.first_ids(terms, wanted - len(hits), skip=set(hits))
+            return hits[offset:offset + limit], len(hits) > offset + limit
+
+    def suggest(self, query, limit=8):
+        """Autocomplete data: completed words for the last query word and the first matching products"""
+        words = tokenize(query)
+        if not words:
+            return {'terms': [], 'products': []}
+        product_ids, _ = self.search(query, limit=limit)
+        index = self._current()
+        with self._lock:
+            start, end = index.term_range(words[-1])
+            candidates = index.terms[start:min(end, start + MAX_PREFIX_TERMS)]
+            best = heapq.nlargest(limit, candidates, key=lambda t: len(index.postings[t]))
+            head = ' '.join(words[:-1])
+            return {
+                'terms': [f'{head} {term}'.strip() for term in best],
+                'products': [{'id': i, 'name': index.names.get(i, '')} for i in product_ids],
+            }
+
+    def upsert(self, product):
+        """Index a product row after add/edit (needs at least id and name)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((product['id'], product))
+            if self._index is not None:
+                self._index.add(product)
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((product_id, None))
+            if self._index is not None:
+                self._index.remove(product_id)
+
+    def stats(self):
+        with self._lock:
+            index = self._index
+            return {
+                'products': len(index.tokens) if index else 0,
+                'terms': len(index.postings) if index else 0,
+                'builds': self.builds,
+                'build_seconds': self.build_seconds,
+                'queries': self.queries,
+                'ttl': self.ttl,
+            }
+
+
+search_index = SearchIndex()
@@ -0,0 +1,258 @@
+"""
+Size chart and the in-memory size availability index (see migrations/005_product_sizes.sql)
+"""
+
+import logging
+import threading
+import time
+
+from services.product_repository import iter_products
+
+log = logging.getLogger(__name__)
+
+# Ukuran EU ("id") dan padanan US per kelompok, ditampilkan di /shop-by-size
+SIZE_CHART = {
+    "MEN FOOTWEAR": [
+        {"id": "39", "us": "6"},
+        {"id": "40", "us": "7"},
+        {"id": "40.5", "us": "7.5"},
+        {"id": "41.5", "us": "8.5"},
+        {"id": "42", "us": "9"},
+        {"id": "42.5", "us": "9.5"},
+        {"id": "43", "us": "10"},
+        {"id": "44", "us": "10.5"},
+        {"id": "44.5", "us": "11"},
+        {"id": "45", "us": "11.5"},
+        {"id": "45.5", "us": "12"},
+        {"id": "46", "us": "12.5"},
+    ],
+    "WOMEN FOOTWEAR": [
+        {"id": "35", "us": "5"},
+        {"id": "36", "us": "6"},
+        {"id": "36.5", "us": "6.5"},
+        {"id": "37", "us": "6.5"},
+        {"id": "37.5", "us": "7"},
+        {"id": "38", "us": "7.5"},
+        {"id": "39", "us": "8"},
+        {"id": "40", "us": "9"},
+        {"id": "40.5", "us": "9.5"},
+        {"id": "41", "us": "10"},
+        {"id": "41.5", "us": "10.5"},
+        {"id": "43", "us": "11.5"},
+    ],
+    "KIDS FOOTWEAR": [
+        {"id": "16", "us": "1C"},
+        {"id": "16.5", "us": "2C"},
+        {"id": "17", "us": "2C"},
+        {"id": "18", "us": "3C"},
+        {"id": "18.5", "us": "3.5C"},
+        {"id": "20", "us": "4.5C"},
+        {"id": "21", "us": "5C"},
+        {"id": "22.5", "us": "6C"},
+        {"id": "23.5", "us": "7C"},
+        {"id": "25", "us": "8C"},
+        {"id": "26", "us": "9C"},
+        {"id": "27.5", "us": "10C"},
+    ]
+}
+
+# Kelompok di SIZE_CHART -> kategori produk
+CHART_CATEGORIES = {"MEN FOOTWEAR": "man", "WOMEN FOOTWEAR": "woman", "KIDS FOOTWEAR": "kids"}
+
+# Semua ukuran EU yang dikenal, urut dari kecil ke besar (pilihan di form produk)
+ALL_SIZES = sorted({s["id"] for sizes in SIZE_CHART.values() for s in sizes}, key=float)
+
+CATEGORIES = tuple(CHART_CATEGORIES.values())
+
+
+def normalize_size(size):
+    """``' 40.50 '`` -> ``'40.5'``; None for sizes that are not in SIZE_CHART"""
+    try:
+        value = float(str(size).strip().replace(',', '.'))
+    except (TypeError, ValueError):
+        return None
+    text = f'{value:g}'
+    return text if text in ALL_SIZES else None
+
+
+def clean_sizes(sizes):
+    """Known sizes from a form/list, de-duplicated and in chart order"""
+    found = {normalize_size(size) for size in sizes or []}
+    return [size for size in ALL_SIZES if size in found]
+
+
+def _ids_of(bitmap, after=None, limit=None):
+    """Product ids set in ``bitmap`` (bit n = product id n) in ascending order"""
+    if after is not None:
+        bitmap &= ~((1 << (after + 1)) - 1)
+    ids = []
+    while bitmap and (limit is None or len(ids) < limit):
+        low = bitmap & -bitmap
+        ids.append(low.bit_length() - 1)
+        bitmap ^= low
+    return ids
+
+
+class SizeIndex:
+    """size -> bitmap of in-stock product ids, plus one bitmap per category.
+
+    Bitmaps are Python ints (bit n = product id n), so combining a size
+    with a category is one ``&`` and counting is ``bit_count()``. Built
+    from one pass over ``products``; product writes in this process
+    update it directly and it is rebuilt in a background thread every
+    ``ttl`` seconds, which also picks up stock changes from orders.
+    Lookups keep using the previous bitmaps while the rebuild runs; only
+    the very first lookup waits for the initial load.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.loads = 0
+        self._client = None
+        self._sizes = None
+        self._categories = {}
+        self._products = {}   # product id -> (sizes, category) yang sedang tersedia
+        self._expires_at = 0
+        self._rebuilding = False
+        self._pending = None  # tulis produk selama rebuild, diterapkan ulang ke index baru
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def configure(self, client=None, ttl=None):
+        with self._lock:
+            if client is not None:
+                self._client = client
+            if ttl is not None:
+                self.ttl = ttl
+            self._expires_at = 0
+
+    def _load(self):
+        sizes = {size: 0 for size in ALL_SIZES}
+        categories = {category: 0 for category in CATEGORIES}
+        products = {}
+        if self._client:
+            for row in iter_products(self._client, 'id, sizes, stock, category'):
+                entry = self._entry(row)
+                if entry:
+                    products[row['id']] = entry
+                    bit = 1 << row['id']
+                    for size in entry[0]:
+                        sizes[size] |= bit
+                    if entry[1] in categories:
+                        categories[entry[1]] |= bit
+        return sizes, categories, products
+
+    @staticmethod
+    def _entry(product):
+        if (product.get('stock') or 0) <= 0:
+            return None
+        sizes = clean_sizes(product.get('sizes'))
+        if not sizes:
+            return None
+        return tuple(sizes), (product.get('category') or '').lower()
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                sizes, categories, products = self._load()
+                with self._lock:
+                    for product in self._pending or ():
+                        self._apply(sizes, categories, products, product)
+                    self._sizes, self._categories, self._products = sizes, categories, products
+                    self._expires_at = time.monotonic() + self.ttl
+                    self.loads += 1
+            except Exception:
+                # Tetap pakai index terakhir, dicoba lagi paling lambat semenit kemudian
+                log.exception("Kesalahan memuat index ukuran")
+                with self._lock:
+                    if self._sizes is None:
+                        self._sizes = {size: 0 for size in ALL_SIZES}
+                        self._categories = {category: 0 for category in CATEGORIES}
+                    self._expires_at = time.monotonic() + min(self.ttl, 60)
+            finally:
+                with self._lock:
+                    self._pending = None
+                    self._rebuilding = False
+                self._ready.set()
+
+        self._rebuilding = True
+        self._pending = []
+        threading.Thread(target=run, name='size-index-rebuild', daemon=True).start()
+
+    def _current(self):
+        with self._lock:
+            if self._sizes is not None:
+                if time.monotonic() >= self._expires_at and not self._rebuilding:
+                    self._rebuild_in_background()
+                return self._sizes, self._categories
+            if not self._rebuilding:
+                self._rebuild_in_background()
+        # Lookup pertama menunggu load awal selesai
+        self._ready.wait()
+        with self._lock:
+            return self._sizes, self._categories
+
+    def _bitmap(self, size, category=None):
+        sizes, categories = self._current()
+        bitmap = sizes.get(normalize_size(size), 0)
+        if category:
+            bitmap &= categories.get(category.lower(), 0)
+        return bitmap
+
+    def product_ids(self, size, category=None, after=None, limit=None):
+        """In-stock product ids offered in ``size`` (optionally one category), ascending, after ``after``"""
+        return _ids_of(self._bitmap(size, category), after, limit)
+
+    def counts(self, category=None):
+        """size -> number of in-stock products (for the size chart)"""
+        sizes, categories = self._current()
+        mask = categories.get(category.lower(), 0) if category else None
+        return {size: (bitmap & mask if mask is not None else bitmap).bit_count()
+                for size, bitmap in sizes.items()}
+
+    @classmethod
+    def _apply(cls, sizes, categories, products, product):
+        product_id = product['id']
+        bit = 1 << product_id
+        old = products.pop(product_id, None)
+        if old:
+            for size in old[0]:
+                sizes[size] &= ~bit
+            if old[1] in categories:
+                categories[old[1]] &= ~bit
+        entry = cls._entry(product)
+        if entry:
+            products[product_id] = entry
+            for size in entry[0]:
+                sizes[size] |= bit
+            if entry[1] in categories:
+                categories[entry[1]] |= bit
+
+    def update(self, product):
+        """Record a product write (row with id, sizes, stock and category)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(product)
+            if self._sizes is None:
+                return
+            self._apply(self._sizes, self._categories, self._products, product)
+
+    def remove(self, product_id):
+        self.update({'id': product_id})
+
+    def invalidate(self):
+        """Reload on the next lookup"""
+        with self._lock:
+            self._expires_at = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'products': len(self._products),
+                'sizes': {size: bitmap.bit_count() for size, bitmap in (self._sizes or {}).items()},
+                'loads': self.loads,
+                'ttl': self.ttl,
+            }
+
+
+size_index = SizeIndex()
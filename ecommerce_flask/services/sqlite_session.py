@@ -0,0 +1,160 @@
+"""
+Server-side sessions in one SQLite file (WAL), shared by every worker process on the host
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from flask_session.sessions import ServerSideSession, SessionInterface
+from itsdangerous import BadSignature, want_bytes
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    expiry REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_expiry_idx ON sessions (expiry);
+"""
+
+
+class SqliteSession(ServerSideSession):
+    # Kedaluwarsa yang tersimpan saat sesi dibaca; None untuk sesi baru
+    stored_expiry = None
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Drop-in replacement for Flask-Session's filesystem backend.
+
+    Reads are a primary-key lookup; an unmodified session is only written
+    back when its stored expiry is more than ``refresh_after`` seconds
+    old. Expired rows are deleted in batches by ``start_sweeper()``.
+    """
+
+    session_class = SqliteSession
+
+    def __init__(self, path, key_prefix='session:', use_signer=False, permanent=True, refresh_after=60):
+        self.path = path
+        self.key_prefix = key_prefix
+        self.use_signer = use_signer
+        self.permanent = permanent
+        self.refresh_after = refresh_after
+        self.has_same_site_capability = hasattr(self, 'get_cookie_samesite')
+        self._local = threading.local()
+        self._sweeper = None
+        self._sweeper_pid = None
+        self.swept = 0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if not sid:
+            return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+        if self.use_signer:
+            signer = self._get_signer(app)
+            if signer is None:
+                return None
+            try:
+                sid = signer.unsign(sid).decode()
+            except BadSignature:
+                return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+
+        row = self._conn().execute('SELECT data, expiry FROM sessions WHERE id = ? AND expiry > ?',
+                                   (self.key_prefix + sid, time.time())).fetchone()
+        if row is not None:
+            try:
+                session = self.session_class(pickle.loads(row[0]), sid=sid)
+                session.stored_expiry = row[1]
+                return session
+            except Exception:
+                pass
+        return self.session_class(sid=sid, permanent=self.permanent)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        key = self.key_prefix + session.sid
+        if not session:
+            if session.modified:
+                self._conn().execute('DELETE FROM sessions WHERE id = ?', (key,))
+                response.delete_cookie(app.config['SESSION_COOKIE_NAME'], domain=domain, path=path)
+            return
+
+        expiry = time.time() + app.permanent_session_lifetime.total_seconds()
+        # Sesi yang tidak berubah cukup diperpanjang sesekali, bukan ditulis di setiap request
+        if session.modified or session.stored_expiry is None or expiry - session.stored_expiry > self.refresh_after:
+            self._conn().execute('INSERT OR REPLACE INTO sessions (id, data, expiry) VALUES (?, ?, ?)',
+                                 (key, pickle.dumps(dict(session), pickle.HIGHEST_PROTOCOL), expiry))
+
+        conditional_cookie_kwargs = {}
+        if self.has_same_site_capability:
+            conditional_cookie_kwargs['samesite'] = self.get_cookie_samesite(app)
+        if self.use_signer:
+            session_id = self._get_signer(app).sign(want_bytes(session.sid))
+        else:
+            session_id = session.sid
+        response.set_cookie(app.config['SESSION_COOKIE_NAME'], session_id,
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path, secure=self.get_cookie_secure(app),
+                            **conditional_cookie_kwargs)
+
+    def sweep(self, batch_size=500):
+        """Delete expired sessions ``batch_size`` rows at a time; return how many were deleted"""
+        conn = self._conn()
+        deleted = 0
+        while True:
+            count = conn.execute(
+                'DELETE FROM sessions WHERE id IN (SELECT id FROM sessions WHERE expiry <= ? LIMIT ?)',
+                (time.time(), batch_size)).rowcount
+            deleted += count
+            if count < batch_size:
+                break
+        self.swept += deleted
+        return deleted
+
+    def start_sweeper(self, interval=300, batch_size=500):
+        """Start the background thread that deletes expired sessions every ``interval`` seconds"""
+        # Thread tidak ikut ter-fork: proses anak memulai sweepernya sendiri
+        if self._sweeper is not None and self._sweeper_pid == os.getpid():
+            return self._sweeper
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep(batch_size)
+                except Exception:
+                    log.exception("Error sweeping expired sessions")
+
+        self._sweeper = threading.Thread(target=run, name='session-sweeper', daemon=True)
+        self._sweeper_pid = os.getpid()
+        self._sweeper.start()
+        return self._sweeper
+
+    def stats(self):
+        conn = self._conn()
+        now = time.time()
+        return {
+            'sessions': conn.execute('SELECT COUNT(*) FROM sessions WHERE expiry > ?', (now,)).fetchone()[0],
+            'expired': conn.execute('SELECT COUNT(*) FROM sessions WHERE expiry <= ?', (now,)).fetchone()[0],
+            'swept': self.swept,
+        }
@@ -0,0 +1,151 @@
+"""
+Voucher registry: active rows of the ``vouchers`` table cached in memory
+(see migrations/003_vouchers.sql)
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+VOUCHER_FIELDS = 'code, type, value, description, starts_at, ends_at, max_uses, max_uses_per_user, used_count'
+
+# Dipakai jika Supabase belum dikonfigurasi atau tabel vouchers belum ada
+BUILTIN_VOUCHERS = {
+    'ONGKIRGRATIS': {'code': 'ONGKIRGRATIS', 'type': 'free_shipping', 'value': 0, 'description': 'Gratis Ongkir'},
+    'DISKON10': {'code': 'DISKON10', 'type': 'percentage', 'value': 10, 'description': 'Diskon 10%'},
+    'HEMAT50RB': {'code': 'HEMAT50RB', 'type': 'fixed_amount', 'value': 50000, 'description': 'Diskon Rp 50.000'},
+}
+
+# Pesan untuk voucher_error dari place_order dan dari validate()
+ERROR_MESSAGES = {
+    'invalid': 'Kode voucher tidak valid atau sudah tidak berlaku.',
+    'not_started': 'Voucher belum bisa digunakan.',
+    'expired': 'Voucher sudah kedaluwarsa.',
+    'exhausted': 'Kuota voucher sudah habis.',
+    'user_limit': 'Anda sudah mencapai batas pemakaian voucher ini.',
+}
+
+
+def _parse_time(value):
+    if not value or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class VoucherRegistry:
+    """Dict of code -> voucher, reloaded from the database every ``ttl`` seconds.
+
+    Lookups on the apply path are a dict access. The reload runs in a
+    background thread and lookups keep using the previous dict meanwhile,
+    so usage counters in the cache may be a little more than ``ttl``
+    seconds stale; the authoritative limit check happens inside place_order.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.loads = 0
+        self._client = None
+        self._vouchers = None
+        self._expires_at = 0
+        self._rebuilding = False
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def configure(self, client=None, ttl=None):
+        with self._lock:
+            if client is not None:
+                self._client = client
+            if ttl is not None:
+                self.ttl = ttl
+            self._expires_at = 0
+
+    def _load(self):
+        if not self._client:
+            return dict(BUILTIN_VOUCHERS)
+        rows = self._client.table('vouchers').select(VOUCHER_FIELDS).eq('active', True).execute().data or []
+        vouchers = {}
+        for row in rows:
+            row['starts_at'] = _parse_time(row.get('starts_at'))
+            row['ends_at'] = _parse_time(row.get('ends_at'))
+            vouchers[row['code']] = row
+        return vouchers
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                vouchers = self._load()
+                with self._lock:
+                    self._vouchers = vouchers
+                    self._expires_at = time.monotonic() + self.ttl
+                    self.loads += 1
+            except Exception:
+                # Tetap pakai daftar terakhir; voucher bawaan hanya jika belum pernah termuat
+                log.exception("Kesalahan memuat voucher")
+                with self._lock:
+                    if self._vouchers is None:
+                        self._vouchers = dict(BUILTIN_VOUCHERS)
+                    self._expires_at = time.monotonic() + min(self.ttl, 60)
+            finally:
+                with self._lock:
+                    self._rebuilding = False
+                self._ready.set()
+
+        self._rebuilding = True
+        threading.Thread(target=run, name='voucher-reload', daemon=True).start()
+
+    def _current(self):
+        with self._lock:
+            if self._vouchers is not None:
+                if time.monotonic() >= self._expires_at and not self._rebuilding:
+                    self._rebuild_in_background()
+                return self._vouchers
+            if not self._rebuilding:
+                self._rebuild_in_background()
+        # Lookup pertama menunggu load awal selesai
+        self._ready.wait()
+        with self._lock:
+            return self._vouchers
+
+    def invalidate(self):
+        """Start a reload on the next lookup (e.g. after editing the vouchers table)"""
+        with self._lock:
+            self._expires_at = 0
+
+    def lookup(self, code):
+        """Voucher dict for ``code`` (case-insensitive) or None"""
+        return self._current().get((code or '').strip().upper())
+
+    @staticmethod
+    def validate(voucher):
+        """Return None if ``voucher`` can be applied now, else an ERROR_MESSAGES key"""
+        if voucher is None:
+            return 'invalid'
+        now = datetime.now(timezone.utc)
+        if voucher.get('starts_at') and now < voucher['starts_at']:
+            return 'not_started'
+        if voucher.get('ends_at') and now >= voucher['ends_at']:
+            return 'expired'
+        if voucher.get('max_uses') is not None and voucher.get('used_count', 0) >= voucher['max_uses']:
+            return 'exhausted'
+        return None
+
+    @staticmethod
+    def session_data(voucher):
+        """What the cart keeps in session['applied_voucher']"""
+        return {
+            'code': voucher['code'],
+            'type': voucher['type'],
+            'value': float(voucher['value']),
+            'description': voucher.get('description', ''),
+        }
+
+    def stats(self):
+        with self._lock:
+            return {'vouchers': len(self._vouchers or {}), 'loads': self.loads, 'ttl': self.ttl}
+
+
+voucher_registry = VoucherRegistry()
@@ -0,0 +1,254 @@
+"""
+Xendit webhook inbox: callbacks are stored in a local SQLite file and applied in batches by a worker
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from services import reservations
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedupe_key TEXT NOT NULL UNIQUE,
+    invoice_id TEXT,
+    order_id INTEGER,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    locked_until REAL,
+    last_error TEXT,
+    received_at REAL NOT NULL,
+    applied_at REAL
+);
+CREATE INDEX IF NOT EXISTS webhook_events_pending_idx ON webhook_events (state, id);
+"""
+
+# Status invoice Xendit -> status pesanan kita ('pending' tidak mengubah apa pun)
+STATUS_MAP = {
+    'paid': 'success',
+    'settled': 'success',
+    'expired': 'failed',
+    'failed': 'failed',
+    'void': 'failed',
+}
+
+
+def parse_event(payload):
+    """Pull ``(order_id, invoice_id, status)`` out of a Xendit invoice callback.
+
+    ``status`` is already mapped to an order status; returns None when the
+    callback does not change any order.
+    """
+    data = payload.get('data') or {}
+    external_id = payload.get('external_id') or data.get('external_id')
+    raw_status = payload.get('status') or data.get('status')
+    invoice_id = payload.get('id') or data.get('id')
+
+    status = STATUS_MAP.get(str(raw_status or '').lower())
+    order_id = None
+    if external_id:
+        # format external_id yang diharapkan: "order-<order_id>"
+        try:
+            order_id = int(str(external_id).split('-')[1])
+        except (IndexError, ValueError):
+            order_id = None
+    if status is None or (order_id is None and not invoice_id):
+        return None
+    return order_id, invoice_id, status
+
+
+class WebhookInbox:
+    """Append-only, deduplicated event log plus the worker that applies it.
+
+    ``record()`` only inserts a row (``INSERT OR IGNORE`` on
+    invoice id + status), so Xendit's retries and duplicate deliveries
+    cost one local write and no database round trip. The worker claims
+    pending events with a lease and applies a whole batch with one
+    update per target status plus one reservation commit/release call.
+    """
+
+    def __init__(self, path='webhooks.db', batch_size=100, poll_interval=0.5, max_attempts=10,
+                 retention_days=30, lease=60):
+        self.path = path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retention_days = retention_days
+        self.lease = lease
+        self._client = None
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self._counters = {'received': 0, 'duplicates': 0, 'ignored': 0, 'applied': 0, 'batches': 0, 'errors': 0}
+
+    def configure(self, client=None, path=None, batch_size=None, poll_interval=None, max_attempts=None,
+                  retention_days=None):
+        values = {'_client': client, 'path': path, 'batch_size': batch_size, 'poll_interval': poll_interval,
+                  'max_attempts': max_attempts, 'retention_days': retention_days}
+        for name, value in values.items():
+            if value is not None:
+                setattr(self, name, value)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _bump(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def record(self, payload):
+        """Store one callback; returns 'queued', 'duplicate' or 'ignored'"""
+        self._bump('received')
+        event = parse_event(payload)
+        if event is None:
+            self._bump('ignored')
+            return 'ignored'
+        order_id, invoice_id, status = event
+        dedupe_key = f"{invoice_id or f'order-{order_id}'}:{status}"
+        cursor = self._conn().execute(
+            'INSERT OR IGNORE INTO webhook_events (dedupe_key, invoice_id, order_id, status, payload, received_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (dedupe_key, invoice_id, order_id, status, json.dumps(payload), time.time()))
+        if cursor.rowcount == 0:
+            self._bump('duplicates')
+            return 'duplicate'
+        self._wake.set()
+        return 'queued'
+
+    def _claim(self):
+        now = time.time()
+        return self._conn().execute(
+            "UPDATE webhook_events SET locked_until = ?, attempts = attempts + 1 "
+            "WHERE id IN (SELECT id FROM webhook_events "
+            "             WHERE state = 'pending' AND (locked_until IS NULL OR locked_until < ?) "
+            "             ORDER BY id LIMIT ?) "
+            "RETURNING id, invoice_id, order_id, status, attempts",
+            (now + self.lease, now, self.batch_size)).fetchall()
+
+    def _resolve_orders(self, events):
+        """Order ids for events that only carry an invoice id (one query for the whole batch)"""
+        missing = sorted({e['invoice_id'] for e in events if e['order_id'] is None})
+        by_invoice = {}
+        if missing:
+            rows = self._client.table('orders').select('id, invoice_id').in_('invoice_id', missing).execute().data or []
+            for row in rows:
+                by_invoice.setdefault(row['invoice_id'], []).append(row['id'])
+        final = {}
+        for event in events:
+            order_ids = [event['order_id']] if event['order_id'] is not None else by_invoice.get(event['invoice_id'], [])
+            for order_id in order_ids:
+                # Pembayaran sukses menang atas event gagal/kedaluwarsa untuk pesanan yang sama
+                if final.get(order_id) != 'success':
+                    final[order_id] = event['status']
+        return final
+
+    def apply_batch(self, events):
+        """Apply claimed events: one update per status plus one reservation call each"""
+        final = self._resolve_orders(events)
+        # Simpan invoice_id dari callback ke pesanan (dipakai untuk mencocokkan event berikutnya)
+        invoices = {e['order_id']: e['invoice_id'] for e in events if e['order_id'] is not None and e['invoice_id']}
+        for order_id, invoice_id in sorted(invoices.items()):
+            if order_id in final:
+                self._client.table('orders').update({'invoice_id': invoice_id}).eq('id', order_id).execute()
+        paid = sorted(order_id for order_id, status in final.items() if status == 'success')
+        failed = sorted(order_id for order_id, status in final.items() if status == 'failed')
+        if paid:
+            self._client.table('orders').update({'status': 'success'}).in_('id', paid).execute()
+            shortfall = reservations.commit(self._client, paid)['shortfall']
+            if shortfall:
+                # Hold sudah kedaluwarsa dan stoknya terjual lagi: tandai untuk ditangani admin
+                oversold = sorted({line['order_id'] for line in shortfall})
+                log.warning("Pesanan dibayar tanpa stok", extra={'orders': oversold})
+                self._client.table('orders').update({'status': 'out_of_stock'}).in_('id', oversold).execute()
+        if failed:
+            # Jangan gagalkan pesanan yang sudah dibayar
+            self._client.table('orders').update({'status': 'failed'}).in_('id', failed).eq('status', 'pending').execute()
+            reservations.release(self._client, failed)
+        return len(paid) + len(failed)
+
+    def run_pending(self):
+        """Apply batches until no pending events are left; return how many events were applied"""
+        applied = 0
+        while True:
+            events = self._claim()
+            if not events:
+                return applied
+            ids = [e['id'] for e in events]
+            marks = ','.join('?' * len(ids))
+            try:
+                self.apply_batch(events)
+            except Exception as e:
+                self._bump('errors')
+                log.exception("Kesalahan menerapkan webhook", extra={'events': len(ids)})
+                # Event tetap pending (lease habis -> dicoba lagi); yang terlalu sering gagal ditandai 'dead'
+                self._conn().execute(
+                    f"UPDATE webhook_events SET last_error = ?, "
+                    f"state = CASE WHEN attempts >= ? THEN 'dead' ELSE state END WHERE id IN ({marks})",
+                    [str(e), self.max_attempts, *ids])
+                return applied
+            self._conn().execute(
+                f"UPDATE webhook_events SET state = 'applied', applied_at = ?, locked_until = NULL WHERE id IN ({marks})",
+                [time.time(), *ids])
+            applied += len(ids)
+            self._bump('applied', len(ids))
+            self._bump('batches')
+
+    def prune(self):
+        """Forget applied events older than ``retention_days`` (they only serve deduplication)"""
+        cutoff = time.time() - self.retention_days * 86400
+        return self._conn().execute("DELETE FROM webhook_events WHERE state = 'applied' AND applied_at < ?",
+                                    (cutoff,)).rowcount
+
+    def start_worker(self):
+        # Thread tidak ikut ter-fork: proses anak memulai workernya sendiri
+        if (self._worker is not None and self._worker_pid == os.getpid()) or not self._client:
+            return self._worker
+
+        def run():
+            last_prune = 0
+            while True:
+                try:
+                    self.run_pending()
+                    if time.time() - last_prune > 3600:
+                        self.prune()
+                        last_prune = time.time()
+                except Exception:
+                    log.exception("Error in webhook worker")
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+        self._worker = threading.Thread(target=run, name='webhook-worker', daemon=True)
+        self._worker_pid = os.getpid()
+        self._worker.start()
+        return self._worker
+
+    def stats(self):
+        rows = self._conn().execute('SELECT state, COUNT(*) AS n FROM webhook_events GROUP BY state').fetchall()
+        with self._lock:
+            result = dict(self._counters)
+        result['events'] = {row['state']: row['n'] for row in rows}
+        return result
+
+
+webhook_inbox = WebhookInbox()
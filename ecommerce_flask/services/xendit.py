@@ -0,0 +1,146 @@
+"""
+Xendit invoices, created by the background job queue instead of inside the request
+"""
+
+import hmac
+import os
+
+import requests
+from dotenv import load_dotenv
+
+from services.db import supabase
+from services.job_queue import job_queue, PermanentJobError
+from services.metrics import metrics
+
+load_dotenv()
+
+INVOICE_JOB = 'xendit.create_invoice'
+SAVE_INVOICE_JOB = 'xendit.save_invoice'
+
+_settings = {
+    'api_key': os.getenv('XENDIT_API_KEY'),
+    'api_url': os.getenv('XENDIT_API_URL', 'https://api.xendit.co'),
+    'timeout': 15.0,
+    'callback_token': os.getenv('XENDIT_CALLBACK_TOKEN'),
+}
+# Satu session per proses supaya koneksi HTTPS ke Xendit dipakai ulang
+_http = requests.Session()
+
+
+def configure(api_key=None, api_url=None, timeout=None, callback_token=None):
+    """Override the settings read from the environment (called once from app.py)"""
+    values = {'api_key': api_key, 'api_url': api_url, 'timeout': timeout, 'callback_token': callback_token}
+    _settings.update({name: value for name, value in values.items() if value is not None})
+
+
+def is_configured():
+    return bool(_settings['api_key'])
+
+
+def verify_callback(token):
+    """True if ``token`` (the x-callback-token header) matches the configured callback token.
+
+    Without a configured token every callback is refused: the webhook
+    changes order status and stock.
+    """
+    expected = _settings['callback_token']
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+class XenditError(Exception):
+    def __init__(self, status_code, body):
+        super().__init__(f'Xendit HTTP {status_code}: {body[:300]}')
+        self.status_code = status_code
+        # 4xx selain timeout/rate limit tidak akan berhasil jika diulang
+        self.retryable = status_code >= 500 or status_code in (408, 409, 429)
+
+
+def create_invoice(payload):
+    """POST /v2/invoices; return the invoice dict or raise XenditError / requests.RequestException.
+
+    ``external_id`` is sent as the idempotency key, so a retry after a lost
+    response cannot create a second invoice: Xendit answers 409 and the
+    invoice created by the first attempt is looked up and returned instead.
+    """
+    with metrics.track('xendit'):
+        resp = _http.post(
+            _settings['api_url'].rstrip('/') + '/v2/invoices',
+            auth=(_settings['api_key'], ''),
+            headers={'X-IDEMPOTENCY-KEY': payload['external_id']},
+            json=payload,
+            timeout=_settings['timeout']
+        )
+    if resp.status_code == 409:
+        invoice = find_invoice(payload['external_id'])
+        if invoice is None:
+            raise XenditError(resp.status_code, resp.text)
+        return invoice
+    if resp.status_code not in (200, 201):
+        raise XenditError(resp.status_code, resp.text)
+    invoice = resp.json()
+    if not invoice.get('invoice_url'):
+        raise XenditError(resp.status_code, 'response without invoice_url')
+    return invoice
+
+
+def find_invoice(external_id):
+    """GET /v2/invoices?external_id=...; the newest invoice with ``external_id``, or None"""
+    with metrics.track('xendit'):
+        resp = _http.get(
+            _settings['api_url'].rstrip('/') + '/v2/invoices',
+            auth=(_settings['api_key'], ''),
+            params={'external_id': external_id},
+            timeout=_settings['timeout']
+        )
+    if resp.status_code == 404:
+        return None
+    if resp.status_code != 200:
+        raise XenditError(resp.status_code, resp.text)
+    invoices = [invoice for invoice in resp.json() if invoice.get('invoice_url')]
+    return invoices[-1] if invoices else None
+
+
+def _job_key(order_id):
+    return f'invoice:{int(order_id)}'
+
+
+def enqueue_invoice(order_id, user_id, payload):
+    """Queue invoice creation for ``order_id``; the page polls invoice_status() for the result"""
+    return job_queue.enqueue(INVOICE_JOB, {'order_id': int(order_id), 'user_id': user_id, 'invoice': payload},
+                             key=_job_key(order_id))
+
+
+def invoice_status(order_id):
+    """Latest invoice job of ``order_id`` (see JobQueue.latest), or None"""
+    return job_queue.latest(_job_key(order_id))
+
+
+def _run_invoice_job(job):
+    # Invoice sudah tersimpan di pesanan (mis. job diulang setelah crash): jangan buat lagi
+    rows = supabase.table('orders').select('invoice_id, invoice_url').eq('id', job['order_id']).execute().data or []
+    if rows and rows[0].get('invoice_id') and rows[0].get('invoice_url'):
+        return {'invoice_id': rows[0]['invoice_id'], 'invoice_url': rows[0]['invoice_url']}
+
+    try:
+        invoice = create_invoice(job['invoice'])
+    except XenditError as e:
+        if not e.retryable:
+            raise PermanentJobError(str(e)) from e
+        raise
+    result = {'invoice_id': invoice.get('id'), 'invoice_url': invoice.get('invoice_url')}
+    # Disimpan oleh job terpisah: gagal menulis ke database tidak mengulang pembuatan invoice
+    job_queue.enqueue(SAVE_INVOICE_JOB, dict(result, order_id=job['order_id']),
+                      key=f"invoice-save:{int(job['order_id'])}")
+    return result
+
+
+def _run_save_invoice_job(job):
+    result = {'invoice_id': job['invoice_id'], 'invoice_url': job['invoice_url']}
+    supabase.table('orders').update(result).eq('id', job['order_id']).execute()
+    return {'order_id': job['order_id']}
+
+
+job_queue.register(INVOICE_JOB, _run_invoice_job)
+job_queue.register(SAVE_INVOICE_JOB, _run_save_invoice_job)
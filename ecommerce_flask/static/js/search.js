@@ -0,0 +1,34 @@
+// Autocomplete kotak pencarian: isi <datalist> dari /products/search/suggest
+(function () {
+    document.querySelectorAll('input[data-suggest-url]').forEach(function (input) {
+        var list = document.getElementById(input.getAttribute('list'));
+        var timer = null;
+        var lastQuery = '';
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                var query = input.value.trim();
+                if (!query || query === lastQuery) {
+                    return;
+                }
+                lastQuery = query;
+                fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(query))
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        if (data.query.trim() !== input.value.trim()) {
+                            return;  // jawaban untuk ketikan lama
+                        }
+                        list.innerHTML = '';
+                        data.terms.concat(data.products.map(function (p) { return p.name; }))
+                            .forEach(function (value) {
+                                var option = document.createElement('option');
+                                option.value = value;
+                                list.appendChild(option);
+                            });
+                    })
+                    .catch(function () {});
+            }, 150);
+        });
+    });
+})();
@@ -0,0 +1,41 @@
+-- The tables and roles that already exist in the Supabase project before
+-- migrations/ is applied (only the columns the migrations and tests use).
+-- Loaded by tests/conftest.py into the throwaway TEST_DATABASE_URL database.
+
+do $$ begin
+    if not exists (select 1 from pg_roles where rolname = 'anon') then create role anon nologin; end if;
+    if not exists (select 1 from pg_roles where rolname = 'authenticated') then create role authenticated nologin; end if;
+    if not exists (select 1 from pg_roles where rolname = 'service_role') then create role service_role nologin; end if;
+end $$;
+
+create table public.products (
+    id bigserial primary key,
+    name text,
+    description text,
+    price numeric not null default 0,
+    stock integer not null default 0,
+    image_url text,
+    category text,
+    sport text
+);
+
+create table public.orders (
+    id bigserial primary key,
+    user_id bigint,
+    total bigint,
+    status text,
+    created_at timestamp,
+    discount_amount bigint default 0,
+    shipping_cost bigint default 0,
+    voucher_code text,
+    invoice_id text,
+    invoice_url text
+);
+
+create table public.order_items (
+    id bigserial primary key,
+    order_id bigint references public.orders(id) on delete cascade,
+    product_id bigint,
+    quantity integer,
+    price bigint
+);
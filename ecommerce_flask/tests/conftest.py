@@ -0,0 +1,72 @@
+"""
+Shared fixtures. Run from ecommerce_flask/:
+
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+
+Tests marked by the ``pg`` fixture need a throwaway Postgres database:
+``TEST_DATABASE_URL=postgresql://postgres@localhost:5432/shop_test``. Its
+``public`` schema is dropped and rebuilt from tests/base_schema.sql plus
+every file in migrations/, so never point it at a real database. Without
+the variable (or without psycopg) those tests are skipped.
+"""
+
+import glob
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+class PgRpc:
+    """The ``client.rpc(name, params).execute().data`` part of supabase-py, over a psycopg connection.
+
+    Calls the function with named arguments, like PostgREST does, so the
+    service code under test runs unchanged against the real migrations.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def rpc(self, name, params):
+        from psycopg.types.json import Jsonb
+        args = ', '.join(f'{key} => %({key})s' for key in params)
+        values = {key: Jsonb(value) if isinstance(value, (list, dict)) else value for key, value in params.items()}
+        conn = self.conn
+
+        class _Call:
+            def execute(self):
+                row = conn.execute(f'select public.{name}({args})', values).fetchone()
+                return type('Response', (), {'data': row[0]})()
+
+        return _Call()
+
+
+@pytest.fixture(scope='session')
+def pg_database():
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL not set')
+    psycopg = pytest.importorskip('psycopg')
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute('drop schema if exists public cascade')
+        conn.execute('create schema public')
+        with open(os.path.join(APP_DIR, 'tests', 'base_schema.sql')) as f:
+            conn.execute(f.read())
+        for path in sorted(glob.glob(os.path.join(APP_DIR, 'migrations', '*.sql'))):
+            with open(path) as f:
+                conn.execute(f.read())
+    return url
+
+
+@pytest.fixture
+def pg(pg_database):
+    """Autocommit connection to a freshly emptied schema"""
+    import psycopg
+    with psycopg.connect(pg_database, autocommit=True) as conn:
+        conn.execute('truncate products, orders, order_items, stock_reservations, vouchers, voucher_redemptions '
+                     'restart identity cascade')
+        yield conn
@@ -0,0 +1,40 @@
+"""
+Catalog cache invalidation shared between workers through CATALOG_VERSION_PATH
+"""
+
+from services.catalog_cache import CatalogCache
+
+
+def make_workers(tmp_path, count=2):
+    workers = [CatalogCache(ttl=3600) for _ in range(count)]
+    for worker in workers:
+        worker.configure(version_path=str(tmp_path / 'catalog.version'))
+    return workers
+
+
+def test_write_in_one_worker_invalidates_the_others(tmp_path):
+    first, second = make_workers(tmp_path)
+    assert second.get_or_load(('product', 1), lambda: 'old') == 'old'
+    version = second.current_version()
+
+    first.invalidate_product(1)
+
+    assert second.get_or_load(('product', 1), lambda: 'new') == 'new'
+    assert second.current_version() > version
+
+
+def test_every_write_is_seen(tmp_path):
+    first, second = make_workers(tmp_path)
+    for round_ in range(20):
+        second.get_or_load(('list', 'all'), lambda: round_)
+        first.invalidate_product()
+        assert second.get_or_load(('list', 'all'), lambda: 'fresh') == 'fresh'
+
+
+def test_without_version_path_only_the_local_cache_is_invalidated():
+    first, second = CatalogCache(ttl=3600), CatalogCache(ttl=3600)
+    second.get_or_load(('product', 1), lambda: 'old')
+
+    first.invalidate_product(1)
+
+    assert second.get_or_load(('product', 1), lambda: 'new') == 'old'
@@ -0,0 +1,96 @@
+"""
+Email outbox delivery and retries against tools/smtp_sink.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from services.mailer import Mailer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+import smtp_sink  # noqa: E402
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    monkeypatch.setattr(smtp_sink, 'QUIET', True)
+    monkeypatch.setitem(smtp_sink.failures, 'remaining', 0)
+    for name in smtp_sink.stats:
+        monkeypatch.setitem(smtp_sink.stats, name, 0)
+    server = smtp_sink.SMTPSink(('127.0.0.1', 0), smtp_sink.SMTPHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_mailer(sink, **settings):
+    mailer = Mailer()
+    mailer.configure(host='127.0.0.1', port=sink.server_address[1], user='shop@localhost', password='',
+                     use_tls=False, workers=1, idle_timeout=5.0, **settings)
+    return mailer
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_sends_queued_messages_over_one_connection(sink):
+    mailer = make_mailer(sink)
+    for index in range(3):
+        assert mailer.send(f'buyer{index}@example.com', 'Halo', '<p>hi</p>')
+
+    assert wait_for(lambda: mailer.stats()['sent'] == 3)
+    assert smtp_sink.stats['messages'] == 3
+    assert mailer.stats()['connections'] == 1
+
+
+def test_temporary_failure_is_retried(sink):
+    smtp_sink.failures['remaining'] = 2
+    mailer = make_mailer(sink, retry_backoff=0.05)
+    mailer.send('buyer@example.com', 'Halo', '<p>hi</p>')
+
+    assert wait_for(lambda: mailer.stats()['sent'] == 1)
+    stats = mailer.stats()
+    assert stats['retried'] == 2
+    assert stats['failed'] == 0
+    assert smtp_sink.stats['rejected'] == 2
+
+
+def test_gives_up_after_max_attempts(sink):
+    smtp_sink.failures['remaining'] = 10
+    mailer = make_mailer(sink, retry_backoff=0.05, max_attempts=3)
+    mailer.send('buyer@example.com', 'Halo', '<p>hi</p>')
+
+    assert wait_for(lambda: mailer.stats()['failed'] == 1)
+    stats = mailer.stats()
+    assert stats['sent'] == 0
+    assert stats['retried'] == 2
+    assert stats['retrying'] == 0
+    assert smtp_sink.stats['rejected'] == 3
+
+
+def test_waiting_retry_does_not_block_the_worker(sink):
+    smtp_sink.failures['remaining'] = 1
+    # Satu worker, retry pertama baru boleh dikirim 2 detik kemudian
+    mailer = make_mailer(sink, retry_backoff=2.0)
+    mailer.send('first@example.com', 'Halo', '<p>hi</p>')
+    assert wait_for(lambda: mailer.stats()['retrying'] == 1)
+
+    started = time.monotonic()
+    mailer.send('second@example.com', 'Halo', '<p>hi</p>')
+    assert wait_for(lambda: mailer.stats()['sent'] == 1, timeout=1.0)
+    assert time.monotonic() - started < 1.0
+    assert mailer.stats()['retrying'] == 1
+
+    assert wait_for(lambda: mailer.stats()['sent'] == 2)
+    assert smtp_sink.stats['messages'] == 2
@@ -0,0 +1,31 @@
+"""
+order_status_counts() for the admin orders page (see tests/conftest.py for TEST_DATABASE_URL)
+"""
+
+import pytest
+
+from conftest import PgRpc
+
+
+def test_counts_orders_per_status(pg):
+    pg.execute("insert into orders (user_id, total, status) values "
+               "(1, 10, 'pending'), (1, 10, 'pending'), (2, 10, 'shipped'), (3, 10, 'failed'), (3, 10, null)")
+
+    counts = PgRpc(pg).rpc('order_status_counts', {}).execute().data
+
+    assert counts == {'pending': 2, 'shipped': 1, 'failed': 1}
+
+
+def test_empty_table(pg):
+    assert PgRpc(pg).rpc('order_status_counts', {}).execute().data == {}
+
+
+def test_anon_cannot_count_orders(pg):
+    import psycopg
+    pg.execute('begin')
+    try:
+        pg.execute('set local role anon')
+        with pytest.raises(psycopg.errors.InsufficientPrivilege):
+            PgRpc(pg).rpc('order_status_counts', {}).execute()
+    finally:
+        pg.execute('rollback')
@@ -0,0 +1,144 @@
+"""
+place_order outcomes against the real migrations (see tests/conftest.py for TEST_DATABASE_URL)
+"""
+
+import pytest
+
+from conftest import PgRpc
+from services.order_placement import place_order
+
+USER = 7
+
+
+@pytest.fixture
+def client(pg):
+    pg.execute("insert into products (id, name, price, stock) values "
+               "(1, 'Nike Air', 150000, 5), (2, 'Adidas Boost', 99999.50, 1)")
+    return PgRpc(pg)
+
+
+def add_voucher(pg, code='DISKON10', type='percentage', value=10, **limits):
+    columns = dict(code=code, type=type, value=value, **limits)
+    names = ', '.join(columns)
+    marks = ', '.join(f'%({name})s' for name in columns)
+    pg.execute(f'insert into vouchers ({names}) values ({marks})', columns)
+
+
+def order_count(pg):
+    return pg.execute('select count(*) from orders').fetchone()[0]
+
+
+def stock(pg, product_id):
+    return pg.execute('select stock from products where id = %s', (product_id,)).fetchone()[0]
+
+
+def test_places_order_with_server_side_prices(client, pg):
+    add_voucher(pg)
+    result = place_order(client, USER, [{'product_id': 1, 'quantity': 2}, {'product_id': 2, 'quantity': 1}],
+                         voucher_code='diskon10')
+
+    assert result['ok'] and result['order_id']
+    # 2 x 150.000 + 99.999,50 = 399.999,50; diskon 10% = 39.999,95
+    assert result['total'] == 360000
+    assert result['discount_amount'] == 40000
+    order = pg.execute('select user_id, total, status, voucher_code from orders').fetchone()
+    assert order == (USER, 360000, 'pending', 'DISKON10')
+    assert stock(pg, 1) == 3 and stock(pg, 2) == 0
+    holds = pg.execute("select product_id, quantity from stock_reservations where status = 'held' order by 1").fetchall()
+    assert holds == [(1, 2), (2, 1)]
+    assert pg.execute("select used_count from vouchers where code = 'DISKON10'").fetchone()[0] == 1
+
+
+def test_caller_prices_are_ignored(client, pg):
+    result = place_order(client, USER, [{'product_id': 1, 'quantity': 1, 'price': 1}])
+
+    assert result['ok']
+    assert pg.execute('select price from order_items').fetchone()[0] == 150000
+
+
+def test_insufficient_stock(client, pg):
+    result = place_order(client, USER, [{'product_id': 1, 'quantity': 6}, {'product_id': 2, 'quantity': 1}])
+
+    assert not result['ok']
+    assert result['insufficient'] == [{'product_id': 1, 'requested': 6, 'available': 5}]
+    assert order_count(pg) == 0
+    assert stock(pg, 1) == 5
+
+
+def test_unknown_product_is_insufficient(client, pg):
+    result = place_order(client, USER, [{'product_id': 99, 'quantity': 1}])
+
+    assert result['insufficient'] == [{'product_id': 99, 'requested': 1, 'available': 0}]
+
+
+def test_price_changed(client, pg):
+    result = place_order(client, USER, [{'product_id': 1, 'quantity': 1}], expected_total=140000)
+
+    assert not result['ok'] and result['price_changed']
+    assert result['total'] == 150000
+    assert [(line['product_id'], float(line['price'])) for line in result['prices']] == [(1, 150000.0)]
+    assert order_count(pg) == 0
+
+
+def test_expected_total_matches(client, pg):
+    result = place_order(client, USER, [{'product_id': 1, 'quantity': 1}], expected_total=150000)
+
+    assert result['ok'] and not result['price_changed']
+
+
+@pytest.mark.parametrize('code, change, error', [
+    ('NOPE', None, 'invalid'),
+    ('OFF', 'active = false', 'invalid'),
+    ('SOON', "starts_at = now() + interval '1 day'", 'not_started'),
+    ('OLD', "ends_at = now() - interval '1 day'", 'expired'),
+    ('GONE', 'max_uses = 3, used_count = 3', 'exhausted'),
+])
+def test_voucher_errors(client, pg, code, change, error):
+    if change is not None:
+        add_voucher(pg, code)
+        pg.execute(f'update vouchers set {change} where code = %s', (code,))
+    result = place_order(client, USER, [{'product_id': 1, 'quantity': 1}], voucher_code=code)
+
+    assert not result['ok']
+    assert result['voucher_error'] == error
+    assert order_count(pg) == 0
+    assert stock(pg, 1) == 5
+
+
+def test_voucher_user_limit(client, pg):
+    add_voucher(pg, max_uses_per_user=1)
+    first = place_order(client, USER, [{'product_id': 1, 'quantity': 1}], voucher_code='DISKON10')
+    second = place_order(client, USER, [{'product_id': 1, 'quantity': 1}], voucher_code='DISKON10')
+    other_user = place_order(client, USER + 1, [{'product_id': 1, 'quantity': 1}], voucher_code='DISKON10')
+
+    assert first['ok']
+    assert second['voucher_error'] == 'user_limit'
+    assert other_user['ok']
+
+
+def test_anon_cannot_place_orders(pg):
+    import psycopg
+    pg.execute('begin')
+    try:
+        pg.execute('set local role anon')
+        with pytest.raises(psycopg.errors.InsufficientPrivilege):
+            PgRpc(pg).rpc('place_order', {'p_user_id': USER, 'p_items': [{'product_id': 1, 'quantity': 1}]}).execute()
+    finally:
+        pg.execute('rollback')
+
+
+def test_late_payment_takes_the_voucher_again(client, pg):
+    add_voucher(pg, max_uses_per_user=1)
+    order_id = place_order(client, USER, [{'product_id': 1, 'quantity': 1}], voucher_code='DISKON10')['order_id']
+    pg.execute("update stock_reservations set expires_at = now() - interval '1 minute'")
+    client.rpc('release_expired_reservations', {'p_limit': 500}).execute()
+    assert pg.execute('select status from orders').fetchone()[0] == 'failed'
+    assert pg.execute("select used_count from vouchers where code = 'DISKON10'").fetchone()[0] == 0
+
+    # Invoice tetap dibayar setelah hold kedaluwarsa (webhook -> success)
+    pg.execute("update orders set status = 'success' where id = %s", (order_id,))
+
+    assert pg.execute("select used_count from vouchers where code = 'DISKON10'").fetchone()[0] == 1
+    assert pg.execute('select order_id, user_id from voucher_redemptions').fetchall() == [(order_id, USER)]
+    again = place_order(client, USER, [{'product_id': 1, 'quantity': 1}], voucher_code='DISKON10')
+    assert again['voucher_error'] == 'user_limit'
@@ -0,0 +1,174 @@
+"""
+Invoice job retries and permanent errors against tools/fake_xendit.py
+"""
+
+import itertools
+import os
+import sys
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from services import xendit
+from services.job_queue import job_queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+import fake_xendit  # noqa: E402
+
+
+class FakeOrders:
+    """The orders table as used by services/xendit.py: select/update filtered by id"""
+
+    def __init__(self):
+        self.rows = {}
+        self.failing_updates = 0
+
+    def table(self, name):
+        assert name == 'orders'
+        return _Query(self)
+
+
+class _Query:
+    def __init__(self, orders):
+        self.orders = orders
+        self.values = None
+        self.order_id = None
+
+    def select(self, columns):
+        return self
+
+    def update(self, values):
+        self.values = values
+        return self
+
+    def eq(self, column, value):
+        assert column == 'id'
+        self.order_id = value
+        return self
+
+    def execute(self):
+        row = self.orders.rows.setdefault(self.order_id, {'id': self.order_id})
+        if self.values is not None:
+            if self.orders.failing_updates:
+                self.orders.failing_updates -= 1
+                raise ConnectionError('database unavailable')
+            row.update(self.values)
+        return type('Response', (), {'data': [dict(row)]})()
+
+
+@pytest.fixture(scope='module')
+def xendit_url():
+    server = make_server('127.0.0.1', 0, fake_xendit.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+@pytest.fixture
+def orders(xendit_url, tmp_path, monkeypatch):
+    monkeypatch.setattr(fake_xendit, 'FAIL_EVERY', 0)
+    monkeypatch.setattr(fake_xendit, 'LOSE_EVERY', 0)
+    monkeypatch.setattr(fake_xendit, '_counter', itertools.count(1))
+    fake_xendit.invoices.clear()
+    fake_xendit.idempotency_keys.clear()
+    for name, value in {'api_key': 'test-key', 'api_url': xendit_url, 'timeout': 5}.items():
+        monkeypatch.setitem(xendit._settings, name, value)
+    # Retry langsung siap dijalankan lagi (backoff 0 ** attempts = 0 detik)
+    monkeypatch.setattr(job_queue, 'path', str(tmp_path / 'jobs.db'))
+    monkeypatch.setattr(job_queue, 'retry_backoff', 0)
+    monkeypatch.setattr(job_queue, 'max_attempts', 3)
+    fake = FakeOrders()
+    monkeypatch.setattr(xendit, 'supabase', fake)
+    return fake
+
+
+def enqueue(order_id=1):
+    payload = {'external_id': f'order-{order_id}', 'amount': 150000, 'payer_email': 'buyer@example.com'}
+    xendit.enqueue_invoice(order_id, 7, payload)
+
+
+def test_creates_invoice_and_saves_it_to_the_order(orders, xendit_url):
+    enqueue()
+    job_queue.run_pending()
+
+    job = xendit.invoice_status(1)
+    assert job['status'] == 'done'
+    assert job['result']['invoice_url'].startswith(xendit_url)
+    assert orders.rows[1]['invoice_id'] == job['result']['invoice_id']
+    assert len(fake_xendit.invoices) == 1
+
+
+def test_server_error_is_retried(orders, monkeypatch):
+    monkeypatch.setattr(fake_xendit, 'FAIL_EVERY', 1)
+    enqueue()
+    job_queue.run_pending(limit=1)
+
+    job = xendit.invoice_status(1)
+    assert job['status'] == 'queued'
+    assert job['attempts'] == 1
+    assert '503' in job['error']
+
+    monkeypatch.setattr(fake_xendit, 'FAIL_EVERY', 0)
+    job_queue.run_pending()
+    job = xendit.invoice_status(1)
+    assert job['status'] == 'done'
+    assert job['attempts'] == 2
+    assert len(fake_xendit.invoices) == 1
+
+
+def test_gives_up_after_max_attempts(orders, monkeypatch):
+    monkeypatch.setattr(fake_xendit, 'FAIL_EVERY', 1)
+    enqueue()
+    job_queue.run_pending()
+
+    job = xendit.invoice_status(1)
+    assert job['status'] == 'failed'
+    assert job['attempts'] == 3
+    assert fake_xendit.invoices == {}
+
+
+def test_rejected_request_fails_without_retry(orders):
+    xendit.enqueue_invoice(1, 7, {'external_id': 'order-1'})  # tanpa amount -> HTTP 400
+    job_queue.run_pending()
+
+    job = xendit.invoice_status(1)
+    assert job['status'] == 'failed'
+    assert job['attempts'] == 1
+    assert '400' in job['error']
+
+
+def test_lost_response_does_not_create_a_second_invoice(orders, monkeypatch):
+    monkeypatch.setattr(fake_xendit, 'LOSE_EVERY', 1)
+    enqueue()
+    job_queue.run_pending(limit=1)
+    assert xendit.invoice_status(1)['status'] == 'queued'
+
+    monkeypatch.setattr(fake_xendit, 'LOSE_EVERY', 0)
+    job_queue.run_pending()
+
+    job = xendit.invoice_status(1)
+    assert job['status'] == 'done'
+    assert len(fake_xendit.invoices) == 1
+    assert job['result']['invoice_id'] == next(iter(fake_xendit.invoices))
+
+
+def test_database_failure_only_retries_the_save(orders):
+    orders.failing_updates = 1
+    enqueue()
+    job_queue.run_pending()
+
+    assert xendit.invoice_status(1)['status'] == 'done'
+    assert orders.rows[1]['invoice_id'] == xendit.invoice_status(1)['result']['invoice_id']
+    assert len(fake_xendit.invoices) == 1
+
+
+def test_order_with_invoice_is_not_invoiced_again(orders):
+    orders.rows[1] = {'id': 1, 'invoice_id': 'inv-existing', 'invoice_url': 'https://pay.example/inv-existing'}
+    enqueue()
+    job_queue.run_pending()
+
+    job = xendit.invoice_status(1)
+    assert job['status'] == 'done'
+    assert job['result'] == {'invoice_id': 'inv-existing', 'invoice_url': 'https://pay.example/inv-existing'}
+    assert fake_xendit.invoices == {}
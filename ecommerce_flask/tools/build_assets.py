@@ -0,0 +1,31 @@
+"""
+Build step for static files: content-hashed copies plus gzip/brotli variants and a manifest.
+
+    python tools/build_assets.py            # writes static/dist/ and static/dist/manifest.json
+
+Run it on deploy (and after editing anything under static/); the app
+reads the manifest at startup. Templates use asset_url('static', filename=...)
+which points at /assets/<name>.<hash>.<ext>, served with
+Cache-Control: immutable. Brotli variants need `pip install brotli`;
+without it only .gz files are written.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import assets  # noqa: E402
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+
+def main():
+    manifest = assets.build(STATIC_DIR, verbose=True)
+    if assets.brotli is None:
+        print("brotli tidak terpasang: hanya varian .gz yang dibuat")
+    print(f"{len(manifest)} file -> {os.path.join(STATIC_DIR, assets.DIST_DIRNAME)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Local stand-in for the Xendit invoice API, for testing checkout without a Xendit account.
+
+Run it next to the app and point the app at it:
+
+    python tools/fake_xendit.py                      # listens on http://localhost:5055
+    XENDIT_API_URL=http://localhost:5055 XENDIT_API_KEY=test python app.py
+
+Environment knobs:
+    FAKE_XENDIT_PORT         port to listen on (default 5055)
+    FAKE_XENDIT_DELAY        seconds to wait before answering POST /v2/invoices
+    FAKE_XENDIT_FAIL_EVERY   answer every N-th invoice request with HTTP 503 (0 = never)
+    FAKE_XENDIT_LOSE_EVERY   create every N-th invoice but answer with HTTP 504, as if the
+                             response was lost on the way back (0 = never)
+    FAKE_XENDIT_WEBHOOK_URL  where to POST the invoice callback when an invoice is paid/failed,
+                             e.g. http://localhost:5001/cart/payment/webhook
+    FAKE_XENDIT_CALLBACK_TOKEN  sent as x-callback-token with every callback; set the app's
+                             XENDIT_CALLBACK_TOKEN to the same value (default 'fake-callback-token')
+"""
+
+import itertools
+import os
+import threading
+import time
+import uuid
+
+import requests
+from flask import Flask, jsonify, redirect, request, render_template_string
+
+app = Flask(__name__)
+
+DELAY = float(os.getenv('FAKE_XENDIT_DELAY', '0'))
+FAIL_EVERY = int(os.getenv('FAKE_XENDIT_FAIL_EVERY', '0'))
+LOSE_EVERY = int(os.getenv('FAKE_XENDIT_LOSE_EVERY', '0'))
+WEBHOOK_URL = os.getenv('FAKE_XENDIT_WEBHOOK_URL')
+CALLBACK_TOKEN = os.getenv('FAKE_XENDIT_CALLBACK_TOKEN', 'fake-callback-token')
+
+invoices = {}
+idempotency_keys = {}  # X-IDEMPOTENCY-KEY -> invoice id
+_counter = itertools.count(1)
+_lock = threading.Lock()
+
+INVOICE_PAGE = """
+<!DOCTYPE html>
+<html>
+<head><title>Fake Xendit Invoice</title></head>
+<body>
+    <h2>Fake Xendit invoice {{ invoice.id }}</h2>
+    <p>{{ invoice.description }}</p>
+    <p>Amount: Rp {{ "{0:,.0f}".format(invoice.amount) }} &middot; Status: {{ invoice.status }}</p>
+    <form method="POST" action="/web/{{ invoice.id }}/pay" style="display:inline"><button>Pay</button></form>
+    <form method="POST" action="/web/{{ invoice.id }}/fail" style="display:inline"><button>Fail</button></form>
+</body>
+</html>
+"""
+
+
+@app.route('/v2/invoices', methods=['POST'])
+def create_invoice():
+    if not request.authorization or not request.authorization.username:
+        return jsonify({'error_code': 'INVALID_API_KEY', 'message': 'API key is required'}), 401
+
+    number = next(_counter)
+    if DELAY:
+        time.sleep(DELAY)
+    if FAIL_EVERY and number % FAIL_EVERY == 0:
+        return jsonify({'error_code': 'SERVER_ERROR', 'message': 'simulated outage'}), 503
+
+    body = request.get_json(silent=True) or {}
+    missing = [field for field in ('external_id', 'amount') if field not in body]
+    if missing:
+        return jsonify({'error_code': 'API_VALIDATION_ERROR', 'message': f'missing {", ".join(missing)}'}), 400
+
+    key = request.headers.get('X-IDEMPOTENCY-KEY')
+    invoice_id = uuid.uuid4().hex[:24]
+    invoice = {
+        'id': invoice_id,
+        'external_id': body['external_id'],
+        'amount': body['amount'],
+        'payer_email': body.get('payer_email'),
+        'description': body.get('description', ''),
+        'status': 'PENDING',
+        'invoice_url': request.host_url.rstrip('/') + f'/web/{invoice_id}',
+        'success_redirect_url': body.get('success_redirect_url'),
+        'failure_redirect_url': body.get('failure_redirect_url'),
+    }
+    with _lock:
+        if key and key in idempotency_keys:
+            return jsonify({'error_code': 'DUPLICATE_ERROR',
+                            'message': 'Idempotency key has been used before'}), 409
+        invoices[invoice_id] = invoice
+        if key:
+            idempotency_keys[key] = invoice_id
+    if LOSE_EVERY and number % LOSE_EVERY == 0:
+        return jsonify({'error_code': 'GATEWAY_TIMEOUT', 'message': 'simulated lost response'}), 504
+    return jsonify(invoice), 200
+
+
+@app.route('/v2/invoices')
+def list_invoices():
+    external_id = request.args.get('external_id')
+    with _lock:
+        found = [invoice for invoice in invoices.values()
+                 if external_id is None or invoice['external_id'] == external_id]
+    if external_id is not None and not found:
+        return jsonify({'error_code': 'INVOICE_NOT_FOUND_ERROR'}), 404
+    return jsonify(found)
+
+
+@app.route('/v2/invoices/<invoice_id>')
+def get_invoice(invoice_id):
+    invoice = invoices.get(invoice_id)
+    if invoice is None:
+        return jsonify({'error_code': 'INVOICE_NOT_FOUND_ERROR'}), 404
+    return jsonify(invoice)
+
+
+@app.route('/web/<invoice_id>')
+def invoice_page(invoice_id):
+    invoice = invoices.get(invoice_id)
+    if invoice is None:
+        return 'Invoice not found', 404
+    return render_template_string(INVOICE_PAGE, invoice=invoice)
+
+
+def _settle(invoice_id, status, redirect_field):
+    invoice = invoices.get(invoice_id)
+    if invoice is None:
+        return 'Invoice not found', 404
+    invoice['status'] = status
+    if WEBHOOK_URL:
+        try:
+            requests.post(WEBHOOK_URL, json={'id': invoice['id'], 'external_id': invoice['external_id'],
+                                             'status': status},
+                          headers={'x-callback-token': CALLBACK_TOKEN}, timeout=5)
+        except requests.RequestException as e:
+            print('Webhook delivery failed:', e)
+    return redirect(invoice.get(redirect_field) or f'/web/{invoice_id}')
+
+
+@app.route('/web/<invoice_id>/pay', methods=['POST'])
+def pay_invoice(invoice_id):
+    return _settle(invoice_id, 'PAID', 'success_redirect_url')
+
+
+@app.route('/web/<invoice_id>/fail', methods=['POST'])
+def fail_invoice(invoice_id):
+    return _settle(invoice_id, 'EXPIRED', 'failure_redirect_url')
+
+
+if __name__ == '__main__':
+    app.run(port=int(os.getenv('FAKE_XENDIT_PORT', '5055')), threaded=True)
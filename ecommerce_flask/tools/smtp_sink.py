@@ -0,0 +1,111 @@
+"""
+Local SMTP sink: accepts every message and prints it, for testing the email outbox.
+
+    python tools/smtp_sink.py                        # listens on localhost:1025
+    EMAIL_HOST=localhost EMAIL_PORT=1025 EMAIL_USE_TLS=false EMAIL_USER=shop@localhost python app.py
+
+AUTH is accepted with any credentials; STARTTLS is not offered.
+Environment knobs:
+    SMTP_SINK_PORT   port to listen on (default 1025)
+    SMTP_SINK_QUIET  set to 1 to print one line per message instead of the full body
+    SMTP_SINK_FAIL_FIRST  answer the first N messages with a temporary 451 error (default 0)
+"""
+
+import os
+import socketserver
+import threading
+
+QUIET = os.getenv('SMTP_SINK_QUIET') == '1'
+
+stats = {'connections': 0, 'messages': 0, 'rejected': 0}
+# Sisa pesan yang akan ditolak sementara (451), untuk menguji retry outbox
+failures = {'remaining': int(os.getenv('SMTP_SINK_FAIL_FIRST', '0'))}
+_lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        with _lock:
+            stats['connections'] += 1
+        self.reply('220 smtp-sink ready')
+        mail_from, rcpt_to = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors='replace').rstrip('\r\n')
+            command = line.split(' ', 1)[0].upper()
+
+            if command == 'EHLO':
+                self.wfile.write(b'250-smtp-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+            elif command == 'HELO':
+                self.reply('250 smtp-sink')
+            elif command == 'AUTH':
+                parts = line.split()
+                if len(parts) == 2 and parts[1].upper() == 'LOGIN':
+                    # username dan password dikirim di dua baris berikutnya
+                    self.reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self.reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                elif len(parts) == 2:
+                    self.reply('334 ')
+                    self.rfile.readline()
+                self.reply('235 Authentication successful')
+            elif command == 'MAIL':
+                mail_from, rcpt_to = line[10:].strip(), []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                rcpt_to.append(line[8:].strip())
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    body.append(data.decode(errors='replace'))
+                with _lock:
+                    reject = failures['remaining'] > 0
+                    if reject:
+                        failures['remaining'] -= 1
+                        stats['rejected'] += 1
+                if reject:
+                    self.reply('451 Temporary failure, try again later')
+                    continue
+                with _lock:
+                    stats['messages'] += 1
+                    count = stats['messages']
+                if QUIET:
+                    print(f"[{count}] {mail_from} -> {', '.join(rcpt_to)}")
+                else:
+                    print(f"----- message {count}: {mail_from} -> {', '.join(rcpt_to)}")
+                    print(''.join(body))
+                self.reply('250 OK: queued')
+            elif command == 'RSET':
+                mail_from, rcpt_to = None, []
+                self.reply('250 OK')
+            elif command == 'NOOP':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if __name__ == '__main__':
+    port = int(os.getenv('SMTP_SINK_PORT', '1025'))
+    print(f'SMTP sink listening on localhost:{port}')
+    with SMTPSink(('localhost', port), SMTPHandler) as server:
+        server.serve_forever()